@@ -2,25 +2,36 @@ import os
 import requests
 import io
 import json
-from flask import Flask, render_template, request, jsonify, send_file, send_from_directory
+from flask import Flask, Response, render_template, request, jsonify, send_file, send_from_directory, url_for
 from PIL import Image
 import pvl
 import numpy as np
 from io import BytesIO
 import tempfile
-import hashlib
-from functools import lru_cache
+from functools import lru_cache, partial
+from itertools import chain
 from pathlib import Path
 import gc
 
 from config import ProcessingConfig
 from simple_converter import ImageConverter
 from streaming_converter import StreamingConverter
+from http_session import get_session
+from conversion_cache import ConversionCache, OUTPUT_FORMATS, upstream_validators
+from normalization import apply_window, ValueHistogram, supports_histogram
+from jobs import JobManager
+from deepzoom import DeepZoomGenerator
+from tile_server import TileServer
+from output_stream import ConversionStream, STREAMABLE_FORMATS
+from planner import OUTPUT_MODES
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
 app.config['UPLOAD_FOLDER'] = 'temp_uploads'
 app.config['CACHE_FOLDER'] = 'cache'
+app.config['JOBS_FOLDER'] = 'jobs'
+app.config['DZI_FOLDER'] = 'dzi_tiles'
+app.config['TILE_SOURCES_FOLDER'] = 'tile_sources'
 
 # Static files configuration for modern design
 app.static_folder = 'static'
@@ -45,6 +56,10 @@ except ImportError:
 
 image_converter = ImageConverter(config)
 streaming_converter = StreamingConverter(config)
+conversion_cache = ConversionCache(app.config['CACHE_FOLDER'], config)
+job_manager = JobManager(app.config['JOBS_FOLDER'], config)
+deepzoom_generator = DeepZoomGenerator(app.config['DZI_FOLDER'], config)
+tile_server = TileServer(app.config['TILE_SOURCES_FOLDER'], config)
 
 def detect_pds_version(content):
     """Detects if file is in PDS3 or PDS4 format by analyzing the first lines."""
@@ -65,12 +80,14 @@ def detect_pds_version(content):
 def normalize_image_data(img_data):
     """Normalizes image data in an optimized and memory-efficient way."""
     print(f"[DEBUG] Normalisation - dtype: {img_data.dtype}, shape: {img_data.shape}")
-    print(f"[DEBUG] Valeurs - min: {img_data.min()}, max: {img_data.max()}, mean: {img_data.mean():.2f}")
+    
+    # Histogramme exact pleine résolution pour les données 8/16 bits
+    hist = ValueHistogram.from_array(img_data) if supports_histogram(img_data.dtype) else None
     
     # If already in uint8 with good range, no need to normalize
     if img_data.dtype == np.uint8:
-        img_min = img_data.min()
-        img_max = img_data.max()
+        img_min = hist.min()
+        img_max = hist.max()
         
         # Si l'image a déjà un bon contraste, la retourner telle quelle
         if img_max > 200 and img_min < 50:
@@ -78,8 +95,11 @@ def normalize_image_data(img_data):
             return img_data
     
     # Utiliser des percentiles pour éviter les valeurs aberrantes
-    # Échantillonnage pour économiser la mémoire sur les grandes images
-    if img_data.size > 10_000_000:  # Plus de 10M pixels
+    if hist is not None:
+        p_low = hist.percentile(2)
+        p_high = hist.percentile(98)
+    # Échantillonnage pour économiser la mémoire sur les grandes images flottantes
+    elif img_data.size > 10_000_000:  # Plus de 10M pixels
         print("[DEBUG] Grande image, échantillonnage pour les percentiles...")
         sample = img_data.ravel()[::100]  # Échantillonner 1 pixel sur 100
         p_low = np.percentile(sample, 2)
@@ -90,23 +110,11 @@ def normalize_image_data(img_data):
     
     print(f"[DEBUG] Percentiles - 2%: {p_low}, 98%: {p_high}")
     
-    if p_high - p_low > 0:
-        # Normalisation IN-PLACE pour économiser la mémoire (utiliser float32 au lieu de float64)
-        if img_data.dtype != np.float32:
-            img_data = img_data.astype(np.float32)
-        
-        # Clipping et normalisation en une seule passe
-        np.clip(img_data, p_low, p_high, out=img_data)
-        img_data -= p_low
-        img_data *= (255.0 / (p_high - p_low))
-        
-        # Conversion finale en uint8
-        result = img_data.astype(np.uint8)
-        print(f"[DEBUG] Après normalisation - min: {result.min()}, max: {result.max()}")
-        return result
-    else:
+    if not p_high - p_low > 0:
         print("[DEBUG] Pas de variation dans l'image")
-        return np.zeros_like(img_data, dtype=np.uint8)
+    
+    # Une seule passe vers uint8 (table de correspondance pour les données 8/16 bits)
+    return apply_window(img_data, (p_low, p_high))
 
 def convert_pds_to_image(file_path, pds_version, max_dimension=None):
     """Convertit un fichier PDS en image PNG avec optimisations mémoire et performance.
@@ -143,23 +151,11 @@ def convert_pds_to_image(file_path, pds_version, max_dimension=None):
                 
                 print(f"[INFO] Image chargée: shape={img_data.shape}, dtype={img_data.dtype}")
                 
-                # Pour les très grandes images, redimensionner AVANT le traitement pour économiser la RAM
-                if max_dimension and max(img_data.shape) > max_dimension * 2:
-                    print(f"[INFO] Image très grande, pré-redimensionnement pour économiser la mémoire...")
-                    from PIL import Image as PILImage
-                    
-                    # Créer une image PIL temporaire
-                    if len(img_data.shape) == 2:
-                        temp_img = PILImage.fromarray(img_data, 'L')
-                    else:
-                        temp_img = PILImage.fromarray(img_data, 'RGB')
-                    
-                    # Redimensionner
-                    temp_img.thumbnail((max_dimension * 2, max_dimension * 2), PILImage.Resampling.LANCZOS)
-                    
-                    # Reconvertir en array
-                    img_data = np.array(temp_img)
-                    del temp_img
+                # Pour les très grandes images, réduire AVANT le traitement pour économiser la RAM
+                # (moyenne par blocs, quel que soit le type de données)
+                if max_dimension and max(img_data.shape[:2]) >= max_dimension * 2:
+                    print(f"[INFO] Image très grande, pré-réduction pour économiser la mémoire...")
+                    img_data = image_converter.reduce_for_target(img_data, max_dimension)
                     print(f"[INFO] Nouvelle taille: {img_data.shape}")
                 
             except Exception as e:
@@ -279,71 +275,157 @@ def convert_pds_to_image(file_path, pds_version, max_dimension=None):
 def index():
     return render_template('index.html')
 
-def get_cache_key(url):
-    """Génère une clé de cache unique pour une URL."""
-    return hashlib.md5(url.encode()).hexdigest()
+def get_cache_key(url, validators, output_format, max_dimension, output_mode='visual'):
+    """Génère la clé de cache d'une conversion (URL, version amont, format, paramètres)."""
+    return conversion_cache.make_key(url, validators, output_format, max_dimension,
+                                     output_mode=output_mode)
 
-def get_cached_image(cache_key):
-    """Récupère une image TIFF depuis le cache si elle existe."""
-    cache_path = os.path.join(app.config['CACHE_FOLDER'], f"{cache_key}.tif")
-    if os.path.exists(cache_path):
-        return cache_path
-    return None
+def send_converted(path, output_format, etag=True, max_age=None):
+    """
+    Envoie une image convertie avec le bon type MIME.
 
-def get_cache_file_path(cache_key):
-    """Construit le chemin du fichier TIFF en cache."""
-    return os.path.join(app.config['CACHE_FOLDER'], f"{cache_key}.tif")
+    Les requêtes GET conditionnelles sont gérées par send_file : If-None-Match
+    renvoie 304 et Range 206 (reprise de téléchargement).
+    """
+    extension, mimetype = OUTPUT_FORMATS[output_format]
+    return send_file(
+        path,
+        mimetype=mimetype,
+        as_attachment=False,
+        download_name=f'nasa_image.{extension}',
+        etag=etag,
+        max_age=max_age
+    )
 
-@app.route('/process', methods=['POST'])
-def process_image():
+def artifact_url(cache_key, output_format):
+    """URL GET stable de l'image convertie dans le cache (voir /artifacts)."""
+    return url_for('get_artifact', cache_key=cache_key, extension=OUTPUT_FORMATS[output_format][0])
+
+class ConversionError(Exception):
+    """Erreur du pipeline de conversion, avec le code HTTP à renvoyer."""
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+def parse_conversion_form(form, default_max_dimension=8192):
+    """Lit et valide les paramètres de conversion (url, max_dimension, format)."""
+    print(f"[DEBUG] Form data keys: {list(form.keys())}")
+    print(f"[DEBUG] Form data: {dict(form)}")
+    
+    if 'url' not in form or not form['url']:
+        print("[ERROR] Aucune URL fournie dans le formulaire")
+        print(f"[ERROR] Données reçues: {dict(form)}")
+        raise ConversionError('Aucune URL fournie. Vérifiez que le champ est rempli.', 400)
+        
+    url = form['url'].strip()
+    print(f"[INFO] ✅ URL reçue: {url}")
+    print(f"[INFO] Longueur URL: {len(url)} caractères")
+    
+    max_dimension = form.get('max_dimension', default_max_dimension, type=int)
+    output_format = form.get('format', 'TIFF').upper()
+    if output_format == 'JPG':
+        output_format = 'JPEG'
+    if output_format not in OUTPUT_FORMATS:
+        raise ConversionError(f'Format non supporté: {output_format}', 400)
+    return url, output_format, max_dimension
+
+def parse_output_mode(form, output_format):
+    """
+    Lit le mode de sortie : 'visual' (8 bits normalisé et rehaussé) ou
+    'science' (TIFF aux échantillons d'origine, étirement en métadonnées).
+    """
+    if not form.get('mode'):
+        # Le mode science de la configuration ne s'applique qu'au TIFF
+        output_mode = config.CONVERSION_SETTINGS.get('output_mode', 'visual')
+        return output_mode if output_format in ('TIFF', 'COG') else 'visual'
+    output_mode = form['mode'].lower()
+    if output_mode not in OUTPUT_MODES:
+        raise ConversionError(f'Mode non supporté: {output_mode}', 400)
+    if output_mode == 'science' and output_format not in ('TIFF', 'COG'):
+        raise ConversionError('Le mode science ne produit que du TIFF', 400)
+    return output_mode
+
+def probe_upstream(url):
+    """
+    Requête HEAD : validateurs (ETag / Last-Modified) de la version amont actuelle.
+
+    Permet de consulter le cache sans ouvrir le corps du fichier. Retourne
+    None si le serveur ne gère pas HEAD (405/501) : les validateurs viendront
+    alors du GET. Lève requests.RequestException si l'amont est injoignable
+    ou répond en erreur.
+    """
+    response = get_session(config).head(
+        url,
+        timeout=30,
+        allow_redirects=True,
+        headers={'Accept-Encoding': 'identity'}
+    )
+    response.close()
+    if response.status_code in (405, 501):
+        return None
+    response.raise_for_status()
+    return upstream_validators(response.headers)
+
+def upstream_unavailable(error):
+    """
+    Vrai si l'amont est injoignable (connexion, délai) ou en panne (5xx).
+
+    Seuls ces cas autorisent à servir une version en cache : un 404 ou un 410
+    signifie que le fichier n'existe plus et doit être transmis au client.
+    """
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    return (isinstance(error, requests.exceptions.HTTPError)
+            and error.response is not None and error.response.status_code >= 500)
+
+def download_error(error):
+    """
+    ConversionError correspondant à une erreur de requête vers l'amont.
+
+    Les erreurs 4xx de l'amont gardent leur code HTTP.
+    """
+    if isinstance(error, requests.exceptions.Timeout):
+        return ConversionError('Délai d\'attente dépassé lors du téléchargement', 408)
+    status = 400
+    if (isinstance(error, requests.exceptions.HTTPError) and error.response is not None
+            and 400 <= error.response.status_code < 500):
+        status = error.response.status_code
+    return ConversionError(f'Erreur de téléchargement: {str(error)}', status)
+
+def cached_fallback(url, output_format, max_dimension, output_mode):
+    """
+    Dernière version convertie de cette URL avec ces paramètres, quand l'amont
+    ne permet pas de savoir quelle version est actuelle (hors ligne, panne).
+    Retourne un résultat de convert_url (avec 'stale') ou None.
+    """
+    latest = conversion_cache.get_latest(
+        get_cache_key(url, None, output_format, max_dimension, output_mode), output_format)
+    if latest is None:
+        return None
+    cache_key, cached_image = latest
+    print(f"[WARNING] Amont indisponible, dernière version en cache servie: {cache_key}")
+    return {'cache_key': cache_key, 'format': output_format, 'output_mode': output_mode,
+            'pds_version': 'Cached', 'cache_hit': True, 'coalesced': False, 'stale': True,
+            'path': str(cached_image)}
+
+def download_source(url, response, progress, check_head=None):
+    """
+    Télécharge le fichier PDS dans un fichier temporaire de UPLOAD_FOLDER.
+
+    response est la requête GET en streaming déjà ouverte (en-têtes lus) ;
+    elle est consommée jusqu'au bout. Retourne (temp_file, pds_version).
+    check_head(first_chunk, content_length), si fourni, est appelé avec les
+    premiers octets avant le téléchargement du reste et peut l'interrompre
+    en levant ConversionError.
+    Le fichier temporaire est supprimé en cas d'échec.
+    Lève ConversionError (avec le code HTTP) en cas d'échec.
+    """
     temp_file = None
     try:
-        # Vérifier si une URL a été fournie
-        print("[DEBUG] ==================== NOUVELLE REQUÊTE ====================")
-        print(f"[DEBUG] Request method: {request.method}")
-        print(f"[DEBUG] Form data keys: {list(request.form.keys())}")
-        print(f"[DEBUG] Form data: {dict(request.form)}")
-        
-        if 'url' not in request.form or not request.form['url']:
-            print("[ERROR] Aucune URL fournie dans le formulaire")
-            print(f"[ERROR] Données reçues: {dict(request.form)}")
-            return jsonify({'error': 'Aucune URL fournie. Vérifiez que le champ est rempli.'}), 400
-            
-        url = request.form['url'].strip()
-        print(f"[INFO] ✅ URL reçue: {url}")
-        print(f"[INFO] Longueur URL: {len(url)} caractères")
-        
-        # Vérifier le cache d'abord
-        cache_key = get_cache_key(url)
-        cached_image = get_cached_image(cache_key)
-        
-        if cached_image:
-            # Retourner l'image depuis le cache (TIFF)
-            response_obj = send_file(
-                cached_image,
-                mimetype='image/tiff',
-                as_attachment=False,
-                download_name='nasa_image.tif'
-            )
-            response_obj.headers['X-PDS-Version'] = 'Cached'
-            response_obj.headers['X-Cache-Hit'] = 'true'
-            return response_obj
-        
-        # Télécharger le fichier (prélecture pour détection)
-        print(f"[INFO] Téléchargement de l'image (prélecture pour détection)...")
-        response = requests.get(
-            url,
-            stream=True,
-            timeout=300,
-            headers={'Accept-Encoding': 'gzip, deflate'}
-        )
-        response.raise_for_status()
-        print(f"[INFO] Téléchargement réussi, status: {response.status_code}")
-        
         # Vérifier la taille du fichier
         content_length = response.headers.get('content-length')
         if content_length and int(content_length) > 500 * 1024 * 1024:
-            return jsonify({'error': 'Le fichier dépasse la limite de 500 Mo'}), 400
+            raise ConversionError('Le fichier dépasse la limite de 500 Mo', 400)
         
         # Lire les premières données pour la détection PDS (chunk plus grand)
         print("[INFO] Lecture des premières données...")
@@ -357,7 +439,7 @@ def process_image():
             print(f"[INFO] Premier chunk lu: {len(first_chunk)} bytes")
         except Exception as e:
             print(f"[ERROR] Erreur lecture chunk: {e}")
-            return jsonify({'error': f'Erreur lecture des données: {str(e)}'}), 400
+            raise ConversionError(f'Erreur lecture des données: {str(e)}', 400)
         
         # Détecter la version PDS
         print("[INFO] Détection de la version PDS...")
@@ -365,7 +447,10 @@ def process_image():
         print(f"[INFO] Version PDS détectée: {pds_version}")
         
         if pds_version.startswith('Erreur'):
-            return jsonify({'error': pds_version}), 400
+            raise ConversionError(pds_version, 400)
+        
+        if check_head is not None:
+            check_head(first_chunk, int(content_length) if content_length else None)
         
         # Créer un fichier temporaire et amorcer avec le premier chunk
         print("[INFO] Création du fichier temporaire...")
@@ -376,13 +461,12 @@ def process_image():
                 f.write(first_chunk)
         except Exception as e:
             print(f"[ERROR] Erreur d'initialisation fichier: {e}")
-            if temp_file and os.path.exists(temp_file):
-                os.remove(temp_file)
-            return jsonify({'error': f"Erreur écriture fichier: {str(e)}"}), 400
+            raise ConversionError(f"Erreur écriture fichier: {str(e)}", 400)
 
-        # Reprendre le téléchargement de manière robuste (Range + retries)
-        print("[INFO] Téléchargement robuste avec reprise (HTTP Range + retries)...")
+        # Continuer sur la même connexion (reprise Range + retries seulement en cas d'erreur)
+        print("[INFO] Suite du téléchargement sur la connexion de détection...")
         def prog(cur, total):
+            progress(current=cur, total=total)
             try:
                 pct = (cur / total) * 100 if total else 0
                 if int(pct) % 10 == 0:
@@ -394,66 +478,528 @@ def process_image():
             output_file=temp_file,
             progress_callback=prog,
             max_retries=5,
-            backoff_factor=2.0
+            backoff_factor=2.0,
+            response=response,
+            chunk_iter=chunk_iter
         )
         if not ok:
             print("[ERROR] Téléchargement échoué après reprises. Abort.")
-            if temp_file and os.path.exists(temp_file):
-                os.remove(temp_file)
-            return jsonify({'error': "Téléchargement interrompu par le serveur distant. Veuillez réessayer."}), 502
-        
-        # Convertir en TIFF et écrire dans le cache (gestion grandes images incluse dans ImageConverter)
-        max_dimension = request.form.get('max_dimension', 8192, type=int)
-        cache_file = get_cache_file_path(cache_key)
-        print(f"[INFO] Conversion en TIFF vers cache: {cache_file} (max_dimension={max_dimension})")
-        success = image_converter.convert_file(
-            temp_file,
-            cache_file,
-            format='TIFF',
-            enhance=True,
-            max_dimension=max_dimension
-        )
-        
-        # Nettoyer le fichier temporaire
+            raise ConversionError("Téléchargement interrompu par le serveur distant. Veuillez réessayer.", 502)
+        return temp_file, pds_version
+    except BaseException:
         if temp_file and os.path.exists(temp_file):
             os.remove(temp_file)
+        raise
+
+def release_conversion(temp_file=None, staging_file=None, key_lock=None):
+    """Supprime les fichiers intermédiaires d'une conversion et libère la clé du cache."""
+    # Nettoyer le fichier temporaire
+    if temp_file and os.path.exists(temp_file):
+        os.remove(temp_file)
+    if staging_file is not None and os.path.exists(staging_file):
+        os.remove(staging_file)
+    if key_lock is not None:
+        key_lock.release()
+
+def convert_url(url, output_format, max_dimension, progress=None, stream=False, output_mode='visual'):
+    """
+    Télécharge une image PDS et la convertit dans le cache.
+
+    Pipeline commun à /process (synchrone) et aux jobs (/jobs).
+    progress(stage, current, total) est appelé avec les étapes
+    'downloading' et 'converting' et la progression du téléchargement.
+
+    Avec stream=True et un format de STREAMABLE_FORMATS, la conversion se
+    poursuit en arrière-plan après le téléchargement : le résultat contient
+    alors 'stream' (ConversionStream) au lieu de 'path', et le fichier
+    rejoint le cache une fois terminé, même si le client s'est déconnecté.
+    output_mode 'science' garde les échantillons d'origine (TIFF).
+
+    Le cache est consulté après une simple requête HEAD ; le corps n'est
+    téléchargé qu'en cas d'absence. Si l'amont est injoignable ou répond en
+    erreur, la dernière version en cache pour ces paramètres est servie
+    ('stale' dans le résultat).
+
+    Retourne un dict : cache_key, format, path, pds_version, cache_hit, coalesced.
+    Lève ConversionError (avec le code HTTP) en cas d'échec.
+    """
+    if progress is None:
+        progress = lambda stage=None, current=None, total=None: None
+    temp_file = None
+    response = None
+    key_lock = None
+    staging_file = None
+    plan = None
+    try:
+        progress('downloading')
         
-        if not success or not os.path.exists(cache_file):
-            print("[ERROR] Echec de conversion en TIFF")
-            return jsonify({'error': 'Echec de conversion en TIFF'}), 500
+        # Vérifier le cache : la clé dépend de l'ETag/Last-Modified du serveur (HEAD, sans corps)
+        validators = probe_upstream(url)
+        if validators is not None:
+            cache_key = get_cache_key(url, validators, output_format, max_dimension, output_mode)
+            cached_image = conversion_cache.get(cache_key, output_format)
+            if cached_image:
+                return {'cache_key': cache_key, 'format': output_format,
+                        'output_mode': output_mode, 'pds_version': 'Cached',
+                        'cache_hit': True, 'coalesced': False, 'path': str(cached_image)}
         
-        # Envoyer le fichier TIFF depuis le cache
-        print(f"[INFO] Envoi du TIFF au client...")
-        response_obj = send_file(
-            cache_file,
-            mimetype='image/tiff',
-            as_attachment=False,
-            download_name='nasa_image.tif'
+        # Télécharger le fichier (prélecture pour détection)
+        # Cette même connexion est ensuite lue jusqu'au bout par download_with_resume.
+        # 'identity' : les offsets Range doivent correspondre aux octets bruts du fichier.
+        print(f"[INFO] Téléchargement de l'image (prélecture pour détection)...")
+        response = get_session(config).get(
+            url,
+            stream=True,
+            timeout=300,
+            headers={'Accept-Encoding': 'identity'}
         )
-        response_obj.headers['X-PDS-Version'] = pds_version
-        response_obj.headers['X-Cache-Hit'] = 'false'
-        print(f"[SUCCESS] Conversion réussie!")
-        return response_obj
+        response.raise_for_status()
+        print(f"[INFO] Téléchargement réussi, status: {response.status_code}")
         
-    except requests.exceptions.Timeout:
-        print(f"[ERROR] Timeout lors du téléchargement")
-        if temp_file and os.path.exists(temp_file):
-            os.remove(temp_file)
-        return jsonify({'error': 'Délai d\'attente dépassé lors du téléchargement'}), 408
+        # Les validateurs du GET font foi (HEAD non géré, ou fichier modifié entre-temps)
+        cache_key = get_cache_key(url, upstream_validators(response.headers),
+                                  output_format, max_dimension, output_mode)
+        result = {'cache_key': cache_key, 'format': output_format, 'output_mode': output_mode,
+                  'pds_version': 'Cached', 'cache_hit': True, 'coalesced': False}
+        cached_image = conversion_cache.get(cache_key, output_format)
+        if cached_image:
+            return dict(result, path=str(cached_image))
+        
+        # Une seule conversion par clé : les requêtes concurrentes (threads ou
+        # workers gunicorn) attendent la première puis servent son résultat
+        key_lock = conversion_cache.lock(cache_key)
+        if not key_lock.acquire(timeout=config.CACHE_SETTINGS['lock_timeout']):
+            print("[WARNING] Attente de la conversion concurrente dépassée, conversion indépendante")
+        cached_image = conversion_cache.get(cache_key, output_format)
+        if cached_image:
+            print("[INFO] Image convertie par une requête concurrente")
+            return dict(result, path=str(cached_image), coalesced=True)
+        
+        # Choisir la stratégie dès le label et Content-Length, avant de tout télécharger
+        def check_head(first_chunk, content_length):
+            nonlocal plan
+            plan = image_converter.planner.plan_head(first_chunk, content_length, output_format,
+                                                     enhance=True, max_dimension=max_dimension,
+                                                     output_mode=output_mode)
+            if plan is not None:
+                print(f"[INFO] Stratégie: {plan.strategy} ({plan.engine}) - {'; '.join(plan.reasons)}")
+                if plan.rejected:
+                    raise ConversionError(f'Fichier trop volumineux pour être converti: {plan.rejected}', 413)
+        
+        temp_file, pds_version = download_source(url, response, progress, check_head)
+        if plan is None:
+            # Label plus long que la prélecture : planifier sur le fichier téléchargé
+            plan = image_converter.planner.plan_file(temp_file, output_format,
+                                                     enhance=True, max_dimension=max_dimension,
+                                                     output_mode=output_mode)
+        
+        # Convertir sous un nom temporaire puis renommer atomiquement dans le cache
+        progress('converting')
+        staging_file = conversion_cache.staging_path(cache_key, output_format)
+        print(f"[INFO] Conversion en {output_format} vers cache: {staging_file} (max_dimension={max_dimension})")
+        def convert(temp_file, staging_file):
+            success = image_converter.convert_file(
+                temp_file,
+                staging_file,
+                format=output_format,
+                enhance=True,
+                max_dimension=max_dimension,
+                plan=plan
+            )
+            
+            cache_file = conversion_cache.commit(staging_file, cache_key, output_format) if success else None
+            if not cache_file:
+                print(f"[ERROR] Echec de conversion en {output_format}")
+                raise ConversionError(f'Echec de conversion en {output_format}', 500)
+            
+            print(f"[SUCCESS] Conversion réussie!")
+            return cache_file
+        
+        result = dict(result, pds_version=pds_version, cache_hit=False,
+                      plan=plan.headers() if plan is not None else None)
+        if stream and output_format in STREAMABLE_FORMATS:
+            # Le thread de conversion reprend le fichier téléchargé, le staging et le verrou
+            conversion = ConversionStream(
+                staging_file,
+                partial(convert, temp_file, staging_file),
+                cleanup=partial(release_conversion, temp_file, staging_file, key_lock)
+            )
+            temp_file = staging_file = key_lock = None
+            return dict(result, stream=conversion.start())
+        
+        return dict(result, path=str(convert(temp_file, staging_file)))
+        
+    except ConversionError:
+        raise
     except requests.exceptions.RequestException as e:
-        print(f"[ERROR] Erreur de requête: {str(e)}")
-        if temp_file and os.path.exists(temp_file):
-            os.remove(temp_file)
-        return jsonify({'error': f'Erreur de téléchargement: {str(e)}'}), 400
+        if upstream_unavailable(e):
+            fallback = cached_fallback(url, output_format, max_dimension, output_mode)
+            if fallback is not None:
+                return fallback
+        if isinstance(e, requests.exceptions.Timeout):
+            print(f"[ERROR] Timeout lors du téléchargement")
+        else:
+            print(f"[ERROR] Erreur de requête: {str(e)}")
+        raise download_error(e)
     except Exception as e:
         print(f"[ERROR] Exception non gérée: {str(e)}")
         import traceback
         traceback.print_exc()
+        raise ConversionError(str(e), 500)
+    finally:
+        # Rendre la connexion au pool même en cas de sortie anticipée
+        if response is not None:
+            response.close()
+        release_conversion(temp_file, staging_file, key_lock)
+
+def add_result_headers(response_obj, result):
+    """En-têtes communs aux réponses de convert_url (cache, version PDS, stratégie)."""
+    response_obj.headers['X-PDS-Version'] = result['pds_version']
+    response_obj.headers['X-Output-Mode'] = result.get('output_mode', 'visual')
+    response_obj.headers['X-Cache-Hit'] = 'true' if result['cache_hit'] else 'false'
+    response_obj.headers['X-Cache-Key'] = result['cache_key']
+    if result['coalesced']:
+        response_obj.headers['X-Cache-Coalesced'] = 'true'
+    if result.get('stale'):
+        # Amont indisponible : dernière version convertie, peut-être plus ancienne
+        response_obj.headers['X-Cache-Stale'] = 'true'
+    # Stratégie choisie par le planificateur (absente pour un résultat du cache)
+    response_obj.headers.update(result.get('plan') or {})
+    # Même image en GET, avec ETag / Range
+    response_obj.headers['Content-Location'] = artifact_url(result['cache_key'], result['format'])
+    return response_obj
+
+def send_result(result):
+    """Envoie le fichier produit par convert_url avec les en-têtes de cache."""
+    response_obj = send_converted(result['path'], result['format'], etag=result['cache_key'])
+    return add_result_headers(response_obj, result)
+
+def send_stream(result):
+    """
+    Envoie l'image au fil de son encodage (réponse chunked, sans Content-Length).
+
+    Le premier bloc est attendu avant d'envoyer les en-têtes, pour qu'un échec
+    précoce de la conversion donne encore une erreur JSON.
+    """
+    chunks = result['stream'].chunks()
+    first_chunk = next(chunks, b'')
+    extension, mimetype = OUTPUT_FORMATS[result['format']]
+    response_obj = Response(chain([first_chunk], chunks), mimetype=mimetype)
+    response_obj.headers['Content-Disposition'] = f'inline; filename=nasa_image.{extension}'
+    response_obj.set_etag(result['cache_key'])
+    response_obj.headers['X-Streamed'] = 'true'
+    return add_result_headers(response_obj, result)
+
+@app.route('/process', methods=['POST'])
+def process_image():
+    try:
+        print("[DEBUG] ==================== NOUVELLE REQUÊTE ====================")
+        print(f"[DEBUG] Request method: {request.method}")
+        url, output_format, max_dimension = parse_conversion_form(request.form)
+        output_mode = parse_output_mode(request.form, output_format)
+        result = convert_url(url, output_format, max_dimension,
+                             stream=config.WEB_SETTINGS.get('stream_responses', False),
+                             output_mode=output_mode)
+        try:
+            print(f"[INFO] Envoi du {output_format} au client...")
+            if 'stream' in result:
+                return send_stream(result)
+            return send_result(result)
+        except FileNotFoundError:
+            # Évincée entre-temps par un autre worker : reconvertir
+            conversion_cache.discard(result['cache_key'], output_format)
+            return send_result(convert_url(url, output_format, max_dimension, output_mode=output_mode))
+    except ConversionError as e:
+        return jsonify({'error': str(e)}), e.status
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Lance une conversion en arrière-plan et renvoie immédiatement l'identifiant du job."""
+    try:
+        url, output_format, max_dimension = parse_conversion_form(request.form)
+        output_mode = parse_output_mode(request.form, output_format)
+    except ConversionError as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    job = job_manager.submit(
+        lambda job: convert_url(url, output_format, max_dimension, progress=job.update,
+                                output_mode=output_mode),
+        params={'url': url, 'format': output_format, 'max_dimension': max_dimension,
+                'mode': output_mode}
+    )
+    if job is None:
+        return jsonify({'error': 'Trop de conversions en cours, réessayez plus tard'}), 503
+    
+    status_url = url_for('job_status', job_id=job.id)
+    response_obj = jsonify({
+        'job_id': job.id,
+        'status_url': status_url,
+        'result_url': url_for('job_result', job_id=job.id),
+    })
+    response_obj.status_code = 202
+    response_obj.headers['Location'] = status_url
+    return response_obj
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Progression d'un job (étape, octets téléchargés, ETA), quel que soit le worker qui l'exécute."""
+    status = job_manager.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job inconnu'}), 404
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """Image produite par un job terminé."""
+    status = job_manager.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job inconnu'}), 404
+    if status['stage'] == 'failed':
+        return jsonify({'error': status['error']}), status['error_status'] or 500
+    if status['stage'] != 'done':
+        return jsonify({'error': 'Job en cours', 'stage': status['stage']}), 409
+    
+    result = status['result']
+    cached_image = conversion_cache.get(result['cache_key'], result['format'])
+    if not cached_image:
+        return jsonify({'error': 'Résultat expiré du cache, relancez la conversion'}), 410
+    try:
+        return send_result(dict(result, path=str(cached_image)))
+    except FileNotFoundError:
+        conversion_cache.discard(result['cache_key'], result['format'])
+        return jsonify({'error': 'Résultat expiré du cache, relancez la conversion'}), 410
+
+@app.route('/artifacts/<cache_key>.<extension>', methods=['GET'])
+def get_artifact(cache_key, extension):
+    """
+    Image convertie, adressée par sa clé de cache (en-tête Content-Location de /process).
+
+    La clé dépend de la version amont et des paramètres : le contenu d'une URL
+    ne change jamais, d'où un ETag fort et une mise en cache côté client.
+    """
+    output_format = next((name for name, (ext, _) in OUTPUT_FORMATS.items() if ext == extension), None)
+    try:
+        cached_image = conversion_cache.get(cache_key, output_format) if output_format else None
+    except ValueError:
+        cached_image = None
+    if not cached_image:
+        return jsonify({'error': 'Image absente ou expirée du cache'}), 404
+    try:
+        return send_converted(cached_image, output_format, etag=cache_key,
+                              max_age=config.WEB_SETTINGS['cache_timeout'])
+    except FileNotFoundError:
+        conversion_cache.discard(cache_key, output_format)
+        return jsonify({'error': 'Image absente ou expirée du cache'}), 404
+
+def build_deepzoom(url, max_dimension):
+    """
+    Convertit l'image en TIFF (cache partagé avec /process) puis génère sa pyramide DZI.
+
+    Retourne (result, pyramid_id) ; pyramid_id vaut None pour les images trop
+    petites pour Deep Zoom (DEEPZOOM_SETTINGS['min_size_for_deepzoom']).
+    """
+    result = convert_url(url, 'TIFF', max_dimension)
+    width, height = deepzoom_generator.image_size(result['path'])
+    if not deepzoom_generator.needs_deepzoom(width, height):
+        return result, None
+    
+    pyramid_id = deepzoom_generator.pyramid_id(result['cache_key'])
+    if deepzoom_generator.get(pyramid_id) is None:
+        # Une seule génération par pyramide, tous workers confondus (verrou de la clé de conversion)
+        key_lock = conversion_cache.lock(result['cache_key'])
+        if not key_lock.acquire(timeout=config.CACHE_SETTINGS['lock_timeout']):
+            print("[WARNING] Attente de la génération Deep Zoom concurrente dépassée")
+        try:
+            print(f"[INFO] Génération de la pyramide Deep Zoom {pyramid_id} ({width}x{height})...")
+            deepzoom_generator.generate(result['path'], result['cache_key'])
+        finally:
+            key_lock.release()
+    return dict(result, width=width, height=height), pyramid_id
+
+@app.route('/dzi', methods=['POST'])
+def create_deepzoom():
+    """
+    Pyramide Deep Zoom pour OpenSeadragon.
+
+    Renvoie l'URL du descripteur .dzi (JSON + en-tête X-DZI-URL), ou l'image
+    elle-même si elle est trop petite pour justifier une pyramide.
+    Sans max_dimension, l'image est convertie en pleine résolution.
+    """
+    try:
+        url, _, max_dimension = parse_conversion_form(request.form, default_max_dimension=None)
+        try:
+            result, pyramid_id = build_deepzoom(url, max_dimension)
+        except FileNotFoundError:
+            # TIFF source évincé du cache pendant la génération : reconvertir
+            result, pyramid_id = build_deepzoom(url, max_dimension)
+        if pyramid_id is None:
+            return send_result(result)
+    except ConversionError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        print(f"[ERROR] Erreur Deep Zoom: {str(e)}")
+        return jsonify({'error': f'Erreur Deep Zoom: {str(e)}'}), 500
+    
+    dzi_url = url_for('deepzoom_descriptor', pyramid_id=pyramid_id)
+    response_obj = jsonify({
+        'dzi_url': dzi_url,
+        'width': result['width'],
+        'height': result['height'],
+        'tile_size': deepzoom_generator.tile_size,
+        'tile_format': deepzoom_generator.tile_format,
+        'cache_key': result['cache_key'],
+    })
+    response_obj.headers['X-DZI-URL'] = dzi_url
+    response_obj.headers['X-Cache-Hit'] = 'true' if result['cache_hit'] else 'false'
+    return response_obj
+
+@app.route('/dzi/<pyramid_id>.dzi', methods=['GET'])
+def deepzoom_descriptor(pyramid_id):
+    """Descripteur XML d'une pyramide Deep Zoom."""
+    try:
+        descriptor = deepzoom_generator.get(pyramid_id)
+    except ValueError:
+        descriptor = None
+    if descriptor is None:
+        return jsonify({'error': 'Pyramide inconnue ou expirée'}), 404
+    return send_file(descriptor, mimetype='application/xml',
+                     max_age=config.WEB_SETTINGS['cache_timeout'])
+
+@app.route('/dzi/<pyramid_id>_files/<int:level>/<tile>', methods=['GET'])
+def deepzoom_tile(pyramid_id, level, tile):
+    """Tuile d'une pyramide Deep Zoom (<colonne>_<ligne>.<format>)."""
+    try:
+        pyramid_dir = deepzoom_generator.pyramid_dir(pyramid_id)
+    except ValueError:
+        return jsonify({'error': 'Pyramide inconnue'}), 404
+    return send_from_directory(pyramid_dir / 'image_files' / str(level), tile,
+                               mimetype=deepzoom_generator.tile_mimetype,
+                               max_age=config.WEB_SETTINGS['cache_timeout'])
+
+def open_tile_source(url):
+    """
+    Télécharge (une seule fois par version amont) l'image source du serveur de tuiles.
+
+    Comme convert_url : une source déjà préparée est retrouvée après une
+    simple requête HEAD, et la dernière version préparée est rouverte si
+    l'amont est injoignable ou en panne (5xx).
+
+    Retourne (source_id, metadata, cache_hit).
+    Lève ConversionError (avec le code HTTP) en cas d'échec.
+    """
+    response = None
+    key_lock = None
+    temp_file = None
+    try:
+        validators = probe_upstream(url)
+        if validators is not None:
+            source_id = conversion_cache.make_key(url, validators, 'RAW', None)
+            meta = tile_server.metadata(source_id)
+            if meta is not None:
+                return source_id, meta, True
+        
+        response = get_session(config).get(
+            url,
+            stream=True,
+            timeout=300,
+            headers={'Accept-Encoding': 'identity'}
+        )
+        response.raise_for_status()
+        source_id = conversion_cache.make_key(url, upstream_validators(response.headers), 'RAW', None)
+        meta = tile_server.metadata(source_id)
+        if meta is not None:
+            return source_id, meta, True
+        
+        key_lock = conversion_cache.lock(source_id)
+        if not key_lock.acquire(timeout=config.CACHE_SETTINGS['lock_timeout']):
+            print("[WARNING] Attente du téléchargement concurrent dépassée, téléchargement indépendant")
+        meta = tile_server.metadata(source_id)
+        if meta is not None:
+            return source_id, meta, True
+        
+        temp_file, _ = download_source(url, response,
+                                       lambda stage=None, current=None, total=None: None)
+        print(f"[INFO] Préparation de la source de tuiles {source_id}...")
+        meta = tile_server.add_source(temp_file, source_id)
+        temp_file = None
+        return source_id, meta, False
+    
+    except ConversionError:
+        raise
+    except requests.exceptions.RequestException as e:
+        if upstream_unavailable(e):
+            latest = tile_server.latest_source(conversion_cache.make_key(url, None, 'RAW', None))
+            if latest is not None:
+                print(f"[WARNING] Amont indisponible, dernière source de tuiles servie: {latest[0]}")
+                return latest[0], latest[1], True
+        raise download_error(e)
+    except Exception as e:
+        print(f"[ERROR] Erreur source de tuiles: {str(e)}")
+        raise ConversionError(str(e), 500)
+    finally:
         if temp_file and os.path.exists(temp_file):
             os.remove(temp_file)
-        return jsonify({'error': str(e)}), 500
+        if response is not None:
+            response.close()
+        if key_lock is not None:
+            key_lock.release()
+
+@app.route('/tiles', methods=['POST'])
+def create_tile_source():
+    """
+    Serveur de tuiles à la demande : seules les tuiles affichées sont calculées.
+
+    Renvoie l'URL du descripteur .dzi (JSON + en-tête X-DZI-URL) pour OpenSeadragon.
+    """
+    try:
+        url, _, _ = parse_conversion_form(request.form)
+        source_id, meta, cache_hit = open_tile_source(url)
+    except ConversionError as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    dzi_url = url_for('tile_descriptor', source_id=source_id)
+    response_obj = jsonify({
+        'source_id': source_id,
+        'dzi_url': dzi_url,
+        'width': meta['width'],
+        'height': meta['height'],
+        'max_level': meta['max_level'],
+        'tile_size': tile_server.tile_size,
+        'tile_format': tile_server.tile_format,
+    })
+    response_obj.headers['X-DZI-URL'] = dzi_url
+    response_obj.headers['X-Cache-Hit'] = 'true' if cache_hit else 'false'
+    return response_obj
 
-## Deep Zoom routes and functionality removed per requirement
+@app.route('/tiles/<source_id>.dzi', methods=['GET'])
+def tile_descriptor(source_id):
+    """Descripteur DZI d'une source du serveur de tuiles."""
+    try:
+        descriptor = tile_server.descriptor(source_id)
+    except ValueError:
+        descriptor = None
+    if descriptor is None:
+        return jsonify({'error': 'Source inconnue ou expirée'}), 404
+    response_obj = app.response_class(descriptor, mimetype='application/xml')
+    response_obj.cache_control.public = True
+    response_obj.cache_control.max_age = config.WEB_SETTINGS['cache_timeout']
+    return response_obj
+
+@app.route('/tiles/<source_id>_files/<int:level>/<int:column>_<int:row>.<extension>', methods=['GET'])
+def tile_image(source_id, level, column, row, extension):
+    """Tuile (level, column, row), rendue à la demande puis mise en cache (mémoire + disque)."""
+    if extension != tile_server.tile_format:
+        return jsonify({'error': 'Format de tuile inconnu'}), 404
+    try:
+        data = tile_server.tile(source_id, level, column, row)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    if data is None:
+        return jsonify({'error': 'Source inconnue ou expirée'}), 404
+    response_obj = app.response_class(data, mimetype=tile_server.tile_mimetype)
+    response_obj.cache_control.public = True
+    response_obj.cache_control.max_age = config.WEB_SETTINGS['cache_timeout']
+    return response_obj
 
 
 ## Lightweight image info endpoint removed
@@ -0,0 +1,414 @@
+"""
+Batch Conversion Engine
+=======================
+
+This module converts whole folders of .IMG files (or lists of URLs) across a
+process pool, following BATCH_SETTINGS:
+
+- max_workers: size of the process pool (None = one per core)
+- skip_existing: outputs newer than their input are left untouched
+- continue_on_error: a failed file does not stop the batch
+- generate_report: JSON and CSV reports with per-file timings and throughput
+- input_extensions: files picked up when scanning INPUT_DIR
+
+Each worker process builds its own ImageConverter once and splits the cores
+left for multi-threaded enhancement with the other workers.
+
+Author: NASA Image Converter Team
+License: MIT
+"""
+
+import os
+import csv
+import json
+import time
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+from urllib.parse import urlparse, unquote
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional, Union, List, Dict, Any, Callable
+
+from config import ProcessingConfig
+from conversion_cache import OUTPUT_FORMATS
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+# Columns of the CSV report (also the keys of each JSON report entry)
+REPORT_FIELDS = ('source', 'output', 'status', 'seconds', 'input_mb', 'output_mb', 'error')
+
+# Per-process converter state, created by _init_worker
+_worker = {}
+
+
+def _init_worker(config: ProcessingConfig, settings: Dict[str, Dict[str, Any]], workers: int):
+    """Create the converters of one pool process."""
+    from simple_converter import ImageConverter
+    from streaming_converter import StreamingConverter
+
+    # Settings live on the class: re-apply the parent's values (spawned
+    # processes re-import config.py and would otherwise see the defaults)
+    for category, values in settings.items():
+        getattr(config, category).update(values)
+
+    # Share the cores between the pool processes instead of oversubscribing
+    config.CONVERSION_SETTINGS['enhance_workers'] = max(1, (os.cpu_count() or 1) // workers)
+    _worker['config'] = config
+    _worker['converter'] = ImageConverter(config)
+    _worker['streaming'] = StreamingConverter(config)
+
+
+def _convert_task(task: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert one file or URL in a pool process.
+
+    Args:
+        task (dict): source, output, is_url, format, enhance, max_dimension
+
+    Returns:
+        dict: Report entry (see REPORT_FIELDS)
+    """
+    start = time.time()
+    entry = {'source': task['source'], 'output': task['output'], 'status': 'failed',
+             'seconds': 0.0, 'input_mb': 0.0, 'output_mb': 0.0, 'error': ''}
+    temp_file = None
+    partial_path = None
+    try:
+        input_path = task['source']
+        if task['is_url']:
+            temp_dir = _worker['config'].TEMP_DIR
+            temp_dir.mkdir(parents=True, exist_ok=True)
+            temp_fd, temp_file = tempfile.mkstemp(suffix='.img', dir=temp_dir)
+            os.close(temp_fd)
+            if not _worker['streaming'].download_with_resume(task['source'], temp_file):
+                raise RuntimeError("Download failed")
+            input_path = temp_file
+        entry['input_mb'] = os.path.getsize(input_path) / (1024 * 1024)
+
+        # Write under a hidden name so an interrupted file never looks up to date
+        output_path = Path(task['output'])
+        partial_path = output_path.with_name(f".{output_path.stem}.{os.getpid()}.partial{output_path.suffix}")
+        success = _worker['converter'].convert_file(
+            input_path, partial_path, format=task['format'],
+            enhance=task['enhance'], max_dimension=task['max_dimension'])
+        if not success:
+            raise RuntimeError("Conversion failed")
+        os.replace(partial_path, output_path)
+        entry['output_mb'] = os.path.getsize(task['output']) / (1024 * 1024)
+        entry['status'] = 'converted'
+    except Exception as e:
+        entry['error'] = str(e)
+    finally:
+        for path in (temp_file, partial_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+    entry['seconds'] = time.time() - start
+    return entry
+
+
+class BatchConverter:
+    """
+    Convert many files in parallel processes.
+
+    Example:
+        >>> batch = BatchConverter()
+        >>> summary = batch.convert_directory(format='PNG')
+        >>> summary['converted'], summary['failed']
+        (120, 0)
+    """
+
+    def __init__(self, config: Optional[ProcessingConfig] = None):
+        """
+        Initialize the BatchConverter.
+
+        Args:
+            config (ProcessingConfig, optional): Configuration object
+        """
+        self.config = config or ProcessingConfig()
+        self.batch_settings = self.config.BATCH_SETTINGS
+        self.max_workers = self.batch_settings.get('max_workers') or os.cpu_count() or 1
+        self.skip_existing = self.batch_settings.get('skip_existing', True)
+        self.continue_on_error = self.batch_settings.get('continue_on_error', True)
+        self.generate_report = self.batch_settings.get('generate_report', True)
+        self.input_extensions = set(self.batch_settings.get('input_extensions', ['.img', '.IMG']))
+
+    def find_inputs(self, input_dir: Optional[Union[str, Path]] = None,
+                    recursive: bool = True) -> List[Path]:
+        """
+        List the input files of a folder.
+
+        Args:
+            input_dir (str or Path, optional): Folder to scan. Defaults to INPUT_DIR.
+            recursive (bool): Also scan sub-folders
+
+        Returns:
+            list: Paths with an extension from BATCH_SETTINGS['input_extensions'], sorted
+        """
+        input_dir = Path(input_dir or self.config.INPUT_DIR)
+        pattern = '**/*' if recursive else '*'
+        return sorted(path for path in input_dir.glob(pattern)
+                      if path.is_file() and path.suffix in self.input_extensions)
+
+    @staticmethod
+    def read_manifest(manifest_path: Union[str, Path]) -> List[str]:
+        """
+        Read a URL manifest: one URL per line, blank lines and '#' comments ignored.
+
+        Args:
+            manifest_path (str or Path): Manifest file
+
+        Returns:
+            list: URLs in file order
+        """
+        urls = []
+        with open(manifest_path) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    urls.append(line)
+        return urls
+
+    def is_up_to_date(self, source: Union[str, Path], output_path: Path, is_url: bool) -> bool:
+        """
+        Whether an output can be skipped.
+
+        Args:
+            source (str or Path): Input file or URL
+            output_path (Path): Expected output
+            is_url (bool): Whether source is a URL (any existing output counts)
+
+        Returns:
+            bool: True if the output exists and is not older than the input
+        """
+        try:
+            output_mtime = output_path.stat().st_mtime
+        except OSError:
+            return False
+        return is_url or output_mtime >= os.path.getmtime(source)
+
+    def url_output_name(self, url: str, used: set) -> str:
+        """Output stem for a URL: its file name, disambiguated by a hash if taken."""
+        stem = Path(unquote(urlparse(url).path)).stem or 'image'
+        if stem in used:
+            stem = f"{stem}_{hashlib.md5(url.encode()).hexdigest()[:8]}"
+        used.add(stem)
+        return stem
+
+    @staticmethod
+    def _entry(task: Dict[str, Any], status: str, error: str = '') -> Dict[str, Any]:
+        """Report entry of a task that was not converted."""
+        return {'source': task['source'], 'output': task['output'], 'status': status,
+                'seconds': 0.0, 'input_mb': 0.0, 'output_mb': 0.0, 'error': error}
+
+    @staticmethod
+    def make_task(source: Union[str, Path], output: Union[str, Path], is_url: bool = False,
+                  format: str = 'PNG', enhance: bool = True,
+                  max_dimension: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Describe one conversion for run().
+
+        Args:
+            source (str or Path): Input file or URL
+            output (str or Path): Output file
+            is_url (bool): Whether source must be downloaded first
+            format (str): Output format ('TIFF', 'PNG', 'JPEG', 'WEBP')
+            enhance (bool): Apply visual enhancements
+            max_dimension (int, optional): Maximum output dimension
+
+        Returns:
+            dict: Task
+        """
+        return {
+            'source': str(source),
+            'output': str(output),
+            'is_url': is_url,
+            'format': format.upper(),
+            'enhance': enhance,
+            'max_dimension': max_dimension,
+        }
+
+    def run(self, tasks: List[Dict[str, Any]], output_dir: Path,
+            progress: Optional[Callable[[Dict[str, Any], int, int], None]] = None) -> Dict[str, Any]:
+        """
+        Execute conversion tasks on the process pool.
+
+        Args:
+            tasks (list): Tasks from make_task
+            output_dir (Path): Folder receiving outputs and reports
+            progress (callable, optional): Called as progress(entry, done, total)
+                                           after each file (skipped files included)
+
+        Returns:
+            dict: Summary with counts, timings, throughput and per-file entries
+        """
+        start = time.time()
+        entries = []
+        pending = []
+        for task in tasks:
+            if self.skip_existing and self.is_up_to_date(task['source'], Path(task['output']),
+                                                         task['is_url']):
+                entries.append(self._entry(task, 'skipped'))
+                if progress:
+                    progress(entries[-1], len(entries), len(tasks))
+            else:
+                Path(task['output']).parent.mkdir(parents=True, exist_ok=True)
+                pending.append(task)
+
+        workers = max(1, min(self.max_workers, len(pending)))
+        logger.info(f"Batch: {len(pending)} to convert, {len(entries)} up to date, "
+                    f"{workers} processes")
+        if pending:
+            stopped = False
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(self.config, self.config.get_config_dict(),
+                                               workers)) as executor:
+                futures = {executor.submit(_convert_task, task): task for task in pending}
+                for future in as_completed(futures):
+                    task = futures[future]
+                    if future.cancelled():
+                        entries.append(self._entry(task, 'cancelled'))
+                        if progress:
+                            progress(entries[-1], len(entries), len(tasks))
+                        continue
+                    try:
+                        entry = future.result()
+                    except Exception as e:
+                        # The worker process itself died (e.g. out of memory)
+                        entry = self._entry(task, 'failed', error=f"Worker crashed: {e}")
+                    entries.append(entry)
+                    if entry['status'] == 'failed':
+                        logger.error(f"Batch: {entry['source']} failed: {entry['error']}")
+                        if not self.continue_on_error and not stopped:
+                            logger.error("Batch: stopping (continue_on_error is disabled)")
+                            for other in futures:
+                                other.cancel()
+                            stopped = True
+                    else:
+                        logger.info(f"Batch: {entry['source']} converted in {entry['seconds']:.1f}s")
+                    if progress:
+                        progress(entry, len(entries), len(tasks))
+
+        summary = self.summarize(entries, time.time() - start, workers)
+        if self.generate_report:
+            summary['reports'] = [str(path) for path in self.write_report(summary, output_dir)]
+        return summary
+
+    def summarize(self, entries: List[Dict[str, Any]], elapsed: float, workers: int) -> Dict[str, Any]:
+        """
+        Totals and throughput of a batch.
+
+        Args:
+            entries (list): Per-file report entries
+            elapsed (float): Wall-clock seconds
+            workers (int): Pool size used
+
+        Returns:
+            dict: Summary including the entries
+        """
+        converted = [entry for entry in entries if entry['status'] == 'converted']
+        input_mb = sum(entry['input_mb'] for entry in converted)
+        return {
+            'total': len(entries),
+            'converted': len(converted),
+            'skipped': sum(1 for entry in entries if entry['status'] == 'skipped'),
+            'failed': sum(1 for entry in entries if entry['status'] == 'failed'),
+            'cancelled': sum(1 for entry in entries if entry['status'] == 'cancelled'),
+            'workers': workers,
+            'elapsed_seconds': round(elapsed, 3),
+            'cpu_seconds': round(sum(entry['seconds'] for entry in converted), 3),
+            'files_per_second': round(len(converted) / elapsed, 3) if elapsed else 0.0,
+            'input_mb_per_second': round(input_mb / elapsed, 3) if elapsed else 0.0,
+            'files': sorted(entries, key=lambda entry: str(entry['source'])),
+        }
+
+    def write_report(self, summary: Dict[str, Any], output_dir: Path) -> List[Path]:
+        """
+        Write the batch report as JSON (summary and entries) and CSV (entries).
+
+        Args:
+            summary (dict): Result of summarize
+            output_dir (Path): Folder for the reports
+
+        Returns:
+            list: Paths of the JSON and CSV reports
+        """
+        output_dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime('%Y%m%d_%H%M%S')
+        json_path = output_dir / f"batch_report_{stamp}.json"
+        csv_path = output_dir / f"batch_report_{stamp}.csv"
+
+        with open(json_path, 'w') as f:
+            json.dump(summary, f, indent=2, default=str)
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            for entry in summary['files']:
+                writer.writerow({key: entry[key] for key in REPORT_FIELDS})
+
+        logger.info(f"Batch report written to {json_path} and {csv_path}")
+        return [json_path, csv_path]
+
+    def convert_directory(self, input_dir: Optional[Union[str, Path]] = None,
+                          output_dir: Optional[Union[str, Path]] = None,
+                          format: str = 'PNG', enhance: bool = True,
+                          max_dimension: Optional[int] = None,
+                          recursive: bool = True,
+                          progress: Optional[Callable[[Dict[str, Any], int, int], None]] = None
+                          ) -> Dict[str, Any]:
+        """
+        Convert every input file of a folder, mirroring its tree in output_dir.
+
+        Args:
+            input_dir (str or Path, optional): Defaults to INPUT_DIR
+            output_dir (str or Path, optional): Defaults to OUTPUT_DIR
+            format (str): Output format ('TIFF', 'PNG', 'JPEG', 'WEBP')
+            enhance (bool): Apply visual enhancements
+            max_dimension (int, optional): Maximum output dimension
+            recursive (bool): Also convert files in sub-folders
+            progress (callable, optional): Per-file callback (see run)
+
+        Returns:
+            dict: Batch summary (see summarize)
+        """
+        input_dir = Path(input_dir or self.config.INPUT_DIR)
+        output_dir = Path(output_dir or self.config.OUTPUT_DIR)
+        extension = OUTPUT_FORMATS[format.upper()][0]
+        tasks = [self.make_task(path, (output_dir / path.relative_to(input_dir)).with_suffix(f'.{extension}'),
+                                False, format, enhance, max_dimension)
+                 for path in self.find_inputs(input_dir, recursive)]
+        return self.run(tasks, output_dir, progress)
+
+    def convert_manifest(self, manifest_path: Union[str, Path],
+                         output_dir: Optional[Union[str, Path]] = None,
+                         format: str = 'PNG', enhance: bool = True,
+                         max_dimension: Optional[int] = None,
+                         progress: Optional[Callable[[Dict[str, Any], int, int], None]] = None
+                         ) -> Dict[str, Any]:
+        """
+        Download and convert every URL of a manifest.
+
+        Args:
+            manifest_path (str or Path): Manifest (see read_manifest)
+            output_dir (str or Path, optional): Defaults to OUTPUT_DIR
+            format (str): Output format ('TIFF', 'PNG', 'JPEG', 'WEBP')
+            enhance (bool): Apply visual enhancements
+            max_dimension (int, optional): Maximum output dimension
+            progress (callable, optional): Per-file callback (see run)
+
+        Returns:
+            dict: Batch summary (see summarize)
+        """
+        output_dir = Path(output_dir or self.config.OUTPUT_DIR)
+        extension = OUTPUT_FORMATS[format.upper()][0]
+        used = set()
+        tasks = [self.make_task(url, output_dir / f"{self.url_output_name(url, used)}.{extension}",
+                                True, format, enhance, max_dimension)
+                 for url in self.read_manifest(manifest_path)]
+        return self.run(tasks, output_dir, progress)
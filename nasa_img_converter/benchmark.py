@@ -0,0 +1,602 @@
+"""
+Conversion Benchmark
+====================
+
+This module measures the conversion pipeline on synthetic PDS3 and PDS4
+files instead of relying on estimated speedups. For every combination of
+PDS version, size, sample type, band count and configuration profile it:
+
+- generates the fixture once (deterministic gradient + noise + hot pixels,
+  written strip by strip so large fixtures never sit in memory)
+- times each stage of the numpy pipeline: detect, load, reduce (only with
+  --max-dimension), normalize, enhance, resize, encode
+- times convert_file end to end with the strategy chosen by the planner
+  (recorded with each run, so result files can seed PLANNER_SETTINGS)
+- records the peak RSS of each run
+
+Every run happens in a fresh process so peak RSS and caches are not shared
+between cases. Results are written as JSON (environment + runs) and CSV.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --sizes 2048,8192 --dtypes uint16 --profiles fast,quality
+    python benchmark.py --versions PDS3 --format TIFF --repeat 3 -o bench/
+
+Note: load only maps memory-mapped rasters; their pages are read during the
+next stage. In the VIPS engine resizing is fused into the encode stage, so
+resize is reported as null there.
+
+Author: NASA Image Converter Team
+License: MIT
+"""
+
+import gc
+import os
+import sys
+import csv
+import json
+import time
+import logging
+import platform
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+from itertools import product
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List, Dict, Any
+
+import numpy as np
+from PIL import Image
+
+from config_fast import PROFILES
+from conversion_cache import OUTPUT_FORMATS
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+# Pipeline stages, in order
+STAGES = ('detect', 'load', 'reduce', 'normalize', 'enhance', 'resize', 'encode')
+
+# Sample type -> (PDS3 SAMPLE_TYPE, PDS4 data_type, big-endian dtype, synthetic value range)
+SAMPLE_FORMATS = {
+    'uint8': ('UNSIGNED_INTEGER', 'UnsignedByte', '|u1', (0, 255)),
+    'uint16': ('MSB_UNSIGNED_INTEGER', 'UnsignedMSB2', '>u2', (0, 4095)),
+    'int16': ('MSB_INTEGER', 'SignedMSB2', '>i2', (-2048, 2047)),
+    'float32': ('IEEE_REAL', 'IEEE754MSBSingle', '>f4', (0.0, 1.0)),
+}
+
+# Rows generated per write when building fixtures
+FIXTURE_STRIP_ROWS = 256
+
+# Columns of the CSV results (stage timings follow as stage_<name>)
+RESULT_FIELDS = ('version', 'size', 'dtype', 'bands', 'profile', 'format', 'max_dimension',
+                 'enhance', 'mode', 'run', 'status', 'error', 'strategy', 'engine', 'input_mb',
+                 'raster_mb',
+                 'output_mb', 'total_seconds', 'input_mb_per_second', 'baseline_rss_mb',
+                 'peak_rss_mb')
+
+PDS3_LABEL_TEMPLATE = (
+    "PDS_VERSION_ID = PDS3\r\n"
+    "RECORD_TYPE = FIXED_LENGTH\r\n"
+    "RECORD_BYTES = {record_bytes}\r\n"
+    "FILE_RECORDS = {file_records}\r\n"
+    "LABEL_RECORDS = {label_records}\r\n"
+    "^IMAGE = {image_record}\r\n"
+    "OBJECT = IMAGE\r\n"
+    "  LINES = {lines}\r\n"
+    "  LINE_SAMPLES = {samples}\r\n"
+    "  SAMPLE_TYPE = {sample_type}\r\n"
+    "  SAMPLE_BITS = {sample_bits}\r\n"
+    "  BANDS = {bands}\r\n"
+    "  BAND_STORAGE_TYPE = BAND_SEQUENTIAL\r\n"
+    "END_OBJECT = IMAGE\r\n"
+    "END\r\n"
+)
+
+PDS4_LABEL_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<Product_Observational xmlns="http://pds.nasa.gov/pds4/pds/v1">
+  <Identification_Area>
+    <logical_identifier>urn:nasa:pds:benchmark:synthetic:{name}</logical_identifier>
+    <version_id>1.0</version_id>
+    <title>Synthetic benchmark image</title>
+    <information_model_version>1.11.0.0</information_model_version>
+    <product_class>Product_Observational</product_class>
+  </Identification_Area>
+  <File_Area_Observational>
+    <File>
+      <file_name>{data_file}</file_name>
+    </File>
+    <{array_class}>
+      <local_identifier>image</local_identifier>
+      <offset unit="byte">0</offset>
+      <axes>{axes}</axes>
+      <axis_index_order>Last Index Fastest</axis_index_order>
+      <Element_Array>
+        <data_type>{data_type}</data_type>
+      </Element_Array>
+{axis_arrays}    </{array_class}>
+  </File_Area_Observational>
+</Product_Observational>
+"""
+
+PDS4_AXIS_TEMPLATE = """      <Axis_Array>
+        <axis_name>{name}</axis_name>
+        <elements>{elements}</elements>
+        <sequence_number>{sequence}</sequence_number>
+      </Axis_Array>
+"""
+
+
+def synthetic_rows(start: int, stop: int, size: int, band: int, dtype_name: str) -> np.ndarray:
+    """
+    Rows of a deterministic synthetic scene.
+
+    A diagonal gradient with a sine texture and Gaussian noise spans the
+    value range, with sparse saturated pixels so percentile windows matter.
+
+    Args:
+        start (int): First row
+        stop (int): Row after the last one
+        size (int): Image width and height
+        band (int): Band index (shifts the pattern)
+        dtype_name (str): Key of SAMPLE_FORMATS
+
+    Returns:
+        np.ndarray: (stop - start, size) array in the big-endian sample dtype
+    """
+    low, high = SAMPLE_FORMATS[dtype_name][3]
+    rng = np.random.default_rng((start, band))
+    y = np.arange(start, stop, dtype=np.float32)[:, None] / size
+    x = np.arange(size, dtype=np.float32)[None, :] / size
+    scene = 0.45 * (x + y) + 0.08 * np.sin(40 * x + 7 * band) * np.cos(30 * y)
+    scene += rng.normal(0.05, 0.02, scene.shape).astype(np.float32)
+    hot = rng.random(scene.shape) < 1e-4
+    scene[hot] = 1.0
+    values = low + np.clip(scene, 0, 1) * (high - low)
+    dtype = np.dtype(SAMPLE_FORMATS[dtype_name][2])
+    if dtype.kind in 'ui':
+        values = np.rint(values)
+    return values.astype(dtype)
+
+
+def _write_raster(f, size: int, bands: int, dtype_name: str):
+    """Write a band-sequential synthetic raster strip by strip."""
+    for band in range(bands):
+        for start in range(0, size, FIXTURE_STRIP_ROWS):
+            stop = min(start + FIXTURE_STRIP_ROWS, size)
+            f.write(synthetic_rows(start, stop, size, band, dtype_name).tobytes())
+
+
+def write_pds3_fixture(path: Path, size: int, dtype_name: str, bands: int = 1) -> Path:
+    """
+    Write a synthetic PDS3 image with an attached label.
+
+    Args:
+        path (Path): Output .IMG file
+        size (int): Width and height
+        dtype_name (str): Key of SAMPLE_FORMATS
+        bands (int): Number of bands (band sequential)
+
+    Returns:
+        Path: path
+    """
+    sample_type, _, dtype, _ = SAMPLE_FORMATS[dtype_name]
+    sample_bytes = np.dtype(dtype).itemsize
+    record_bytes = size * sample_bytes
+    values = dict(record_bytes=record_bytes, lines=size, samples=size, sample_type=sample_type,
+                  sample_bits=8 * sample_bytes, bands=bands)
+    # Grow the label until it fits in its own records
+    label_records = 1
+    while True:
+        values.update(label_records=label_records, image_record=label_records + 1,
+                      file_records=label_records + size * bands)
+        label = PDS3_LABEL_TEMPLATE.format(**values).encode('ascii')
+        if len(label) <= label_records * record_bytes:
+            break
+        label_records += 1
+
+    with open(path, 'wb') as f:
+        f.write(label.ljust(values['label_records'] * record_bytes, b' '))
+        _write_raster(f, size, bands, dtype_name)
+    return path
+
+
+def write_pds4_fixture(path: Path, size: int, dtype_name: str, bands: int = 1) -> Path:
+    """
+    Write a synthetic PDS4 product: XML label plus detached raw data file.
+
+    Args:
+        path (Path): Output label (.xml); the data goes next to it as .img
+        size (int): Width and height
+        dtype_name (str): Key of SAMPLE_FORMATS
+        bands (int): Number of bands (band sequential)
+
+    Returns:
+        Path: Label path
+    """
+    data_path = path.with_suffix('.img')
+    with open(data_path, 'wb') as f:
+        _write_raster(f, size, bands, dtype_name)
+
+    axes = [('Line', size), ('Sample', size)]
+    if bands > 1:
+        axes.insert(0, ('Band', bands))
+    axis_arrays = ''.join(PDS4_AXIS_TEMPLATE.format(name=name, elements=elements, sequence=i + 1)
+                          for i, (name, elements) in enumerate(axes))
+    path.write_text(PDS4_LABEL_TEMPLATE.format(
+        name=path.stem.lower(), data_file=data_path.name,
+        array_class='Array_3D_Image' if bands > 1 else 'Array_2D_Image',
+        axes=len(axes), data_type=SAMPLE_FORMATS[dtype_name][1], axis_arrays=axis_arrays))
+    return path
+
+
+def make_fixture(directory: Path, version: str, size: int, dtype_name: str, bands: int) -> Path:
+    """
+    Synthetic input file of one benchmark case, generated on first use.
+
+    Args:
+        directory (Path): Fixture folder
+        version (str): 'PDS3' or 'PDS4'
+        size (int): Width and height
+        dtype_name (str): Key of SAMPLE_FORMATS
+        bands (int): Number of bands
+
+    Returns:
+        Path: File to pass to the converter (.IMG for PDS3, .xml label for PDS4)
+    """
+    name = f"{version.lower()}_{size}_{dtype_name}_{bands}b"
+    if version == 'PDS3':
+        path, writer = directory / f"{name}.IMG", write_pds3_fixture
+    else:
+        path, writer = directory / f"{name}.xml", write_pds4_fixture
+    if not path.exists():
+        directory.mkdir(parents=True, exist_ok=True)
+        start = time.time()
+        writer(path, size, dtype_name, bands)
+        logger.info(f"Fixture {path.name} written in {time.time() - start:.1f}s")
+    return path
+
+
+def fixture_bytes(path: Path) -> int:
+    """Size of a fixture including its detached data file."""
+    data_path = path.with_suffix('.img')
+    if path.suffix == '.xml' and data_path.exists():
+        return path.stat().st_size + data_path.stat().st_size
+    return path.stat().st_size
+
+
+def rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far (MB), None if unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class StageTimer:
+    """Accumulate wall-clock seconds and the peak RSS reached after each stage."""
+
+    def __init__(self):
+        self.seconds = {stage: None for stage in STAGES}
+        self.peak_rss_mb = {}
+
+    def time(self, stage: str, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.seconds[stage] = (self.seconds[stage] or 0.0) + time.perf_counter() - start
+        self.peak_rss_mb[stage] = rss_mb()
+        return result
+
+
+def _run_stages(converter, case: Dict[str, Any], output_path: Path, timer: StageTimer) -> str:
+    """Run the numpy pipeline of convert_file stage by stage; return the engine used."""
+    input_path = case['input']
+    max_dimension = case['max_dimension']
+    version = timer.time('detect', converter.detect_pds_version, input_path)
+    img_data = timer.time('load', converter.load_pds_image, input_path, version)
+    if img_data is None:
+        raise ValueError(f"Could not load {version} image")
+    if max_dimension:
+        img_data = timer.time('reduce', converter.reduce_for_target, img_data, max_dimension)
+    img_data = timer.time('normalize', converter.normalize_image, img_data)
+    if case['enhance']:
+        img_data = timer.time('enhance', converter.enhance_image, img_data)
+
+    total_pixels = img_data.shape[0] * img_data.shape[1]
+    vips_threshold = converter.conversion_settings.get('vips_threshold_pixels', 10_000_000)
+    if converter.vips_available and total_pixels > vips_threshold:
+        success = timer.time('encode', converter.convert_with_vips, img_data, output_path,
+                             case['format'], max_dimension)
+        engine = 'vips'
+    else:
+        img = converter.convert_to_pil(img_data)
+        if max_dimension and max(img.size) > max_dimension:
+            timer.time('resize', img.thumbnail, (max_dimension, max_dimension),
+                       Image.Resampling.LANCZOS)
+        success = timer.time('encode', converter.save_image, img, output_path, case['format'])
+        engine = 'pil'
+    if not success:
+        raise ValueError("Encoding failed")
+    return engine
+
+
+def run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Benchmark one case (executed in a fresh worker process).
+
+    Args:
+        case (dict): Case description (see build_cases) with 'mode' set to
+                     'stages' or 'end_to_end'
+
+    Returns:
+        dict: Result row
+    """
+    from simple_converter import ImageConverter
+
+    logging.getLogger().setLevel(logging.WARNING)
+    config = PROFILES[case['profile']]()
+    converter = ImageConverter(config)
+    output_path = Path(case['output_dir']) / f"{os.getpid()}.{OUTPUT_FORMATS[case['format']][0]}"
+
+    result = {key: case[key] for key in RESULT_FIELDS if key in case}
+    result.update(status='ok', error='', strategy=None, engine=None, raster_mb=None, output_mb=None,
+                  input_mb=round(fixture_bytes(Path(case['input'])) / (1024 * 1024), 3),
+                  baseline_rss_mb=rss_mb())
+    timer = StageTimer()
+    start = time.perf_counter()
+    try:
+        if case['mode'] == 'stages':
+            result['engine'] = _run_stages(converter, case, output_path, timer)
+        else:
+            plan = converter.planner.plan_file(case['input'], case['format'], case['enhance'],
+                                               case['max_dimension'])
+            if not converter.convert_file(case['input'], output_path, case['format'],
+                                          case['enhance'], case['max_dimension'], plan):
+                raise ValueError("convert_file failed")
+            result.update(strategy=plan.strategy, engine=plan.engine,
+                          raster_mb=plan.raster_mb and round(plan.raster_mb, 3))
+        result['total_seconds'] = round(time.perf_counter() - start, 4)
+        result['output_mb'] = round(output_path.stat().st_size / (1024 * 1024), 3)
+        result['input_mb_per_second'] = round(result['input_mb'] / result['total_seconds'], 2)
+    except Exception as e:
+        result.update(status='failed', error=str(e), total_seconds=None, input_mb_per_second=None)
+    finally:
+        gc.collect()
+        if output_path.exists():
+            output_path.unlink()
+
+    result['peak_rss_mb'] = rss_mb()
+    result['stages'] = {stage: None if seconds is None else round(seconds, 4)
+                        for stage, seconds in timer.seconds.items()}
+    result['stage_peak_rss_mb'] = timer.peak_rss_mb
+    return result
+
+
+def build_cases(args: argparse.Namespace, fixtures_dir: Path, output_dir: Path) -> List[Dict[str, Any]]:
+    """
+    Expand the benchmark matrix, generating missing fixtures.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments
+        fixtures_dir (Path): Fixture folder
+        output_dir (Path): Scratch folder for converted outputs
+
+    Returns:
+        list: One case per (fixture, profile, mode, run)
+    """
+    cases = []
+    modes = [mode for mode, enabled in (('stages', not args.end_to_end_only),
+                                        ('end_to_end', not args.stages_only)) if enabled]
+    for version, size, dtype_name, bands in product(args.versions, args.sizes,
+                                                    args.dtypes, args.bands):
+        input_path = make_fixture(fixtures_dir, version, size, dtype_name, bands)
+        for profile, mode, run in product(args.profiles, modes, range(args.repeat)):
+            cases.append({
+                'version': version, 'size': size, 'dtype': dtype_name, 'bands': bands,
+                'profile': profile, 'format': args.format,
+                'max_dimension': args.max_dimension, 'enhance': args.enhance,
+                'mode': mode, 'run': run,
+                'input': str(input_path), 'output_dir': str(output_dir),
+            })
+    return cases
+
+
+def environment() -> Dict[str, Any]:
+    """Versions and hardware the results were measured on."""
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pillow': Image.__version__,
+        'pyvips': None,
+    }
+    try:
+        import pyvips
+        info['pyvips'] = f"{pyvips.version(0)}.{pyvips.version(1)}.{pyvips.version(2)}"
+    except (ImportError, OSError):
+        pass
+    return info
+
+
+def summarize(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Median timings per case over the repeated runs.
+
+    Args:
+        results (list): Result rows
+
+    Returns:
+        list: One row per case with median total and stage seconds
+    """
+    groups = {}
+    for result in results:
+        key = tuple(result[field] for field in ('version', 'size', 'dtype', 'bands',
+                                                'profile', 'mode'))
+        groups.setdefault(key, []).append(result)
+
+    summary = []
+    for key, runs in groups.items():
+        ok = [run for run in runs if run['status'] == 'ok']
+        row = dict(zip(('version', 'size', 'dtype', 'bands', 'profile', 'mode'), key))
+        row['runs'] = len(runs)
+        row['failed'] = len(runs) - len(ok)
+        row['engine'] = ok[0]['engine'] if ok else None
+        row['total_seconds'] = statistics.median(run['total_seconds'] for run in ok) if ok else None
+        row['peak_rss_mb'] = max((run['peak_rss_mb'] or 0 for run in ok), default=None)
+        row['stages'] = {}
+        for stage in STAGES:
+            values = [run['stages'][stage] for run in ok if run['stages'][stage] is not None]
+            row['stages'][stage] = statistics.median(values) if values else None
+        summary.append(row)
+    return summary
+
+
+def write_results(report: Dict[str, Any], output_dir: Path) -> List[Path]:
+    """
+    Write the benchmark as JSON (environment, runs, summary) and CSV (runs).
+
+    Args:
+        report (dict): Benchmark report
+        output_dir (Path): Folder for the results
+
+    Returns:
+        list: Paths of the JSON and CSV files
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime('%Y%m%d_%H%M%S')
+    json_path = output_dir / f"benchmark_{stamp}.json"
+    csv_path = output_dir / f"benchmark_{stamp}.csv"
+
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    fields = list(RESULT_FIELDS) + [f"stage_{stage}" for stage in STAGES]
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for result in report['runs']:
+            row = dict(result)
+            row.update({f"stage_{stage}": seconds for stage, seconds in result['stages'].items()})
+            writer.writerow(row)
+    return [json_path, csv_path]
+
+
+def print_result(result: Dict[str, Any], done: int, total: int):
+    """Print one finished run."""
+    label = (f"{result['version']} {result['size']}px {result['dtype']} {result['bands']}b "
+             f"{result['profile']} {result['mode']}")
+    if result['status'] != 'ok':
+        print(f"[{done}/{total}] {label}: FAILED ({result['error']})", flush=True)
+        return
+    stages = ' '.join(f"{stage}={seconds:.3f}" for stage, seconds in result['stages'].items()
+                      if seconds is not None)
+    print(f"[{done}/{total}] {label}: {result['total_seconds']:.3f}s "
+          f"({result['input_mb_per_second']} MB/s, peak {result['peak_rss_mb']:.0f} MB, "
+          f"{':'.join(filter(None, (result['strategy'], result['engine'])))}) {stages}", flush=True)
+
+
+def _list(cast):
+    return lambda value: [cast(item.strip()) for item in value.split(',') if item.strip()]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Command-line arguments of the benchmark.
+
+    Returns:
+        argparse.ArgumentParser: Parser
+    """
+    parser = argparse.ArgumentParser(
+        prog='benchmark.py',
+        description='Benchmark the conversion pipeline on synthetic PDS3/PDS4 files.')
+    parser.add_argument('--versions', type=_list(str.upper), default=['PDS3', 'PDS4'],
+                        help='PDS versions (default: PDS3,PDS4)')
+    parser.add_argument('--sizes', type=_list(int), default=[1024, 4096],
+                        help='Image widths/heights in pixels (default: 1024,4096)')
+    parser.add_argument('--dtypes', type=_list(str), default=['uint8', 'uint16'],
+                        help=f"Sample types among {','.join(SAMPLE_FORMATS)} (default: uint8,uint16)")
+    parser.add_argument('--bands', type=_list(int), default=[1],
+                        help='Band counts (default: 1)')
+    parser.add_argument('--profiles', type=_list(str), default=list(PROFILES),
+                        help=f"Configuration profiles among {','.join(PROFILES)} (default: all)")
+    parser.add_argument('-f', '--format', type=str.upper, choices=sorted(OUTPUT_FORMATS),
+                        default='PNG', help='Output format (default: %(default)s)')
+    parser.add_argument('--max-dimension', type=int, default=None,
+                        help='Maximum output width/height (enables the reduce and resize stages)')
+    parser.add_argument('--no-enhance', dest='enhance', action='store_false',
+                        help='Skip the enhance stage')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Runs per case; the summary reports medians (default: 1)')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--stages-only', action='store_true',
+                      help='Only time the stage-by-stage pipeline')
+    mode.add_argument('--end-to-end-only', action='store_true',
+                      help='Only time convert_file')
+    parser.add_argument('--fixtures-dir', default=None,
+                        help='Keep and reuse fixtures in this folder (default: temporary)')
+    parser.add_argument('-o', '--output-dir', default='benchmark_results',
+                        help='Folder for the JSON/CSV results (default: %(default)s)')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run the benchmark.
+
+    Args:
+        argv (list, optional): Arguments (defaults to sys.argv[1:])
+
+    Returns:
+        int: Exit status (0 all runs succeeded, 1 some failed, 2 usage error)
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    for name, values, allowed in (('versions', args.versions, ('PDS3', 'PDS4')),
+                                  ('dtypes', args.dtypes, SAMPLE_FORMATS),
+                                  ('profiles', args.profiles, PROFILES)):
+        unknown = [value for value in values if value not in allowed]
+        if unknown:
+            parser.error(f"unknown {name}: {', '.join(map(str, unknown))}")
+    if min(args.sizes + args.bands + [args.repeat]) < 1:
+        parser.error('sizes, bands and --repeat must be positive')
+
+    with tempfile.TemporaryDirectory(prefix='pds_benchmark_') as scratch:
+        fixtures_dir = Path(args.fixtures_dir) if args.fixtures_dir else Path(scratch) / 'fixtures'
+        cases = build_cases(args, fixtures_dir, Path(scratch))
+
+        # One fresh process per run: independent peak RSS, no warm caches
+        context = get_context('spawn')
+        results = []
+        for case in cases:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results.append(executor.submit(run_case, case).result())
+            print_result(results[-1], len(results), len(cases))
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment(),
+        'arguments': {key: value for key, value in vars(args).items()},
+        'summary': summarize(results),
+        'runs': results,
+    }
+    for path in write_results(report, Path(args.output_dir)):
+        print(f"Results: {path}")
+    return 1 if any(result['status'] != 'ok' for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
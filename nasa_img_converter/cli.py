@@ -0,0 +1,251 @@
+"""
+Command-Line Converter
+======================
+
+This module is the command-line entry point for bulk conversions. Sources
+can be files, glob patterns, folders (converted recursively, their tree
+mirrored in the output folder), http(s) URLs or manifests of URLs; the whole
+set runs on the BatchConverter process pool.
+
+Usage:
+    python cli.py input_images/ -o output_images -f PNG --profile fast
+    python cli.py 'data/**/*.IMG' --max-dimension 4096 -j 4 --memory-mb 8000
+    python cli.py --urls manifest.txt -f TIFF --profile quality
+    python cli.py data/ -f TIFF --mode science
+
+One line is printed per file as soon as it finishes (status, time, input
+throughput), followed by the batch totals. The exit status is 1 if any file
+failed, 2 on invalid arguments.
+
+Author: NASA Image Converter Team
+License: MIT
+"""
+
+import sys
+import glob
+import hashlib
+import logging
+import argparse
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+
+from config import ProcessingConfig
+from config_fast import PROFILES
+from conversion_cache import OUTPUT_FORMATS
+from planner import OUTPUT_MODES
+from batch_converter import BatchConverter
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Command-line arguments of the converter.
+
+    Returns:
+        argparse.ArgumentParser: Parser
+    """
+    parser = argparse.ArgumentParser(
+        prog='cli.py',
+        description='Convert NASA PDS .IMG files to standard image formats in parallel.')
+    parser.add_argument('sources', nargs='*',
+                        help='Files, glob patterns, folders or http(s) URLs')
+    parser.add_argument('--urls', metavar='FILE', action='append', default=[],
+                        help='Manifest of URLs (one per line, # comments); repeatable')
+    parser.add_argument('-o', '--output-dir', default=ProcessingConfig.OUTPUT_DIR,
+                        help='Output folder (default: %(default)s)')
+    parser.add_argument('-f', '--format', type=str.upper, choices=sorted(OUTPUT_FORMATS),
+                        default=ProcessingConfig.CONVERSION_SETTINGS['default_format'],
+                        help='Output format (default: %(default)s)')
+    parser.add_argument('--max-dimension', type=int, default=None,
+                        help='Maximum output width/height in pixels')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='standard',
+                        help='Configuration profile (default: %(default)s)')
+    parser.add_argument('--mode', choices=OUTPUT_MODES, default=None,
+                        help="Output mode; 'science' keeps the source samples (TIFF only)")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='Worker processes (default: BATCH_SETTINGS, None = one per core)')
+    parser.add_argument('--memory-mb', type=int, default=None,
+                        help='Total memory budget, split between the workers')
+    parser.add_argument('--no-enhance', dest='enhance', action='store_false',
+                        help='Skip visual enhancements')
+    parser.add_argument('--force', action='store_true',
+                        help='Convert even when the output is up to date')
+    parser.add_argument('--stop-on-error', action='store_true',
+                        help='Cancel the remaining files after the first failure')
+    parser.add_argument('--no-report', action='store_true',
+                        help='Do not write the JSON/CSV batch report')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='Only print failures and the totals')
+    return parser
+
+
+def make_config(profile: str, workers: Optional[int] = None,
+                memory_mb: Optional[int] = None,
+                output_mode: Optional[str] = None) -> ProcessingConfig:
+    """
+    Configuration for a run.
+
+    Settings are class attributes, so the overrides apply to the profile
+    class for the lifetime of the process (the CLI runs one batch).
+
+    Args:
+        profile (str): Key of PROFILES
+        workers (int, optional): Pool size
+        memory_mb (int, optional): Total memory budget in MB
+        output_mode (str, optional): 'visual' or 'science'
+
+    Returns:
+        ProcessingConfig: Configured profile
+    """
+    config = PROFILES[profile]()
+    if workers:
+        config.BATCH_SETTINGS['max_workers'] = workers
+    if memory_mb:
+        pool_size = BatchConverter(config).max_workers
+        per_worker = max(64, memory_mb // pool_size)
+        # Half for the libvips operation cache, strips sized to stay well inside the rest
+        config.CONVERSION_SETTINGS['vips_memory_limit_mb'] = per_worker // 2
+        config.MEMORY_SETTINGS['strip_memory_mb'] = max(8, per_worker // 8)
+    if output_mode:
+        config.CONVERSION_SETTINGS['output_mode'] = output_mode
+    return config
+
+
+def is_url(source: str) -> bool:
+    return source.startswith(('http://', 'https://'))
+
+
+def output_stem(path: Path, used: set) -> str:
+    """Output stem for a loose file: its name, disambiguated by a hash if taken."""
+    stem = path.stem
+    if stem in used:
+        stem = f"{stem}_{hashlib.md5(str(path.resolve()).encode()).hexdigest()[:8]}"
+    used.add(stem)
+    return stem
+
+
+def collect_tasks(args: argparse.Namespace, converter: BatchConverter) -> List[Dict[str, Any]]:
+    """
+    Expand the sources of the command line into conversion tasks.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments
+        converter (BatchConverter): Batch converter (input extensions, manifests)
+
+    Returns:
+        list: Tasks for BatchConverter.run, without duplicates
+
+    Raises:
+        FileNotFoundError: If a source matches nothing
+    """
+    output_dir = Path(args.output_dir)
+    extension = OUTPUT_FORMATS[args.format][0]
+    options = (args.format, args.enhance, args.max_dimension)
+    tasks, seen, used = [], set(), set()
+
+    def add(source, output, url=False):
+        key = source if url else Path(source).resolve()
+        if key not in seen:
+            seen.add(key)
+            tasks.append(converter.make_task(source, output, url, *options))
+
+    urls = [url for manifest in args.urls for url in converter.read_manifest(manifest)]
+    for source in args.sources:
+        if is_url(source):
+            urls.append(source)
+        elif Path(source).is_dir():
+            root = Path(source)
+            for path in converter.find_inputs(root, recursive=True):
+                add(path, (output_dir / root.resolve().name / path.relative_to(root))
+                    .with_suffix(f'.{extension}'))
+        else:
+            paths = [Path(match) for match in glob.glob(source, recursive=True)]
+            paths = [path for path in paths if path.is_file()]
+            if not paths:
+                raise FileNotFoundError(f"No input matches: {source}")
+            for path in sorted(paths):
+                add(path, output_dir / f"{output_stem(path, used)}.{extension}")
+
+    for url in urls:
+        add(url, output_dir / f"{converter.url_output_name(url, used)}.{extension}", url=True)
+    return tasks
+
+
+def print_progress(entry: Dict[str, Any], done: int, total: int, quiet: bool = False):
+    """Print one finished file."""
+    if quiet and entry['status'] != 'failed':
+        return
+    width = len(str(total))
+    line = f"[{done:>{width}}/{total}] {entry['status']:<9} {entry['source']}"
+    if entry['status'] == 'converted':
+        seconds = entry['seconds']
+        rate = entry['input_mb'] / seconds if seconds else 0.0
+        line += (f" -> {entry['output']} ({seconds:.2f}s, {entry['input_mb']:.1f} MB in,"
+                 f" {entry['output_mb']:.1f} MB out, {rate:.1f} MB/s)")
+    elif entry['error']:
+        line += f": {entry['error']}"
+    print(line, flush=True)
+
+
+def print_summary(summary: Dict[str, Any]):
+    """Print the batch totals."""
+    print(f"{summary['converted']} converted, {summary['skipped']} skipped, "
+          f"{summary['failed']} failed, {summary['cancelled']} cancelled "
+          f"in {summary['elapsed_seconds']:.1f}s with {summary['workers']} workers "
+          f"({summary['files_per_second']:.2f} files/s, "
+          f"{summary['input_mb_per_second']:.1f} MB/s)", flush=True)
+    for report in summary.get('reports', []):
+        print(f"Report: {report}", flush=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run the command-line converter.
+
+    Args:
+        argv (list, optional): Arguments (defaults to sys.argv[1:])
+
+    Returns:
+        int: Exit status (0 success, 1 some files failed, 2 usage error)
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.sources and not args.urls:
+        parser.error('no input given (sources or --urls)')
+    for name in ('max_dimension', 'workers', 'memory_mb'):
+        if getattr(args, name) is not None and getattr(args, name) < 1:
+            parser.error(f"--{name.replace('_', '-')} must be positive")
+    if args.mode == 'science' and args.format not in ('TIFF', 'COG'):
+        parser.error('--mode science writes TIFF only')
+    if args.quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    config = make_config(args.profile, args.workers, args.memory_mb, args.mode)
+    converter = BatchConverter(config)
+    converter.skip_existing = not args.force
+    converter.continue_on_error = not args.stop_on_error
+    converter.generate_report = not args.no_report
+
+    try:
+        tasks = collect_tasks(args, converter)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if not tasks:
+        print("No input files found.")
+        return 0
+
+    summary = converter.run(tasks, Path(args.output_dir),
+                            progress=lambda entry, done, total: print_progress(entry, done, total,
+                                                                               args.quiet))
+    print_summary(summary)
+    return 1 if summary['failed'] or summary['cancelled'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -38,6 +38,7 @@ class ProcessingConfig:
         # Output format settings
         'default_format': 'TIFF',  # TIFF for scientific accuracy, PNG, JPEG, WEBP
         'jpeg_quality': 95,
+        'progressive_jpeg': False,  # Coarse-to-fine JPEG (encoded only once complete: later first byte)
         'png_compression': 6,  # 0-9, higher = smaller file but slower
         'tiff_compression': 'tiff_deflate',  # None, 'tiff_deflate', 'jpeg', 'lzw'
         'webp_quality': 95,
@@ -48,6 +49,17 @@ class ProcessingConfig:
         'use_clahe': True,
         'clahe_clip_limit': 2.0,
         'clahe_tile_grid_size': (8, 8),
+        'enhance_workers': None,  # Threads for CLAHE / sharpening (None = all cores)
+        
+        # Output mode: 'visual' (normalized uint8, enhanced) or 'science' (TIFF
+        # keeping the samples; the stretch is only recorded as GDAL metadata)
+        'output_mode': 'visual',
+        'science_sample_type': None,  # None = source dtype, 'uint16' (rescaled) or 'float32'
+        
+        # Cloud-Optimized GeoTIFF ('COG' format): tiled TIFF with 2x overviews
+        # down to a single tile, georeferenced from IMAGE_MAP_PROJECTION
+        'cog_tile_size': 512,
+        'cog_georeference': True,
         
         # Normalization settings
         'normalize_percentiles': True,
@@ -58,6 +70,7 @@ class ProcessingConfig:
         'use_vips': True,  # Use pyvips for large images (better performance)
         'vips_threshold_pixels': 10_000_000,  # Use VIPS for images > 10M pixels
         'vips_memory_limit_mb': 2000,  # Memory limit for VIPS operations
+        'vips_native_pipeline': True,  # Read, normalize and save large PDS3 rasters entirely in VIPS
     }
     
     # Deep Zoom / Tile Generation Settings
@@ -88,9 +101,25 @@ class ProcessingConfig:
         'vips_memory_limit': 2000,
     }
     
+    # On-demand Tile Server Settings (/tiles; tile geometry from DEEPZOOM_SETTINGS)
+    TILE_SERVER_SETTINGS = {
+        # In-memory LRU of encoded tiles (in MB)
+        'memory_cache_mb': 256,
+        
+        # Keep rendered tiles on disk below the memory LRU
+        'disk_cache': True,
+        
+        # Levels up to this factor below full resolution are box-averaged,
+        # coarser levels take every n-th pixel (reads far less of the source)
+        'box_max_factor': 8,
+        
+        # Source rasters kept open (memory-mapped) at the same time
+        'max_open_sources': 16,
+    }
+    
     # Batch Processing Settings
     BATCH_SETTINGS = {
-        # Maximum concurrent processes
+        # Maximum concurrent processes (None = one per core)
         'max_workers': 4,
         
         # Skip existing files
@@ -117,6 +146,16 @@ class ProcessingConfig:
         # Chunk size for streaming large files (in bytes)
         'chunk_size': 65536,  # 64KB
         
+        # Strip-wise conversion for images larger than RAM (TIFF output)
+        'use_strip_processing': True,
+        'strip_threshold_pixels': 25_000_000,  # Use strips for images > 25M pixels
+        'strip_memory_mb': 64,  # Memory budget per strip
+        'strip_tile_size': 256,  # Tile size of the generated TIFF
+        
+        # Shrink the source before processing when max_dimension is >= 2x smaller
+        'reduce_first': True,
+        'reduce_first_method': 'box',  # 'box' (area average) or 'stride' (fastest)
+        
         # Enable garbage collection after each image
         'aggressive_gc': True,
         
@@ -124,6 +163,84 @@ class ProcessingConfig:
         'max_preview_dimension': 4096,
     }
     
+    # Conversion Planner Settings (strategy/engine choice, see planner.py)
+    PLANNER_SETTINGS = {
+        # Share of the currently available RAM one conversion may use
+        'memory_fraction': 0.5,
+        
+        # Refuse numpy conversions whose working set exceeds that share
+        # (False = convert anyway and only report it in the plan)
+        'reject_over_budget': False,
+        
+        # Measured throughput: weight of the newest measurement, and
+        # measurements needed before they override the static thresholds
+        'throughput_smoothing': 0.3,
+        'min_samples': 3,
+        
+        # benchmark.py result file used to seed the throughput model (None = none)
+        'benchmark_file': None,
+    }
+    
+    # Download Settings
+    DOWNLOAD_SETTINGS = {
+        # Parallel ranged download (used when the server accepts byte ranges)
+        'parallel_segments': 4,  # Concurrent connections per file (4-8 recommended)
+        'segment_size_mb': 8,  # Size of each ranged request
+        'min_size_for_segmented_mb': 16,  # Smaller files use a single stream
+        
+        # Retries (applied per segment for ranged downloads)
+        'max_retries': 5,
+        'backoff_factor': 2.0,
+        
+        # Socket timeout (in seconds)
+        'timeout': 300,
+    }
+    
+    # Shared HTTP Connection Pool Settings
+    HTTP_SETTINGS = {
+        # Number of distinct hosts kept in the pool
+        'pool_connections': 10,
+        
+        # Keep-alive connections per host
+        'pool_maxsize': 32,
+        
+        # Wait for a free connection instead of exceeding pool_maxsize per host
+        'pool_block': True,
+        
+        # User-Agent sent to archive servers
+        'user_agent': 'NASA-Image-Converter/1.0',
+    }
+    
+    # Conversion Cache Settings (entries expire after WEB_SETTINGS['cache_timeout'])
+    CACHE_SETTINGS = {
+        # Disk budget for converted images (in MB)
+        'max_size_mb': 5000,
+        
+        # Eviction policy when over budget: 'lru' or 'lfu'
+        'eviction_policy': 'lru',
+        
+        # Re-synchronise the in-memory index with the disk (in seconds)
+        'rescan_interval': 600,
+        
+        # Maximum wait for a concurrent conversion of the same image (in seconds)
+        'lock_timeout': 900,
+    }
+    
+    # Background Job Settings (asynchronous /jobs API)
+    JOB_SETTINGS = {
+        # Conversions running at the same time per web worker
+        'max_workers': 2,
+        
+        # Jobs waiting for a slot before submissions are rejected
+        'max_queued': 32,
+        
+        # How long finished job statuses are kept (in seconds)
+        'retention_seconds': 3600,
+        
+        # Minimum interval between progress snapshots (in seconds)
+        'progress_interval': 0.5,
+    }
+    
     # Error Handling Settings
     ERROR_SETTINGS = {
         # Log errors to file
@@ -158,6 +275,10 @@ class ProcessingConfig:
         # Cache timeout (in seconds)
         'cache_timeout': 3600,  # 1 hour
         
+        # Send PNG/JPEG results from /process while they are being encoded
+        # (chunked response; the finished file still goes to the cache)
+        'stream_responses': True,
+        
         # Enable CORS
         'enable_cors': True,
         
@@ -200,8 +321,14 @@ class ProcessingConfig:
         return {
             'CONVERSION_SETTINGS': cls.CONVERSION_SETTINGS,
             'DEEPZOOM_SETTINGS': cls.DEEPZOOM_SETTINGS,
+            'TILE_SERVER_SETTINGS': cls.TILE_SERVER_SETTINGS,
             'BATCH_SETTINGS': cls.BATCH_SETTINGS,
             'MEMORY_SETTINGS': cls.MEMORY_SETTINGS,
+            'PLANNER_SETTINGS': cls.PLANNER_SETTINGS,
+            'DOWNLOAD_SETTINGS': cls.DOWNLOAD_SETTINGS,
+            'HTTP_SETTINGS': cls.HTTP_SETTINGS,
+            'CACHE_SETTINGS': cls.CACHE_SETTINGS,
+            'JOB_SETTINGS': cls.JOB_SETTINGS,
             'ERROR_SETTINGS': cls.ERROR_SETTINGS,
             'PDS_SETTINGS': cls.PDS_SETTINGS,
             'WEB_SETTINGS': cls.WEB_SETTINGS,
@@ -89,6 +89,15 @@ class QualityProcessingConfig(ProcessingConfig):
     }
 
 
+# Profils par nom (ligne de commande, benchmark)
+PROFILES = {
+    'standard': ProcessingConfig,
+    'fast': FastProcessingConfig,
+    'balanced': BalancedProcessingConfig,
+    'quality': QualityProcessingConfig,
+}
+
+
 # Exemple d'utilisation
 if __name__ == '__main__':
     print("=== Configurations disponibles ===\n")
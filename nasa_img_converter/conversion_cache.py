@@ -0,0 +1,636 @@
+"""
+Conversion Cache
+================
+
+This module stores converted images under content-addressed keys derived from
+everything that influences the output: the source URL, the upstream validators
+(ETag / Last-Modified), the output format, max_dimension and a fingerprint of
+CONVERSION_SETTINGS. Variants of the same URL live side by side:
+
+    cache/<url hash>/<variant hash><upstream version hash>.<ext>
+
+so a 2048px request is never served an 8192px TIFF, and changing the active
+configuration (e.g. FastProcessingConfig vs ProcessingConfig) or the upstream
+file naturally misses instead of serving stale output. Because the upstream
+version comes last, the versions of one conversion can be listed, and the
+newest one served when the upstream server is unreachable.
+
+The cache is bounded: entries expire after WEB_SETTINGS['cache_timeout'] and
+the least recently (or least frequently) used entries are evicted once
+CACHE_SETTINGS['max_size_mb'] is exceeded. Lookups go through an in-memory
+index rebuilt from disk at startup and every CACHE_SETTINGS['rescan_interval'].
+
+Concurrent conversions of the same key are coalesced: the first request takes
+a per-key lock (a thread lock plus a file lock under cache/.locks, so it also
+holds across gunicorn workers), the others wait on it and are then served the
+finished file. Outputs are written under cache/.staging and atomically renamed
+into place, so readers never see a partially written file.
+
+Author: NASA Image Converter Team
+License: MIT
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, Union, Dict, Tuple, Any, Mapping
+
+from config import ProcessingConfig
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+# Bump when the conversion pipeline changes its output for identical inputs
+CACHE_VERSION = 2
+
+# Staging and lock files untouched for this long are left over from crashed workers
+STALE_FILE_SECONDS = 24 * 3600
+
+# Output format -> (file extension, MIME type)
+OUTPUT_FORMATS = {
+    'TIFF': ('tif', 'image/tiff'),
+    'COG': ('tif', 'image/tiff'),  # Cloud-Optimized GeoTIFF: tiled, with overviews
+    'PNG': ('png', 'image/png'),
+    'JPEG': ('jpg', 'image/jpeg'),
+    'WEBP': ('webp', 'image/webp'),
+}
+
+
+def settings_fingerprint(settings: Mapping[str, Any]) -> str:
+    """
+    Stable short hash of a settings dictionary.
+
+    Args:
+        settings (dict): Settings such as CONVERSION_SETTINGS
+
+    Returns:
+        str: 16 hex characters
+    """
+    encoded = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode()).hexdigest()[:16]
+
+
+def upstream_validators(headers: Mapping[str, str]) -> Dict[str, str]:
+    """
+    Extract the validators identifying one version of an upstream file.
+
+    Args:
+        headers (Mapping): HTTP response headers
+
+    Returns:
+        dict: 'etag' and/or 'last_modified' when present
+    """
+    validators = {}
+    if headers.get('ETag'):
+        validators['etag'] = headers['ETag']
+    if headers.get('Last-Modified'):
+        validators['last_modified'] = headers['Last-Modified']
+    return validators
+
+
+def variant_prefix(key: str) -> str:
+    """
+    Part of a key shared by all upstream versions of one conversion.
+
+    Args:
+        key (str): Key from ConversionCache.make_key
+
+    Returns:
+        str: '<url hash>-<variant hash>' (URL and conversion parameters)
+    """
+    url_hash, _, variant_hash = key.partition('-')
+    return f"{url_hash}-{variant_hash[:16]}"
+
+
+class CacheEntry:
+    """
+    Index record for one cached file.
+
+    Attributes:
+        path (Path): Cached file
+        size (int): Size in bytes
+        created (float): Modification time of the file (epoch seconds)
+        last_access (float): Last time the entry was served (epoch seconds)
+        hits (int): Number of times the entry was served
+    """
+
+    __slots__ = ('path', 'size', 'created', 'last_access', 'hits')
+
+    def __init__(self, path: Path, size: int, created: float, last_access: float, hits: int = 0):
+        self.path = path
+        self.size = size
+        self.created = created
+        self.last_access = last_access
+        self.hits = hits
+
+    @classmethod
+    def from_stat(cls, path: Path, st: os.stat_result) -> 'CacheEntry':
+        return cls(path, st.st_size, st.st_mtime, max(st.st_atime, st.st_mtime))
+
+
+def _try_lock_file(fd: int) -> bool:
+    """Take an exclusive lock on an open file without blocking."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock_file(fd: int):
+    """Release a lock taken by _try_lock_file."""
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class KeyLock:
+    """
+    Exclusive lock on one cache key, shared by threads and processes.
+
+    The thread lock serialises requests inside a worker; the file lock
+    serialises workers. Use ConversionCache.lock() to obtain one.
+
+    Example:
+        >>> key_lock = cache.lock(key)
+        >>> if key_lock.acquire(timeout=600):
+        ...     try:
+        ...         ...  # re-check the cache, convert, commit
+        ...     finally:
+        ...         key_lock.release()
+    """
+
+    # Polling interval while another process holds the file lock (seconds)
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, cache: 'ConversionCache', key: str):
+        self.cache = cache
+        self.key = key
+        self.lock_path = cache.cache_dir / '.locks' / f"{key}.lock"
+        self._thread_lock = None
+        self._file = None
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the key.
+
+        Args:
+            timeout (float, optional): Maximum wait in seconds (None = forever)
+
+        Returns:
+            bool: True if the lock is held
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        thread_lock = self.cache._thread_lock_for(self.key)
+        if not thread_lock.acquire(timeout=-1 if timeout is None else timeout):
+            self.cache._release_thread_lock(self.key)
+            return False
+
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.lock_path, 'a+b')
+        while not _try_lock_file(lock_file.fileno()):
+            if deadline is not None and time.monotonic() >= deadline:
+                lock_file.close()
+                thread_lock.release()
+                self.cache._release_thread_lock(self.key)
+                return False
+            time.sleep(self.POLL_INTERVAL)
+
+        # Keep the lock file fresh so stale-file cleanup never removes it while held
+        os.utime(self.lock_path)
+        self._thread_lock = thread_lock
+        self._file = lock_file
+        return True
+
+    def release(self):
+        """Release the key if it is held."""
+        if self._file is None:
+            return
+        try:
+            _unlock_file(self._file.fileno())
+        finally:
+            self._file.close()
+            self._file = None
+            self._thread_lock.release()
+            self._thread_lock = None
+            self.cache._release_thread_lock(self.key)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+        return False
+
+
+class ConversionCache:
+    """
+    Content-addressed, size-bounded store for converted images.
+
+    Example:
+        >>> cache = ConversionCache('cache')
+        >>> key = cache.make_key(url, upstream_validators(response.headers),
+        ...                      'TIFF', max_dimension=8192)
+        >>> cached = cache.get(key, 'TIFF')
+    """
+
+    def __init__(self, cache_dir: Union[str, Path],
+                 config: Optional[ProcessingConfig] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir (str or Path): Root cache directory
+            config (ProcessingConfig, optional): Configuration object
+        """
+        self.cache_dir = Path(cache_dir)
+        self.config = config or ProcessingConfig()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        cache_settings = self.config.CACHE_SETTINGS
+        self.max_bytes = cache_settings['max_size_mb'] * 1024 * 1024
+        self.ttl = self.config.WEB_SETTINGS['cache_timeout']
+        self.eviction_policy = cache_settings.get('eviction_policy', 'lru')
+        self.rescan_interval = cache_settings.get('rescan_interval', 600)
+
+        self._lock = threading.RLock()
+        self._key_locks: Dict[str, list] = {}
+        self._index: Dict[Path, CacheEntry] = {}
+        self._total_bytes = 0
+        self._last_scan = 0.0
+        self.rescan()
+
+    def make_key(self, url: str, validators: Optional[Mapping[str, str]] = None,
+                 format: str = 'TIFF', max_dimension: Optional[int] = None,
+                 **params: Any) -> str:
+        """
+        Build the cache key for one conversion.
+
+        Args:
+            url (str): Source URL
+            validators (dict, optional): Upstream ETag / Last-Modified
+            format (str): Output format
+            max_dimension (int, optional): Maximum output dimension
+            **params: Any other parameter that changes the output
+
+        Returns:
+            str: '<url hash>-<variant hash><upstream version hash>'; every
+                 upstream version of one conversion shares variant_prefix(key)
+        """
+        url_hash = hashlib.md5(url.encode()).hexdigest()
+        variant = {
+            'version': CACHE_VERSION,
+            'format': format.upper(),
+            'max_dimension': max_dimension,
+            'settings': settings_fingerprint(self.config.CONVERSION_SETTINGS),
+            'params': params,
+        }
+        upstream = settings_fingerprint(dict(validators or {}))
+        return f"{url_hash}-{settings_fingerprint(variant)}{upstream}"
+
+    def path_for(self, key: str, format: str = 'TIFF') -> Path:
+        """
+        Location of a cache entry (the file may not exist yet).
+
+        Args:
+            key (str): Key from make_key
+            format (str): Output format
+
+        Returns:
+            Path: cache/<url hash>/<variant hash>.<ext>
+        """
+        url_hash, _, variant_hash = key.partition('-')
+        if not variant_hash or not url_hash.isalnum() or not variant_hash.isalnum():
+            raise ValueError(f"Invalid cache key: {key}")
+        extension = OUTPUT_FORMATS[format.upper()][0]
+        return self.cache_dir / url_hash / f"{variant_hash}.{extension}"
+
+    @property
+    def total_bytes(self) -> int:
+        """Bytes currently accounted for in the index."""
+        return self._total_bytes
+
+    def rescan(self):
+        """
+        Rebuild the in-memory index from the files on disk.
+
+        Expired entries found during the scan are deleted and the size
+        budget is enforced afterwards. Files directly under cache_dir come
+        from the old flat layout (cache/<md5>.<ext>): no key maps to them
+        any more, so they are deleted instead of escaping TTL and budget.
+        """
+        index: Dict[Path, CacheEntry] = {}
+        now = time.time()
+        legacy = 0
+        for path in self.cache_dir.glob('*'):
+            if path.name.startswith('.') or not path.is_file():
+                continue
+            try:
+                path.unlink()
+                legacy += 1
+            except OSError as e:
+                logger.warning(f"Could not delete legacy cache file {path}: {e}")
+        if legacy:
+            logger.info(f"Deleted {legacy} cache files from the old flat layout")
+
+        for path in self.cache_dir.glob('*/*'):
+            if path.name.startswith('.') or path.parent.name.startswith('.'):
+                self._remove_stale(path, now)
+                continue
+            if not path.is_file():
+                continue
+            try:
+                entry = CacheEntry.from_stat(path, path.stat())
+            except OSError:
+                continue
+            previous = self._index.get(path)
+            if previous is not None:
+                entry.last_access = max(entry.last_access, previous.last_access)
+                entry.hits = previous.hits
+            index[path] = entry
+
+        with self._lock:
+            self._index = index
+            self._total_bytes = sum(entry.size for entry in index.values())
+            self._last_scan = time.time()
+            self.purge_expired()
+            self.enforce_budget()
+        logger.info(f"Cache index: {len(self._index)} entries, "
+                    f"{self._total_bytes / (1024*1024):.1f} MB")
+
+    def _maybe_rescan(self):
+        if self.rescan_interval and time.time() - self._last_scan > self.rescan_interval:
+            self.rescan()
+
+    def _remove_stale(self, path: Path, now: float):
+        """Delete a staging or lock file abandoned by a crashed worker."""
+        try:
+            if now - path.stat().st_mtime > STALE_FILE_SECONDS:
+                path.unlink()
+        except OSError:
+            pass
+
+    def _is_expired(self, entry: CacheEntry, now: float) -> bool:
+        return bool(self.ttl) and now - entry.created > self.ttl
+
+    def _remove(self, path: Path):
+        entry = self._index.pop(path, None)
+        if entry is not None:
+            self._total_bytes -= entry.size
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not delete cache file {path}: {e}")
+        try:
+            path.parent.rmdir()
+        except OSError:
+            pass
+
+    def get(self, key: str, format: str = 'TIFF') -> Optional[Path]:
+        """
+        Return the cached file for a key, or None on a miss.
+
+        Hits are answered from the in-memory index; only keys unknown to the
+        index cost a stat, to pick up entries written by other workers.
+
+        Args:
+            key (str): Key from make_key
+            format (str): Output format
+
+        Returns:
+            Path or None: Cached file
+        """
+        path = self.path_for(key, format)
+        self._maybe_rescan()
+        now = time.time()
+
+        with self._lock:
+            entry = self._index.get(path)
+            if entry is None:
+                try:
+                    entry = CacheEntry.from_stat(path, path.stat())
+                except OSError:
+                    return None
+                self._index[path] = entry
+                self._total_bytes += entry.size
+
+            if self._is_expired(entry, now):
+                logger.info(f"Cache entry expired: {path}")
+                self._remove(path)
+                return None
+
+            entry.last_access = now
+            entry.hits += 1
+            return path
+
+    def get_latest(self, key: str, format: str = 'TIFF') -> Optional[Tuple[str, Path]]:
+        """
+        Newest cached upstream version of the conversion a key describes.
+
+        Used when the upstream server cannot tell which version is current
+        (down, or answering with an error): any version converted with the
+        same URL and parameters is better than no answer.
+
+        Args:
+            key (str): Key from make_key (the validators part is ignored)
+            format (str): Output format
+
+        Returns:
+            tuple or None: (key, cached file) of the newest unexpired version
+        """
+        path = self.path_for(key, format)
+        url_hash, _, variant_hash = variant_prefix(key).partition('-')
+        candidates = []
+        for candidate in path.parent.glob(f"{variant_hash}*{path.suffix}"):
+            try:
+                candidates.append((candidate.stat().st_mtime, candidate.stem))
+            except OSError:
+                continue
+        for _, stem in sorted(candidates, reverse=True):
+            cached = self.get(f"{url_hash}-{stem}", format)
+            if cached is not None:
+                return f"{url_hash}-{stem}", cached
+        return None
+
+    def register(self, key: str, format: str = 'TIFF') -> Optional[Path]:
+        """
+        Add a newly written file to the index and enforce the size budget.
+
+        Args:
+            key (str): Key from make_key
+            format (str): Output format
+
+        Returns:
+            Path or None: The registered file, or None if it does not exist
+        """
+        path = self.path_for(key, format)
+        try:
+            entry = CacheEntry.from_stat(path, path.stat())
+        except OSError:
+            return None
+        entry.last_access = time.time()
+
+        with self._lock:
+            previous = self._index.pop(path, None)
+            if previous is not None:
+                self._total_bytes -= previous.size
+            self._index[path] = entry
+            self._total_bytes += entry.size
+            self.purge_expired()
+            self.enforce_budget(keep=path)
+        return path
+
+    def discard(self, key: str, format: str = 'TIFF'):
+        """
+        Forget an entry (e.g. its file was evicted by another worker).
+
+        Args:
+            key (str): Key from make_key
+            format (str): Output format
+        """
+        with self._lock:
+            self._remove(self.path_for(key, format))
+
+    def _thread_lock_for(self, key: str) -> threading.Lock:
+        with self._lock:
+            slot = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+            return slot[0]
+
+    def _release_thread_lock(self, key: str):
+        with self._lock:
+            slot = self._key_locks.get(key)
+            if slot is not None:
+                slot[1] -= 1
+                if slot[1] <= 0:
+                    del self._key_locks[key]
+
+    def lock(self, key: str) -> KeyLock:
+        """
+        Lock guarding the conversion of one key.
+
+        Args:
+            key (str): Key from make_key
+
+        Returns:
+            KeyLock: Unacquired lock
+        """
+        self.path_for(key)  # validates the key
+        return KeyLock(self, key)
+
+    def staging_path(self, key: str, format: str = 'TIFF') -> Path:
+        """
+        Unique file under cache/.staging for the converter to write.
+
+        It lives on the same file system as the entry, so commit() is a rename.
+
+        Args:
+            key (str): Key from make_key
+            format (str): Output format
+
+        Returns:
+            Path: Staging path with the same extension as the entry
+        """
+        path = self.path_for(key, format)
+        staging_dir = self.cache_dir / '.staging'
+        staging_dir.mkdir(parents=True, exist_ok=True)
+        return staging_dir / f"{key}.{uuid.uuid4().hex}{path.suffix}"
+
+    def commit(self, staging: Union[str, Path], key: str,
+               format: str = 'TIFF') -> Optional[Path]:
+        """
+        Atomically move a finished staging file into place and index it.
+
+        Args:
+            staging (str or Path): File from staging_path
+            key (str): Key from make_key
+            format (str): Output format
+
+        Returns:
+            Path or None: The cache entry, or None if the staging file is missing
+        """
+        path = self.path_for(key, format)
+        try:
+            try:
+                os.replace(staging, path)
+            except FileNotFoundError:
+                # The directory was removed by an eviction in the meantime
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(staging, path)
+        except OSError as e:
+            logger.error(f"Could not commit cache entry {path}: {e}")
+            return None
+        return self.register(key, format)
+
+    def purge_expired(self) -> int:
+        """
+        Delete entries older than the TTL.
+
+        Returns:
+            int: Number of entries removed
+        """
+        now = time.time()
+        with self._lock:
+            expired = [path for path, entry in self._index.items()
+                       if self._is_expired(entry, now)]
+            for path in expired:
+                self._remove(path)
+        if expired:
+            logger.info(f"Cache: {len(expired)} expired entries removed")
+        return len(expired)
+
+    def enforce_budget(self, keep: Optional[Path] = None) -> int:
+        """
+        Evict entries until the cache fits in CACHE_SETTINGS['max_size_mb'].
+
+        Args:
+            keep (Path, optional): Entry that must not be evicted
+
+        Returns:
+            int: Number of entries evicted
+        """
+        if not self.max_bytes:
+            return 0
+        evicted = 0
+        with self._lock:
+            if self._total_bytes <= self.max_bytes:
+                return 0
+            if self.eviction_policy == 'lfu':
+                order = lambda e: (e.hits, e.last_access)
+            else:
+                order = lambda e: e.last_access
+            for entry in sorted(self._index.values(), key=order):
+                if self._total_bytes <= self.max_bytes:
+                    break
+                if entry.path == keep:
+                    continue
+                self._remove(entry.path)
+                evicted += 1
+        if evicted:
+            logger.info(f"Cache: evicted {evicted} entries ({self.eviction_policy}), "
+                        f"{self._total_bytes / (1024*1024):.1f} MB in use")
+        return evicted
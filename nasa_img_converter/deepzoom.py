@@ -0,0 +1,345 @@
+"""
+Deep Zoom Pyramids
+==================
+
+This module turns converted images into Deep Zoom (DZI) tile pyramids for
+OpenSeadragon, driven by DEEPZOOM_SETTINGS. Pyramids are generated with
+pyvips dzsave (streaming, low memory) or, without libvips, with a PIL
+fallback producing the same layout:
+
+    dzi_tiles/<pyramid id>/image.dzi
+    dzi_tiles/<pyramid id>/image_files/<level>/<column>_<row>.<format>
+
+The pyramid id is the conversion cache key plus a fingerprint of
+DEEPZOOM_SETTINGS, so every cached conversion has at most one pyramid per tile
+configuration. Pyramids are built in dzi_tiles/.staging and renamed into place,
+and they expire with WEB_SETTINGS['cache_timeout'] like the conversion cache.
+
+Author: NASA Image Converter Team
+License: MIT
+"""
+
+import os
+import math
+import time
+import uuid
+import shutil
+import logging
+from pathlib import Path
+from typing import Optional, Union, Tuple
+
+from PIL import Image
+
+from config import ProcessingConfig
+from conversion_cache import settings_fingerprint, STALE_FILE_SECONDS
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+# Base name of the descriptor and tile folder inside a pyramid directory
+DZI_BASENAME = 'image'
+
+# Tile format -> MIME type
+TILE_FORMATS = {
+    'jpg': 'image/jpeg',
+    'png': 'image/png',
+}
+
+DZI_TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" '
+    'Format="{format}" Overlap="{overlap}" TileSize="{tile_size}">\n'
+    '  <Size Height="{height}" Width="{width}"/>\n'
+    '</Image>\n'
+)
+
+
+def dzi_max_level(width: int, height: int) -> int:
+    """
+    Index of the full-resolution level of a Deep Zoom pyramid.
+
+    Args:
+        width (int): Image width
+        height (int): Image height
+
+    Returns:
+        int: ceil(log2(max(width, height))); level 0 is a single pixel
+    """
+    return max(0, math.ceil(math.log2(max(width, height, 1))))
+
+
+def dzi_level_size(width: int, height: int, level: int) -> Tuple[int, int]:
+    """
+    Dimensions of one level of a Deep Zoom pyramid.
+
+    Args:
+        width (int): Full-resolution width
+        height (int): Full-resolution height
+        level (int): Level index (0 to dzi_max_level)
+
+    Returns:
+        tuple: (width, height), each halved (rounding up) per level below the top
+    """
+    scale = 1 << (dzi_max_level(width, height) - level)
+    return -(-width // scale), -(-height // scale)
+
+
+def dzi_tile_box(column: int, row: int, width: int, height: int,
+                 tile_size: int, overlap: int) -> Tuple[int, int, int, int]:
+    """
+    Pixel box of a Deep Zoom tile, overlap included.
+
+    Args:
+        column (int): Tile column
+        row (int): Tile row
+        width (int): Level width
+        height (int): Level height
+        tile_size (int): Tile size without overlap
+        overlap (int): Overlap in pixels
+
+    Returns:
+        tuple: (left, top, right, bottom)
+    """
+    left = column * tile_size - (overlap if column else 0)
+    top = row * tile_size - (overlap if row else 0)
+    right = min((column + 1) * tile_size + overlap, width)
+    bottom = min((row + 1) * tile_size + overlap, height)
+    return left, top, right, bottom
+
+
+class DeepZoomGenerator:
+    """
+    Build and locate cached DZI pyramids.
+
+    Example:
+        >>> generator = DeepZoomGenerator('dzi_tiles')
+        >>> descriptor = generator.generate('cache/ab12/cd34.tif', cache_key)
+        >>> descriptor.name
+        'image.dzi'
+    """
+
+    def __init__(self, dzi_dir: Union[str, Path], config: Optional[ProcessingConfig] = None):
+        """
+        Initialize the DeepZoomGenerator.
+
+        Args:
+            dzi_dir (str or Path): Root folder of the pyramids
+            config (ProcessingConfig, optional): Configuration object
+        """
+        self.dzi_dir = Path(dzi_dir)
+        self.config = config or ProcessingConfig()
+        self.settings = self.config.DEEPZOOM_SETTINGS
+        self.tile_size = self.settings.get('tile_size', 256)
+        self.overlap = self.settings.get('tile_overlap', 1)
+        self.tile_format = self.settings.get('tile_format', 'jpg').lower().replace('jpeg', 'jpg')
+        self.tile_quality = self.settings.get('tile_quality', 85)
+        self.ttl = self.config.WEB_SETTINGS.get('cache_timeout', 0)
+        if self.tile_format not in TILE_FORMATS:
+            raise ValueError(f"Unsupported tile format: {self.tile_format}")
+        self.dzi_dir.mkdir(parents=True, exist_ok=True)
+
+        self.vips_available = False
+        if self.settings.get('use_vips', True):
+            try:
+                import pyvips
+                self.pyvips = pyvips
+                self.vips_available = True
+            except (ImportError, OSError) as e:
+                logger.warning(f"pyvips not available: {e}. Deep Zoom will use PIL.")
+
+    @property
+    def tile_mimetype(self) -> str:
+        return TILE_FORMATS[self.tile_format]
+
+    def pyramid_id(self, cache_key: str) -> str:
+        """
+        Identifier of the pyramid of a cached conversion.
+
+        Args:
+            cache_key (str): Conversion cache key
+
+        Returns:
+            str: '<cache key>-<DEEPZOOM_SETTINGS fingerprint>'
+        """
+        return f"{cache_key}-{settings_fingerprint(self.settings)}"
+
+    def pyramid_dir(self, pyramid_id: str) -> Path:
+        """
+        Folder of a pyramid.
+
+        Args:
+            pyramid_id (str): Pyramid identifier
+
+        Returns:
+            Path: dzi_tiles/<pyramid id>
+
+        Raises:
+            ValueError: If the identifier is not made of hex groups
+        """
+        groups = pyramid_id.split('-')
+        if not all(groups) or not all(c in '0123456789abcdef' for c in ''.join(groups)):
+            raise ValueError(f"Invalid pyramid id: {pyramid_id}")
+        return self.dzi_dir / pyramid_id
+
+    def get(self, pyramid_id: str) -> Optional[Path]:
+        """
+        Descriptor of an existing, unexpired pyramid.
+
+        Args:
+            pyramid_id (str): Pyramid identifier
+
+        Returns:
+            Path or None: Path of image.dzi, or None if absent or expired
+        """
+        descriptor = self.pyramid_dir(pyramid_id) / f"{DZI_BASENAME}.dzi"
+        try:
+            created = descriptor.stat().st_mtime
+        except OSError:
+            return None
+        if self.ttl and time.time() - created > self.ttl:
+            self._remove(descriptor.parent)
+            return None
+        return descriptor
+
+    def image_size(self, image_path: Union[str, Path]) -> Tuple[int, int]:
+        """
+        Dimensions of an image, read from its header only.
+
+        Args:
+            image_path (str or Path): Image file
+
+        Returns:
+            tuple: (width, height)
+        """
+        if self.vips_available:
+            vips_img = self.pyvips.Image.new_from_file(str(image_path))
+            return vips_img.width, vips_img.height
+        with Image.open(image_path) as img:
+            return img.size
+
+    def needs_deepzoom(self, width: int, height: int) -> bool:
+        """
+        Whether an image is large enough to be viewed as a pyramid.
+
+        Args:
+            width (int): Image width
+            height (int): Image height
+
+        Returns:
+            bool: True above DEEPZOOM_SETTINGS['min_size_for_deepzoom']
+        """
+        return max(width, height) >= self.settings.get('min_size_for_deepzoom', 4096)
+
+    def generate(self, image_path: Union[str, Path], cache_key: str) -> Path:
+        """
+        Build the pyramid of a converted image (or return the cached one).
+
+        Args:
+            image_path (str or Path): Converted image (uint8 L or RGB)
+            cache_key (str): Conversion cache key of that image
+
+        Returns:
+            Path: Path of the pyramid's image.dzi
+        """
+        pyramid_id = self.pyramid_id(cache_key)
+        descriptor = self.get(pyramid_id)
+        if descriptor is not None:
+            return descriptor
+
+        self.purge_expired()
+        staging_dir = self.dzi_dir / '.staging' / f"{pyramid_id}.{uuid.uuid4().hex}"
+        staging_dir.mkdir(parents=True)
+        try:
+            base = staging_dir / DZI_BASENAME
+            start = time.time()
+            if self.vips_available:
+                self._dzsave(image_path, base)
+            else:
+                self._pil_pyramid(image_path, base)
+            logger.info(f"Deep Zoom pyramid {pyramid_id} built in {time.time() - start:.1f}s")
+
+            target = self.pyramid_dir(pyramid_id)
+            try:
+                os.replace(staging_dir, target)
+            except OSError:
+                # Built concurrently by another worker: keep theirs
+                if not target.is_dir():
+                    raise
+        finally:
+            self._remove(staging_dir)
+        return target / f"{DZI_BASENAME}.dzi"
+
+    def _dzsave(self, image_path: Union[str, Path], base: Path):
+        """Write the pyramid with libvips dzsave."""
+        suffix = f".{self.tile_format}"
+        if self.tile_format == 'jpg':
+            suffix += f"[Q={self.tile_quality}]"
+        vips_img = self.pyvips.Image.new_from_file(str(image_path), access='sequential')
+        vips_img.dzsave(str(base), layout='dz', tile_size=self.tile_size,
+                        overlap=self.overlap, suffix=suffix)
+
+    def _pil_pyramid(self, image_path: Union[str, Path], base: Path):
+        """Write the pyramid with PIL (2x2 box reduction between levels, like dzsave)."""
+        with Image.open(image_path) as img:
+            level_img = img.convert('RGB') if img.mode not in ('L', 'RGB') else img.copy()
+        width, height = level_img.size
+        files_dir = base.with_name(f"{base.name}_files")
+
+        save_options = {'quality': self.tile_quality} if self.tile_format == 'jpg' else {}
+        pil_format = 'JPEG' if self.tile_format == 'jpg' else 'PNG'
+        for level in range(dzi_max_level(width, height), -1, -1):
+            level_dir = files_dir / str(level)
+            level_dir.mkdir(parents=True)
+            self._save_tiles(level_img, level_dir, pil_format, save_options)
+            if level:
+                level_img = level_img.reduce(2)
+
+        with open(f"{base}.dzi", 'w') as f:
+            f.write(DZI_TEMPLATE.format(format=self.tile_format, overlap=self.overlap,
+                                        tile_size=self.tile_size, width=width, height=height))
+
+    def _save_tiles(self, level_img: Image.Image, level_dir: Path,
+                    pil_format: str, save_options: dict):
+        width, height = level_img.size
+        for row in range(math.ceil(height / self.tile_size)):
+            for column in range(math.ceil(width / self.tile_size)):
+                box = self.tile_box(column, row, width, height)
+                level_img.crop(box).save(level_dir / f"{column}_{row}.{self.tile_format}",
+                                         pil_format, **save_options)
+
+    def tile_box(self, column: int, row: int, width: int, height: int) -> Tuple[int, int, int, int]:
+        """Pixel box of a tile of this pyramid (see dzi_tile_box)."""
+        return dzi_tile_box(column, row, width, height, self.tile_size, self.overlap)
+
+    def _remove(self, directory: Path):
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def purge_expired(self) -> int:
+        """
+        Delete expired pyramids and abandoned staging folders.
+
+        Returns:
+            int: Number of folders removed
+        """
+        now = time.time()
+        removed = 0
+        candidates = [(path, self.ttl) for path in self.dzi_dir.iterdir()
+                      if path.is_dir() and not path.name.startswith('.')]
+        staging = self.dzi_dir / '.staging'
+        if staging.is_dir():
+            candidates += [(path, STALE_FILE_SECONDS) for path in staging.iterdir()]
+        for path, max_age in candidates:
+            try:
+                if max_age and now - path.stat().st_mtime > max_age:
+                    self._remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        if removed:
+            logger.info(f"Deep Zoom: {removed} expired pyramids removed")
+        return removed
@@ -0,0 +1,265 @@
+"""
+Multi-core Enhancement Engine
+=============================
+
+This module applies the visual enhancements of CONVERSION_SETTINGS (CLAHE,
+contrast, sharpness) on uint8 images using every core and without the
+PIL round trips of the original implementation:
+
+- CLAHE runs on all bands concurrently (OpenCV releases the GIL).
+- Contrast is a 256-entry lookup table applied with cv2.LUT.
+- Sharpness is an integer 3x3 smoothing convolution (cv2.filter2D) blended
+  with the image through a 256 x 256 lookup table, computed on horizontal
+  tiles in a thread pool.
+
+Contrast and sharpness reproduce ImageEnhance.Contrast / ImageEnhance.Sharpness
+exactly (same float32 blend arithmetic, same rounding of the smoothed image,
+same untouched one-pixel border), so the output is unchanged.
+
+Author: NASA Image Converter Team
+License: MIT
+"""
+
+import os
+import sys
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import numpy as np
+import cv2
+
+from config import ProcessingConfig
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+# Pixels per sharpening tile (keeps the gather index cache-resident)
+SHARPEN_TILE_PIXELS = 1 << 18
+
+# ImageFilter.SMOOTH: 3x3 kernel (1 1 1 / 1 5 1 / 1 1 1) / 13. A sum of
+# integers divided by 13 is never within 1/26 of a rounding tie, so OpenCV's
+# rounded uint8 result equals ImageFilter's float32 round-to-nearest.
+SMOOTH_KERNEL = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype=np.float32) / 13
+
+# Rows processed at once when computing the mean luminance of RGB data
+LUMA_CHUNK_ROWS = 512
+
+
+def blend(degenerate: np.ndarray, image: np.ndarray, factor: float) -> np.ndarray:
+    """
+    Image.blend(degenerate, image, factor) on float32 arrays.
+
+    Args:
+        degenerate (np.ndarray): float32 base image
+        image (np.ndarray): float32 image (same shape, or broadcastable)
+        factor (float): Blend factor (>1 extrapolates away from degenerate)
+
+    Returns:
+        np.ndarray: uint8 result, truncated and clipped like PIL
+    """
+    result = image - degenerate
+    result *= np.float32(factor)
+    result += degenerate
+    np.clip(result, 0, 255, out=result)
+    return result.astype(np.uint8)
+
+
+def blend_lut(factor: float) -> np.ndarray:
+    """
+    Table of blend(degenerate, value, factor) for every pair of uint8 values.
+
+    Args:
+        factor (float): Blend factor
+
+    Returns:
+        np.ndarray: uint8 table indexed by degenerate * 256 + value
+    """
+    levels = np.arange(256, dtype=np.float32)
+    return blend(levels[:, None], levels[None, :], factor).ravel()
+
+
+def luminance_mean(img_data: np.ndarray) -> int:
+    """
+    Rounded mean of the 'L' conversion of an image, as ImageStat computes it.
+
+    Args:
+        img_data (np.ndarray): uint8 image (H, W) or (H, W, 3)
+
+    Returns:
+        int: int(mean + 0.5)
+    """
+    if img_data.ndim == 2:
+        total = int(np.sum(img_data, dtype=np.uint64))
+    else:
+        total = 0
+        for y in range(0, img_data.shape[0], LUMA_CHUNK_ROWS):
+            rgb = img_data[y:y + LUMA_CHUNK_ROWS].astype(np.uint32)
+            # ITU-R 601-2 luma with PIL's fixed-point rounding
+            luma = rgb[..., 0] * 19595
+            luma += rgb[..., 1] * 38470
+            luma += rgb[..., 2] * 7471
+            luma += 0x8000
+            luma >>= 16
+            total += int(np.sum(luma, dtype=np.uint64))
+    pixels = img_data.shape[0] * img_data.shape[1]
+    return int(total / pixels + 0.5)
+
+
+class EnhancementEngine:
+    """
+    Thread-parallel CLAHE, contrast and sharpness for uint8 images.
+
+    Example:
+        >>> engine = EnhancementEngine()
+        >>> img = np.random.randint(0, 255, (4096, 4096), dtype=np.uint8)
+        >>> enhanced = engine.enhance(img)
+    """
+
+    def __init__(self, config: Optional[ProcessingConfig] = None):
+        """
+        Initialize the EnhancementEngine.
+
+        Args:
+            config (ProcessingConfig, optional): Configuration object
+        """
+        self.config = config or ProcessingConfig()
+        self.conversion_settings = self.config.CONVERSION_SETTINGS
+        self.workers = self.conversion_settings.get('enhance_workers') or os.cpu_count() or 1
+
+    def clahe(self, img_data: np.ndarray, clip_limit: float = 2.0,
+              tile_grid_size: Tuple[int, int] = (8, 8)) -> np.ndarray:
+        """
+        CLAHE on every band, bands processed concurrently.
+
+        The input is left untouched (it may be a read-only memmap or buffer
+        view from the native reader); results go to a new array.
+
+        Args:
+            img_data (np.ndarray): uint8 image (H, W) or (H, W, bands)
+            clip_limit (float): CLAHE clip limit
+            tile_grid_size (tuple): CLAHE tile grid
+
+        Returns:
+            np.ndarray: Equalized image
+        """
+        def apply_band(band: np.ndarray) -> np.ndarray:
+            # CLAHE objects are not thread-safe: one per band
+            clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+            return clahe.apply(np.ascontiguousarray(band))
+
+        if img_data.ndim == 2:
+            return apply_band(img_data)
+
+        bands = img_data.shape[2]
+        equalized = np.empty_like(img_data)
+        with ThreadPoolExecutor(max_workers=min(self.workers, bands)) as executor:
+            results = executor.map(apply_band, [img_data[:, :, i] for i in range(bands)])
+            for i, band in enumerate(results):
+                equalized[:, :, i] = band
+        return equalized
+
+    def contrast_lut(self, img_data: np.ndarray, factor: float) -> np.ndarray:
+        """
+        Lookup table equivalent to ImageEnhance.Contrast(img).enhance(factor).
+
+        Args:
+            img_data (np.ndarray): uint8 image the table is computed for
+            factor (float): Contrast factor
+
+        Returns:
+            np.ndarray: 256-entry uint8 table
+        """
+        mean = np.float32(luminance_mean(img_data))
+        values = np.arange(256, dtype=np.float32)
+        return blend(np.full(256, mean, dtype=np.float32), values, factor)
+
+    def contrast(self, img_data: np.ndarray, factor: float) -> np.ndarray:
+        """
+        Adjust contrast around the mean luminance with one LUT pass.
+
+        Args:
+            img_data (np.ndarray): uint8 image
+            factor (float): Contrast factor (1.0 = unchanged)
+
+        Returns:
+            np.ndarray: uint8 image
+        """
+        return cv2.LUT(np.ascontiguousarray(img_data), self.contrast_lut(img_data, factor))
+
+    def _sharpen_tile(self, img_data: np.ndarray, out: np.ndarray,
+                      y0: int, y1: int, table: np.ndarray):
+        """Sharpen interior rows y0..y1 (exclusive) of img_data into out."""
+        window = np.ascontiguousarray(img_data[y0 - 1:y1 + 1])
+        # The halo rows and columns only feed the kernel and are discarded
+        degenerate = cv2.filter2D(window, -1, SMOOTH_KERNEL)[1:-1, 1:-1]
+        image = window[1:-1, 1:-1]
+
+        # uint16 index degenerate * 256 + value, built by interleaving the bytes
+        pair = (image, degenerate) if sys.byteorder == 'little' else (degenerate, image)
+        index = np.stack(pair, axis=-1).view(np.uint16)[..., 0]
+        np.take(table, index, out=out[y0:y1, 1:-1], mode='clip')
+
+    def sharpen(self, img_data: np.ndarray, factor: float) -> np.ndarray:
+        """
+        Unsharp masking equivalent to ImageEnhance.Sharpness(img).enhance(factor).
+
+        Args:
+            img_data (np.ndarray): uint8 image (H, W) or (H, W, bands)
+            factor (float): Sharpness factor (1.0 = unchanged)
+
+        Returns:
+            np.ndarray: uint8 image (the one-pixel border is left unchanged)
+        """
+        height, width = img_data.shape[:2]
+        out = img_data.copy()
+        if height < 3 or width < 3:
+            return out
+
+        table = blend_lut(factor)
+        rows = max(1, SHARPEN_TILE_PIXELS // (width * (img_data.size // (height * width))))
+        tiles = [(y, min(y + rows, height - 1)) for y in range(1, height - 1, rows)]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for future in [executor.submit(self._sharpen_tile, img_data, out, y0, y1, table)
+                           for y0, y1 in tiles]:
+                future.result()
+        return out
+
+    def enhance(self, img_data: np.ndarray) -> np.ndarray:
+        """
+        Apply the enhancements enabled in CONVERSION_SETTINGS.
+
+        Order and results are those of the original CLAHE -> ImageEnhance.Contrast
+        -> ImageEnhance.Sharpness sequence.
+
+        Args:
+            img_data (np.ndarray): uint8 image (H, W) or (H, W, 3)
+
+        Returns:
+            np.ndarray: Enhanced image
+        """
+        settings = self.conversion_settings
+
+        if settings['use_clahe']:
+            try:
+                logger.info(f"Applying CLAHE enhancement ({self.workers} threads)...")
+                img_data = self.clahe(img_data, settings['clahe_clip_limit'],
+                                      settings['clahe_tile_grid_size'])
+                logger.info("CLAHE applied successfully")
+            except Exception as e:
+                logger.warning(f"CLAHE failed: {e}, skipping")
+
+        if settings['enhance_contrast']:
+            img_data = self.contrast(img_data, settings['contrast_factor'])
+            logger.info(f"Contrast enhanced by factor {settings['contrast_factor']}")
+
+        if settings['enhance_sharpness']:
+            img_data = self.sharpen(img_data, settings['sharpness_factor'])
+            logger.info(f"Sharpness enhanced by factor {settings['sharpness_factor']}")
+
+        return img_data
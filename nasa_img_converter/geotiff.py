@@ -0,0 +1,225 @@
+"""
+GeoTIFF Georeferencing from PDS3 Labels
+=======================================
+
+This module turns the IMAGE_MAP_PROJECTION object of a PDS3 label into the
+GeoTIFF tags (ModelPixelScale, ModelTiepoint and the GeoKey directory) that
+GIS tools use to place an image on the body it shows.
+
+Supported projections are Equirectangular (Simple Cylindrical) and Polar
+Stereographic, which cover most map-projected PDS products (HiRISE, CTX,
+HRSC, LRO mosaics). The body is described by a user-defined ellipsoid built
+from A_AXIS_RADIUS and C_AXIS_RADIUS; longitudes are positive east.
+
+The projection origin sits at LINE/SAMPLE_PROJECTION_OFFSET measured in
+1-based pixel centres, the convention used by ISIS and the GDAL PDS driver.
+
+Author: NASA Image Converter Team
+License: MIT
+"""
+
+import re
+import logging
+from typing import Optional, List, Tuple, Dict, Any
+
+from pds3_reader import _get_float, _unquote
+from tiff_writer import ASCII, SHORT, DOUBLE
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+# GeoTIFF tags
+MODEL_PIXEL_SCALE = 33550
+MODEL_TIEPOINT = 33922
+GEO_KEY_DIRECTORY = 34735
+GEO_DOUBLE_PARAMS = 34736
+GEO_ASCII_PARAMS = 34737
+
+# GeoTIFF coordinate transformation codes
+CT_POLAR_STEREOGRAPHIC = 15
+CT_EQUIRECTANGULAR = 17
+
+USER_DEFINED = 32767
+
+# MAP_PROJECTION_TYPE values -> coordinate transformation
+PROJECTIONS = {
+    'EQUIRECTANGULAR': CT_EQUIRECTANGULAR,
+    'SIMPLE CYLINDRICAL': CT_EQUIRECTANGULAR,
+    'SIMPLE_CYLINDRICAL': CT_EQUIRECTANGULAR,
+    'POLAR STEREOGRAPHIC': CT_POLAR_STEREOGRAPHIC,
+    'POLAR_STEREOGRAPHIC': CT_POLAR_STEREOGRAPHIC,
+}
+
+
+def _metres(block: Dict[str, Any], key: str, default_unit: str) -> float:
+    """Read a length keyword in metres; MAP_SCALE is <KM/PIXEL> or <METERS/PIXEL>."""
+    value = _get_float(block, key, float('nan'))
+    unit = re.search(r'<\s*([A-Z]+)', block.get(key, '').upper())
+    unit = unit.group(1) if unit else default_unit
+    return value * 1000.0 if unit.startswith('KM') or unit.startswith('KILOMETER') else value
+
+
+class GeoReference:
+    """
+    Map projection of a PDS3 image, as GeoTIFF tags.
+
+    Attributes:
+        projection (int): GeoTIFF coordinate transformation code
+        lines, samples (int): Size of the source image the label describes
+        pixel_size (float): Source pixel size in projected metres
+        origin_x, origin_y (float): Projected coordinates of the upper-left corner
+
+    Example:
+        >>> georef = GeoReference.from_label(parse_pds3_label(text))
+        >>> if georef:
+        ...     extra_tags = georef.tags(width, height)
+    """
+
+    def __init__(self, projection: int, semi_major: float, semi_minor: float,
+                 center_latitude: float, center_longitude: float, pixel_size: float,
+                 origin_x: float, origin_y: float, lines: int, samples: int,
+                 target: str = 'UNKNOWN'):
+        self.projection = projection
+        self.semi_major = semi_major
+        self.semi_minor = semi_minor
+        self.center_latitude = center_latitude
+        self.center_longitude = center_longitude
+        self.pixel_size = pixel_size
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.lines = lines
+        self.samples = samples
+        self.target = target
+
+    @classmethod
+    def from_label(cls, label: Dict[str, Any]) -> Optional['GeoReference']:
+        """
+        Build the georeference of a parsed label.
+
+        Args:
+            label (dict): Label parsed with parse_pds3_label
+
+        Returns:
+            GeoReference or None: None when the label has no supported projection
+        """
+        projection = label.get('IMAGE_MAP_PROJECTION')
+        image = label.get('IMAGE')
+        if not isinstance(projection, dict) or not isinstance(image, dict):
+            return None
+
+        name = _unquote(projection.get('MAP_PROJECTION_TYPE', '')).upper()
+        if name not in PROJECTIONS:
+            logger.info(f"Map projection '{name}' not supported for GeoTIFF output")
+            return None
+
+        try:
+            semi_major = _metres(projection, 'A_AXIS_RADIUS', 'KM')
+            semi_minor = _metres(projection, 'C_AXIS_RADIUS', 'KM')
+            pixel_size = _metres(projection, 'MAP_SCALE', 'KM')
+            line_offset = _get_float(projection, 'LINE_PROJECTION_OFFSET', float('nan'))
+            sample_offset = _get_float(projection, 'SAMPLE_PROJECTION_OFFSET', float('nan'))
+            center_latitude = _get_float(projection, 'CENTER_LATITUDE', 0.0)
+            center_longitude = _get_float(projection, 'CENTER_LONGITUDE', 0.0)
+            lines = int(_get_float(image, 'LINES', 0))
+            samples = int(_get_float(image, 'LINE_SAMPLES', 0))
+        except ValueError as e:
+            logger.warning(f"Invalid map projection keywords: {e}")
+            return None
+
+        values = (semi_major, semi_minor, pixel_size, line_offset, sample_offset)
+        if any(v != v for v in values) or pixel_size <= 0 or not lines or not samples:
+            logger.warning("Incomplete map projection keywords, output not georeferenced")
+            return None
+
+        if 'WEST' in _unquote(projection.get('POSITIVE_LONGITUDE_DIRECTION', 'EAST')).upper():
+            center_longitude = -center_longitude
+
+        target = _unquote(label.get('TARGET_NAME', projection.get('TARGET_NAME', 'UNKNOWN')))
+        return cls(PROJECTIONS[name], semi_major, semi_minor, center_latitude,
+                   center_longitude, pixel_size,
+                   origin_x=(0.5 - sample_offset) * pixel_size,
+                   origin_y=(line_offset - 0.5) * pixel_size,
+                   lines=lines, samples=samples, target=target.strip() or 'UNKNOWN')
+
+    def _projection_keys(self) -> List[Tuple[int, float]]:
+        if self.projection == CT_POLAR_STEREOGRAPHIC:
+            return [
+                (3081, 90.0 if self.center_latitude >= 0 else -90.0),  # ProjNatOriginLat
+                (3082, 0.0),                                          # ProjFalseEasting
+                (3083, 0.0),                                          # ProjFalseNorthing
+                (3092, 1.0),                                          # ProjScaleAtNatOrigin
+                (3095, self.center_longitude),                        # ProjStraightVertPoleLong
+            ]
+        return [
+            (3078, self.center_latitude),   # ProjStdParallel1
+            (3082, 0.0),                    # ProjFalseEasting
+            (3083, 0.0),                    # ProjFalseNorthing
+            (3088, self.center_longitude),  # ProjCenterLong
+            (3089, 0.0),                    # ProjCenterLat
+        ]
+
+    def tags(self, width: int, height: int) -> List[Tuple[int, int, object]]:
+        """
+        GeoTIFF tags for an output of the given size.
+
+        Outputs reduced with max_dimension cover the same area with larger
+        pixels, so the pixel scale grows with the reduction (taken along the
+        longer side, where output rounding matters least).
+
+        Args:
+            width (int): Output width in pixels
+            height (int): Output height in pixels
+
+        Returns:
+            list: (tag, field type, value) IFD entries for TiledTiffWriter
+        """
+        pixel_size = self.pixel_size * max(self.samples, self.lines) / max(width, height)
+
+        doubles: List[float] = []
+        ascii_params = ''
+        keys: List[List[int]] = []
+
+        def short_key(key, value):
+            keys.append([key, 0, 1, value])
+
+        def double_key(key, value):
+            keys.append([key, GEO_DOUBLE_PARAMS, 1, len(doubles)])
+            doubles.append(float(value))
+
+        def ascii_key(key, text):
+            nonlocal ascii_params
+            keys.append([key, GEO_ASCII_PARAMS, len(text) + 1, len(ascii_params)])
+            ascii_params += text + '|'
+
+        short_key(1024, 1)                            # GTModelType: projected
+        short_key(1025, 1)                            # GTRasterType: PixelIsArea
+        ascii_key(1026, f'{self.target} map projection')
+        short_key(2048, USER_DEFINED)                 # GeographicType
+        ascii_key(2049, f'GCS_{self.target}')
+        short_key(2050, USER_DEFINED)                 # GeogGeodeticDatum
+        short_key(2051, 8901)                         # GeogPrimeMeridian: reference meridian
+        short_key(2054, 9102)                         # GeogAngularUnits: degree
+        short_key(2056, USER_DEFINED)                 # GeogEllipsoid
+        double_key(2057, self.semi_major)
+        double_key(2058, self.semi_minor)
+        short_key(3072, USER_DEFINED)                 # ProjectedCSType
+        short_key(3074, USER_DEFINED)                 # Projection
+        short_key(3075, self.projection)              # ProjCoordTrans
+        short_key(3076, 9001)                         # ProjLinearUnits: metre
+        for key, value in self._projection_keys():
+            double_key(key, value)
+
+        keys.sort(key=lambda k: k[0])
+        directory = [1, 1, 0, len(keys)] + [v for k in keys for v in k]
+        return [
+            (MODEL_PIXEL_SCALE, DOUBLE, [pixel_size, pixel_size, 0.0]),
+            (MODEL_TIEPOINT, DOUBLE, [0.0, 0.0, 0.0, self.origin_x, self.origin_y, 0.0]),
+            (GEO_KEY_DIRECTORY, SHORT, directory),
+            (GEO_DOUBLE_PARAMS, DOUBLE, doubles),
+            (GEO_ASCII_PARAMS, ASCII, ascii_params),
+        ]
@@ -0,0 +1,98 @@
+"""
+Shared HTTP Session
+===================
+
+This module provides one process-wide, pooled requests.Session so that every
+fetch (Flask route, StreamingConverter, InMemoryConverter) reuses keep-alive
+connections to the archive hosts instead of paying a TCP/TLS handshake per
+request.
+
+The pool is sized from ProcessingConfig.HTTP_SETTINGS. The session is created
+lazily and discarded in forked children (gunicorn workers), so sockets are
+never shared between processes.
+
+Author: NASA Image Converter Team
+License: MIT
+"""
+
+import os
+import logging
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import ProcessingConfig
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def create_session(settings: dict) -> requests.Session:
+    """
+    Build a pooled session from HTTP_SETTINGS.
+
+    Args:
+        settings (dict): HTTP_SETTINGS of the active configuration
+
+    Returns:
+        requests.Session: New session with pooled adapters mounted
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=settings.get('pool_connections', 10),
+        pool_maxsize=settings.get('pool_maxsize', 32),
+        pool_block=settings.get('pool_block', True),
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if settings.get('user_agent'):
+        session.headers['User-Agent'] = settings['user_agent']
+    return session
+
+
+def get_session(config: Optional[ProcessingConfig] = None) -> requests.Session:
+    """
+    Return the process-wide pooled session, creating it on first use.
+
+    The pool is sized from the configuration passed by the first caller.
+
+    Args:
+        config (ProcessingConfig, optional): Configuration object
+
+    Returns:
+        requests.Session: Shared session
+
+    Example:
+        >>> session = get_session()
+        >>> response = session.get('https://planetarydata.jpl.nasa.gov/', timeout=30)
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                settings = (config or ProcessingConfig()).HTTP_SETTINGS
+                _session = create_session(settings)
+                logger.info(f"HTTP pool created (hosts={settings.get('pool_connections')}, "
+                            f"per host={settings.get('pool_maxsize')})")
+    return _session
+
+
+def reset_session():
+    """Drop the shared session (its sockets belong to the parent process after fork)."""
+    global _session, _session_lock
+    _session = None
+    _session_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_session)
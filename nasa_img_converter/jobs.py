@@ -0,0 +1,313 @@
+"""
+Background Conversion Jobs
+==========================
+
+This module runs long downloads and conversions outside the request thread.
+A bounded thread pool executes the jobs, and each job publishes its progress
+(stage, bytes downloaded, ETA) as a JSON snapshot in the jobs folder. Any
+gunicorn worker can answer a status poll that way, not only the one running
+the job.
+
+Author: NASA Image Converter Team
+License: MIT
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Union, Dict, Any, Callable
+
+from config import ProcessingConfig
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+# Stages a job goes through; the job function reports the intermediate ones
+JOB_STAGES = ('queued', 'downloading', 'converting', 'done', 'failed')
+
+# Unfinished jobs whose snapshot has not changed for this long are abandoned
+STALE_JOB_SECONDS = 24 * 3600
+
+
+class Job:
+    """
+    State of one background conversion.
+
+    The job function receives the Job and reports progress through update().
+
+    Attributes:
+        id (str): Job identifier (32 hex characters)
+        params (dict): Request parameters, echoed in the status
+        stage (str): One of JOB_STAGES
+        bytes_downloaded (int): Bytes received so far
+        total_bytes (int or None): Expected download size
+        result (dict or None): Return value of the job function
+        error (str or None): Error message when the job failed
+    """
+
+    def __init__(self, manager: 'JobManager', params: Dict[str, Any]):
+        self.manager = manager
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.stage = 'queued'
+        self.bytes_downloaded = 0
+        self.total_bytes = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.error_status = None
+        self._download_started = None
+        self._last_save = 0.0
+
+    @property
+    def is_finished(self) -> bool:
+        return self.stage in ('done', 'failed')
+
+    def update(self, stage: Optional[str] = None, current: Optional[int] = None,
+               total: Optional[int] = None):
+        """
+        Report progress.
+
+        Snapshots are written on every stage change and at most every
+        JOB_SETTINGS['progress_interval'] seconds otherwise.
+
+        Args:
+            stage (str, optional): New stage
+            current (int, optional): Bytes downloaded so far
+            total (int, optional): Total bytes expected
+        """
+        changed = stage is not None and stage != self.stage
+        if changed:
+            self.stage = stage
+            if stage == 'downloading':
+                self._download_started = time.time()
+        if current is not None:
+            self.bytes_downloaded = current
+        if total:
+            self.total_bytes = total
+        self.manager.save(self, force=changed)
+
+    def eta(self) -> Optional[float]:
+        """
+        Estimated seconds until the download completes.
+
+        Returns:
+            float or None: ETA, or None outside the download stage or when
+                           the size is unknown
+        """
+        if self.stage != 'downloading' or not self.total_bytes or not self.bytes_downloaded:
+            return None
+        elapsed = time.time() - self._download_started
+        rate = self.bytes_downloaded / max(elapsed, 1e-6)
+        return max(0.0, (self.total_bytes - self.bytes_downloaded) / rate)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        JSON-serialisable status snapshot.
+
+        Returns:
+            dict: Job status
+        """
+        eta = self.eta()
+        progress = None
+        if self.total_bytes:
+            progress = round(100.0 * self.bytes_downloaded / self.total_bytes, 1)
+        return {
+            'id': self.id,
+            'params': self.params,
+            'stage': self.stage,
+            'bytes_downloaded': self.bytes_downloaded,
+            'total_bytes': self.total_bytes,
+            'progress': progress,
+            'eta_seconds': None if eta is None else round(eta, 1),
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'result': self.result,
+            'error': self.error,
+            'error_status': self.error_status,
+        }
+
+
+class JobManager:
+    """
+    Bounded pool of background conversion jobs.
+
+    Example:
+        >>> manager = JobManager('jobs')
+        >>> job = manager.submit(lambda job: convert(url, progress=job.update),
+        ...                      params={'url': url})
+        >>> manager.status(job.id)['stage']
+        'queued'
+    """
+
+    def __init__(self, jobs_dir: Union[str, Path], config: Optional[ProcessingConfig] = None):
+        """
+        Initialize the JobManager.
+
+        Args:
+            jobs_dir (str or Path): Folder for the job status snapshots
+            config (ProcessingConfig, optional): Configuration object
+        """
+        self.jobs_dir = Path(jobs_dir)
+        self.config = config or ProcessingConfig()
+        self.job_settings = self.config.JOB_SETTINGS
+        self.max_workers = self.job_settings.get('max_workers', 2)
+        self.max_queued = self.job_settings.get('max_queued', 32)
+        self.retention = self.job_settings.get('retention_seconds', 3600)
+        self.progress_interval = self.job_settings.get('progress_interval', 0.5)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        # Created on first submit, i.e. after gunicorn has forked the worker
+        self._executor = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='conversion-job')
+            return self._executor
+
+    def snapshot_path(self, job_id: str) -> Path:
+        """
+        Location of a job's status snapshot.
+
+        Args:
+            job_id (str): Job identifier
+
+        Returns:
+            Path: jobs/<job_id>.json
+        """
+        if len(job_id) != 32 or not all(c in '0123456789abcdef' for c in job_id):
+            raise ValueError(f"Invalid job id: {job_id}")
+        return self.jobs_dir / f"{job_id}.json"
+
+    def save(self, job: Job, force: bool = False):
+        """
+        Write a job's status snapshot (atomically, throttled unless forced).
+
+        Args:
+            job (Job): Job to save
+            force (bool): Ignore JOB_SETTINGS['progress_interval']
+        """
+        now = time.time()
+        if not force and now - job._last_save < self.progress_interval:
+            return
+        job._last_save = now
+        path = self.snapshot_path(job.id)
+        temp_path = path.with_name(f".{job.id}.{threading.get_ident()}.tmp")
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(job.to_dict(), f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not save job {job.id}: {e}")
+
+    def active_count(self) -> int:
+        """Number of queued or running jobs in this process."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.is_finished)
+
+    def submit(self, func: Callable[[Job], Optional[Dict[str, Any]]],
+               params: Optional[Dict[str, Any]] = None) -> Optional[Job]:
+        """
+        Queue a job.
+
+        Args:
+            func (callable): Called as func(job) in a pool thread; returns the
+                             JSON-serialisable result
+            params (dict, optional): Request parameters shown in the status
+
+        Returns:
+            Job or None: The queued job, or None when the queue is full
+        """
+        self.purge()
+        if self.active_count() >= self.max_workers + self.max_queued:
+            logger.warning("Job queue full, rejecting submission")
+            return None
+
+        job = Job(self, params or {})
+        with self._lock:
+            self._jobs[job.id] = job
+        self.save(job, force=True)
+        self.executor.submit(self._run, job, func)
+        logger.info(f"Job {job.id} queued")
+        return job
+
+    def _run(self, job: Job, func: Callable[[Job], Optional[Dict[str, Any]]]):
+        job.started = time.time()
+        try:
+            job.result = func(job)
+            job.finished = time.time()
+            job.update(stage='done')
+            logger.info(f"Job {job.id} done in {job.finished - job.started:.1f}s")
+        except Exception as e:
+            job.error = str(e)
+            job.error_status = getattr(e, 'status', 500)
+            job.finished = time.time()
+            job.update(stage='failed')
+            logger.error(f"Job {job.id} failed: {e}")
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Current status of a job run by any worker.
+
+        Args:
+            job_id (str): Job identifier
+
+        Returns:
+            dict or None: Status, or None for unknown ids
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        try:
+            with open(self.snapshot_path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def purge(self) -> int:
+        """
+        Forget finished jobs older than JOB_SETTINGS['retention_seconds'].
+
+        Returns:
+            int: Number of snapshots removed
+        """
+        cutoff = time.time() - self.retention
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job.is_finished and job.finished < cutoff]:
+                del self._jobs[job_id]
+
+        removed = 0
+        for path in self.jobs_dir.glob('*.json'):
+            try:
+                mtime = path.stat().st_mtime
+                if mtime >= cutoff:
+                    continue
+                with open(path) as f:
+                    finished = json.load(f).get('stage') in ('done', 'failed')
+                # Unfinished snapshots this old belong to a worker that died
+                if finished or mtime < cutoff - STALE_JOB_SECONDS:
+                    path.unlink()
+                    removed += 1
+            except (OSError, ValueError):
+                pass
+        return removed
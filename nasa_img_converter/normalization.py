@@ -0,0 +1,291 @@
+"""
+Fused Normalization
+===================
+
+This module applies a (low, high) normalization window and produces uint8
+directly, without the full-size float32 intermediate of the original
+clip / subtract / multiply / astype sequence.
+
+- 8 and 16-bit integer data (uint8, int8, uint16, int16, either byte order)
+  goes through a lookup table: the reference float32 sequence is evaluated
+  once for every possible sample value, then the image is mapped with one
+  gather pass.
+- Other data (floats, 32-bit integers) is scaled chunk by chunk with the
+  same float32 sequence, so only one chunk is ever held in float32.
+
+Both paths give exactly the same bytes as the reference sequence.
+
+The window itself comes from ValueHistogram for the same integer types: a
+full-resolution histogram built chunk by chunk with bincount, from which
+percentiles are read exactly (same linear interpolation as np.percentile)
+without sorting, sampling or copying the image.
+
+Author: NASA Image Converter Team
+License: MIT
+"""
+
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+# Pixels processed per chunk (bounds the temporary index / float32 buffers)
+NORMALIZE_CHUNK_PIXELS = 1 << 18
+
+# Largest sample size handled with a lookup table (bytes)
+LUT_MAX_ITEMSIZE = 2
+
+
+def scale_values(values: np.ndarray, p_low, p_high) -> np.ndarray:
+    """
+    Reference window scaling: float32 clip, subtract, multiply, cast to uint8.
+
+    Args:
+        values (np.ndarray): Input samples
+        p_low: Low end of the window
+        p_high: High end of the window (p_high > p_low)
+
+    Returns:
+        np.ndarray: uint8 samples
+    """
+    scaled = values.astype(np.float32)
+    np.clip(scaled, p_low, p_high, out=scaled)
+    scaled -= p_low
+    scaled *= (255.0 / (p_high - p_low))
+    return scaled.astype(np.uint8)
+
+
+def supports_lut(dtype: np.dtype) -> bool:
+    """
+    Whether a dtype is normalized through a lookup table.
+
+    Args:
+        dtype (np.dtype): Sample dtype
+
+    Returns:
+        bool: True for 8 and 16-bit integers
+    """
+    dtype = np.dtype(dtype)
+    return dtype.kind in 'ui' and dtype.itemsize <= LUT_MAX_ITEMSIZE
+
+
+def build_lut(dtype: np.dtype, p_low, p_high) -> np.ndarray:
+    """
+    Lookup table mapping every bit pattern of dtype to its uint8 value.
+
+    The table is indexed by the raw sample bits (the array viewed as an
+    unsigned integer of the same size), so signed and byte-swapped dtypes
+    need no conversion before the lookup.
+
+    Args:
+        dtype (np.dtype): 8 or 16-bit integer dtype
+        p_low: Low end of the window
+        p_high: High end of the window
+
+    Returns:
+        np.ndarray: uint8 table with 2 ** (8 * itemsize) entries
+    """
+    dtype = np.dtype(dtype)
+    bits = np.arange(1 << (8 * dtype.itemsize), dtype=f'u{dtype.itemsize}')
+    return scale_values(bits.view(dtype), p_low, p_high)
+
+
+def supports_histogram(dtype: np.dtype) -> bool:
+    """
+    Whether exact percentiles can be taken from a ValueHistogram.
+
+    Args:
+        dtype (np.dtype): Sample dtype
+
+    Returns:
+        bool: True for 8 and 16-bit integers
+    """
+    return supports_lut(dtype)
+
+
+def _row_chunks(img_data: np.ndarray):
+    """Yield slices along the first axis covering about NORMALIZE_CHUNK_PIXELS each."""
+    row_pixels = max(1, img_data[:1].size)
+    rows = max(1, NORMALIZE_CHUNK_PIXELS // row_pixels)
+    for y in range(0, img_data.shape[0], rows):
+        yield slice(y, y + rows)
+
+
+def apply_window(img_data: np.ndarray, window: Optional[Tuple[float, float]],
+                 out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Scale an array to uint8 with a fixed window in a single pass.
+
+    Args:
+        img_data (np.ndarray): Input image data (any numeric dtype)
+        window (tuple or None): (p_low, p_high); None passes the data
+                                through with a plain cast to uint8
+        out (np.ndarray, optional): uint8 output array of the same shape
+
+    Returns:
+        np.ndarray: uint8 image
+
+    Example:
+        >>> raw = np.random.randint(0, 4096, (512, 512), dtype=np.uint16)
+        >>> img = apply_window(raw, (100.0, 4000.0))
+        >>> img.dtype
+        dtype('uint8')
+    """
+    if window is None:
+        if out is None:
+            return img_data.astype(np.uint8, copy=False)
+        np.copyto(out, img_data, casting='unsafe')
+        return out
+
+    if out is None:
+        out = np.empty(img_data.shape, dtype=np.uint8)
+    p_low, p_high = window
+    if not p_high - p_low > 0:
+        out.fill(0)
+        return out
+
+    if img_data.ndim == 0 or img_data.size == 0:
+        out[...] = scale_values(img_data, p_low, p_high)
+        return out
+
+    if supports_lut(img_data.dtype):
+        lut = build_lut(img_data.dtype, p_low, p_high)
+        bits = img_data.view(f'u{img_data.dtype.itemsize}')
+        for rows in _row_chunks(img_data):
+            # Every index is in range by construction; 'clip' avoids the checked 'raise' path
+            np.take(lut, bits[rows], out=out[rows], mode='clip')
+    else:
+        for rows in _row_chunks(img_data):
+            out[rows] = scale_values(img_data[rows], p_low, p_high)
+    return out
+
+
+class ValueHistogram:
+    """
+    Exact histogram of 8 or 16-bit integer samples.
+
+    Bins cover the whole value range of the dtype (at most 65536 counts), so
+    percentiles, min, max and mean are exact whatever the image size. Data
+    can be fed in any number of pieces, e.g. strips of a memmap.
+
+    Example:
+        >>> hist = ValueHistogram.from_array(raw)
+        >>> hist.percentile(2) == np.percentile(raw, 2)
+        True
+    """
+
+    def __init__(self, dtype: np.dtype):
+        """
+        Initialize an empty histogram.
+
+        Args:
+            dtype (np.dtype): 8 or 16-bit integer dtype of the samples
+        """
+        dtype = np.dtype(dtype)
+        if not supports_histogram(dtype):
+            raise ValueError(f"Histogram requires 8 or 16-bit integer data, got {dtype}")
+        self.dtype = dtype
+        self.native_dtype = dtype.newbyteorder('=')
+        self.bits_dtype = np.dtype(f'u{dtype.itemsize}')
+        self.offset = int(np.iinfo(dtype).min)
+        self.counts = np.zeros(1 << (8 * dtype.itemsize), dtype=np.int64)
+
+    @classmethod
+    def from_array(cls, img_data: np.ndarray) -> 'ValueHistogram':
+        """
+        Histogram of a whole array.
+
+        Args:
+            img_data (np.ndarray): 8 or 16-bit integer array
+
+        Returns:
+            ValueHistogram: Filled histogram
+        """
+        hist = cls(img_data.dtype)
+        hist.update(img_data)
+        return hist
+
+    def update(self, data: np.ndarray):
+        """
+        Add samples.
+
+        Args:
+            data (np.ndarray): Samples of the histogram dtype (any shape)
+        """
+        if data.ndim == 0:
+            data = data.reshape(1)
+        for rows in _row_chunks(data):
+            chunk = data[rows].astype(self.native_dtype, copy=False)
+            bins = chunk.view(self.bits_dtype)
+            if self.offset:
+                # Flip the sign bit: signed values map to ascending bins
+                bins = bins ^ self.bits_dtype.type(-self.offset)
+            self.counts += np.bincount(bins.ravel(), minlength=len(self.counts))
+
+    def bin_values(self) -> np.ndarray:
+        """
+        Sample value of every bin, in bin order.
+
+        Returns:
+            np.ndarray: Values in the native-order dtype of the histogram
+        """
+        return (np.arange(len(self.counts)) + self.offset).astype(self.native_dtype)
+
+    @property
+    def total(self) -> int:
+        """Number of samples."""
+        return int(self.counts.sum())
+
+    def _value(self, bin_index: int):
+        return self.native_dtype.type(bin_index + self.offset)
+
+    def min(self):
+        """Smallest sample (as a scalar of the data dtype)."""
+        return self._value(int(np.flatnonzero(self.counts)[0]))
+
+    def max(self):
+        """Largest sample (as a scalar of the data dtype)."""
+        return self._value(int(np.flatnonzero(self.counts)[-1]))
+
+    def mean(self) -> float:
+        """Mean of the samples."""
+        values = np.arange(len(self.counts), dtype=np.float64) + self.offset
+        return float(np.dot(self.counts, values) / self.total)
+
+    def percentile(self, q: float) -> np.float64:
+        """
+        Percentile with the default 'linear' method of np.percentile.
+
+        Args:
+            q (float): Percentile in [0, 100]
+
+        Returns:
+            np.float64: Same value np.percentile returns on the raw samples
+        """
+        cumulative = np.cumsum(self.counts)
+        n = int(cumulative[-1])
+        if n == 0:
+            raise ValueError("Percentile of an empty histogram")
+
+        # Virtual index into the sorted samples, as computed by numpy
+        virtual_index = (n - 1) * np.true_divide(q, 100)
+        previous_index = int(np.floor(virtual_index))
+        next_index = min(previous_index + 1, n - 1)
+        gamma = float(virtual_index - previous_index)
+
+        # k-th smallest sample = first bin whose cumulative count exceeds k
+        a, b = (np.float64(np.searchsorted(cumulative, k, side='right') + self.offset)
+                for k in (previous_index, next_index))
+
+        # numpy's lerp, including its form for gamma >= 0.5
+        if gamma >= 0.5:
+            return b - (b - a) * (1 - gamma)
+        return a + (b - a) * gamma
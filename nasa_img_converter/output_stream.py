@@ -0,0 +1,149 @@
+"""
+Streamed Conversion Output
+==========================
+
+This module sends a converted image to the client while it is still being
+encoded. The conversion runs in a background thread and writes its usual
+output file (the cache staging file); the response follows that file as it
+grows, so the first bytes leave as soon as the encoder produces them and the
+finished file becomes the cache entry without a second copy.
+
+Only formats whose encoders write strictly sequentially can be followed:
+PNG and JPEG are written front to back and never revisited. TIFF writers
+(libtiff, PIL, tiff_writer) seek back to patch the header with the IFD
+offset when the file is closed, so TIFF outputs are sent once complete.
+
+Author: NASA Image Converter Team
+License: MIT
+"""
+
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, Union, Any, Callable, Iterator
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+# Output formats whose bytes are final as soon as they are written
+STREAMABLE_FORMATS = ('PNG', 'JPEG')
+
+
+class ConversionStream:
+    """
+    Background conversion whose output file is read while it is written.
+
+    The conversion function writes ``path`` and returns where the finished
+    file ended up (e.g. the cache entry it was renamed to). The cleanup
+    function, if any, runs in the conversion thread once it is done, whether
+    or not anybody is still reading.
+
+    Attributes:
+        path (Path): File written by the conversion
+        result (Any): Return value of the conversion function
+        error (BaseException or None): Exception raised by the conversion
+
+    Example:
+        >>> stream = ConversionStream(staging, convert).start()
+        >>> for chunk in stream.chunks():
+        ...     client.write(chunk)
+    """
+
+    # Wait between two reads when the encoder has not written anything new (seconds)
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, path: Union[str, Path], convert: Callable[[], Union[str, Path]],
+                 cleanup: Optional[Callable[[], None]] = None,
+                 chunk_size: int = 65536):
+        self.path = Path(path)
+        self.convert = convert
+        self.cleanup = cleanup
+        self.chunk_size = chunk_size
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='conversion-stream', daemon=True)
+
+    def start(self) -> 'ConversionStream':
+        """Start the conversion thread."""
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self.result = self.convert()
+        except BaseException as e:
+            self.error = e
+        finally:
+            try:
+                if self.cleanup is not None:
+                    self.cleanup()
+            except Exception as e:
+                logger.warning(f"Conversion stream cleanup failed: {e}")
+            self._done.set()
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> Any:
+        """
+        Wait for the conversion and return its result.
+
+        Raises:
+            TimeoutError: If it is still running after timeout seconds
+            Exception: Whatever the conversion function raised
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError("Conversion still running")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def _read_from(self, path: Path, position: int) -> Iterator[bytes]:
+        # Reopened on every poll: the file may be renamed once complete
+        with open(path, 'rb') as f:
+            f.seek(position)
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def chunks(self) -> Iterator[bytes]:
+        """
+        Yield the output bytes as the encoder writes them.
+
+        Stops at the end of the finished file. Closing the generator early
+        (client gone) leaves the conversion running to completion.
+
+        Raises:
+            Exception: What the conversion raised, after the bytes written so far
+        """
+        position = 0
+        path = self.path
+        while True:
+            # Read the finished flag first: everything is on disk once it is set
+            finished = self.finished
+            if finished and self.error is not None:
+                raise self.error
+            if finished and self.result is not None:
+                path = Path(self.result)
+            try:
+                for chunk in self._read_from(path, position):
+                    position += len(chunk)
+                    yield chunk
+            except FileNotFoundError:
+                # Not created yet, or just moved into place: retry after the thread
+                if finished:
+                    raise
+                self._done.wait(self.POLL_INTERVAL)
+                continue
+            if finished:
+                return
+            self._done.wait(self.POLL_INTERVAL)
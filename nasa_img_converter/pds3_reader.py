@@ -0,0 +1,568 @@
+"""
+Native PDS3 Reader
+==================
+
+This module parses attached or detached PDS3 labels and exposes the IMAGE
+object as a memory-mapped numpy array, so that large products can be processed
+without materialising the whole raster in RAM. Products already downloaded
+into memory are viewed in place over their buffer instead.
+
+Only the keywords needed to locate and decode the raster are interpreted:
+RECORD_BYTES, the ^IMAGE pointer, LINES, LINE_SAMPLES, SAMPLE_BITS,
+SAMPLE_TYPE, BANDS, BAND_STORAGE_TYPE and the optional line prefix/suffix
+bytes. Anything else (compressed products, VAX reals, packed bit depths)
+raises ValueError so that callers can fall back to pdr or planetaryimage.
+
+Author: NASA Image Converter Team
+License: MIT
+"""
+
+import os
+import re
+import logging
+from pathlib import Path
+from typing import Optional, Union, Dict, Any, Tuple
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+# Maximum number of bytes scanned when looking for the END statement
+MAX_LABEL_BYTES = 4 * 1024 * 1024
+
+# SAMPLE_TYPE keyword -> (numpy kind, byte order)
+SAMPLE_TYPES = {
+    'MSB_INTEGER': ('i', '>'),
+    'INTEGER': ('i', '>'),
+    'SUN_INTEGER': ('i', '>'),
+    'MAC_INTEGER': ('i', '>'),
+    'LSB_INTEGER': ('i', '<'),
+    'PC_INTEGER': ('i', '<'),
+    'VAX_INTEGER': ('i', '<'),
+    'MSB_UNSIGNED_INTEGER': ('u', '>'),
+    'UNSIGNED_INTEGER': ('u', '>'),
+    'SUN_UNSIGNED_INTEGER': ('u', '>'),
+    'MAC_UNSIGNED_INTEGER': ('u', '>'),
+    'LSB_UNSIGNED_INTEGER': ('u', '<'),
+    'PC_UNSIGNED_INTEGER': ('u', '<'),
+    'VAX_UNSIGNED_INTEGER': ('u', '<'),
+    'IEEE_REAL': ('f', '>'),
+    'FLOAT': ('f', '>'),
+    'REAL': ('f', '>'),
+    'SUN_REAL': ('f', '>'),
+    'MAC_REAL': ('f', '>'),
+    'PC_REAL': ('f', '<'),
+}
+
+BAND_STORAGE_TYPES = ('BAND_SEQUENTIAL', 'LINE_INTERLEAVED', 'SAMPLE_INTERLEAVED')
+
+_END_RE = re.compile(rb'(?m)^[ \t]*END[ \t]*\r?$')
+_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+
+
+def find_label_end(data: bytes) -> int:
+    """
+    Locate the END statement terminating a PDS3 label.
+
+    Args:
+        data (bytes): Leading bytes of the product
+
+    Returns:
+        int: Offset just after the END line, or -1 if not found yet
+    """
+    match = _END_RE.search(data)
+    return match.end() if match else -1
+
+
+def read_label_bytes(file_path: Union[str, Path],
+                     chunk_size: int = 65536) -> bytes:
+    """
+    Read the label portion of a PDS3 file (everything up to END).
+
+    Args:
+        file_path (str or Path): Path to the .IMG or .LBL file
+        chunk_size (int): Read increment in bytes
+
+    Returns:
+        bytes: Raw label bytes
+
+    Raises:
+        ValueError: If no END statement is found within MAX_LABEL_BYTES
+    """
+    data = b''
+    with open(file_path, 'rb') as f:
+        while len(data) < MAX_LABEL_BYTES:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            data += chunk
+            end = find_label_end(data)
+            if end >= 0:
+                return data[:end]
+    raise ValueError(f"No PDS3 END statement found in {file_path}")
+
+
+def _statements(text: str):
+    """Yield (key, raw_value) pairs from label text, joining continued values."""
+    text = _COMMENT_RE.sub('', text)
+    pending_key = None
+    pending_value = ''
+
+    for line in text.splitlines():
+        if pending_key is not None:
+            pending_value += ' ' + line.strip()
+        else:
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if '=' not in stripped:
+                if stripped.upper() == 'END':
+                    return
+                continue
+            pending_key, _, pending_value = stripped.partition('=')
+            pending_key = pending_key.strip().upper()
+            pending_value = pending_value.strip()
+
+        # Values may span several lines inside (), {} or quotes
+        balanced = (pending_value.count('(') <= pending_value.count(')') and
+                    pending_value.count('{') <= pending_value.count('}') and
+                    pending_value.count('"') % 2 == 0)
+        if balanced:
+            yield pending_key, pending_value
+            pending_key = None
+            pending_value = ''
+
+
+def parse_pds3_label(label: Union[str, bytes]) -> Dict[str, Any]:
+    """
+    Parse PDS3 label text into nested dictionaries.
+
+    Values are kept as cleaned strings; OBJECT and GROUP blocks become nested
+    dictionaries keyed by their name (the first occurrence wins).
+
+    Args:
+        label (str or bytes): Label text
+
+    Returns:
+        dict: Parsed label
+
+    Example:
+        >>> label = parse_pds3_label(read_label_bytes('mars.img'))
+        >>> label['IMAGE']['LINES']
+        '2048'
+    """
+    if isinstance(label, (bytes, bytearray, memoryview)):
+        label = bytes(label).decode('latin-1', errors='ignore')
+
+    root: Dict[str, Any] = {}
+    stack = [root]
+
+    for key, value in _statements(label):
+        if key in ('OBJECT', 'GROUP'):
+            block: Dict[str, Any] = {}
+            name = _unquote(value).upper()
+            stack[-1].setdefault(name, block)
+            stack.append(block)
+        elif key in ('END_OBJECT', 'END_GROUP'):
+            if len(stack) > 1:
+                stack.pop()
+        else:
+            stack[-1].setdefault(key, value)
+
+    return root
+
+
+def _unquote(value: str) -> str:
+    return value.strip().strip('"').strip("'").strip()
+
+
+def _get_int(block: Dict[str, Any], key: str, default: Optional[int] = None) -> int:
+    raw = block.get(key)
+    if raw is None:
+        if default is None:
+            raise ValueError(f"Missing required keyword {key}")
+        return default
+    match = re.match(r'\s*([-+]?\d+)', _unquote(raw))
+    if not match:
+        raise ValueError(f"Invalid integer for {key}: {raw}")
+    return int(match.group(1))
+
+
+def _get_float(block: Dict[str, Any], key: str, default: float) -> float:
+    raw = block.get(key)
+    if raw is None:
+        return default
+    match = re.match(r'\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)', _unquote(raw))
+    if not match:
+        raise ValueError(f"Invalid real for {key}: {raw}")
+    return float(match.group(1))
+
+
+def label_scaling(label: Dict[str, Any]) -> Tuple[float, float]:
+    """
+    Linear scaling from stored samples to physical values.
+
+    Args:
+        label (dict): Label parsed with :func:`parse_pds3_label`
+
+    Returns:
+        tuple: (SCALING_FACTOR, OFFSET) of the IMAGE object, (1.0, 0.0) if absent
+    """
+    image = label.get('IMAGE')
+    if not isinstance(image, dict):
+        return 1.0, 0.0
+    return _get_float(image, 'SCALING_FACTOR', 1.0), _get_float(image, 'OFFSET', 0.0)
+
+
+def _parse_pointer(raw: str, record_bytes: Optional[int]) -> Tuple[Optional[str], int]:
+    """
+    Decode an ^IMAGE pointer into (detached file name, byte offset).
+
+    Supported forms: ``12``, ``12345 <BYTES>``, ``"FILE.IMG"``,
+    ``("FILE.IMG", 12)`` and ``("FILE.IMG", 12345 <BYTES>)``.
+    """
+    value = raw.strip()
+    if value.startswith('(') and value.endswith(')'):
+        value = value[1:-1]
+
+    file_name = None
+    quoted = re.match(r'\s*"([^"]*)"\s*,?\s*(.*)$', value)
+    if quoted:
+        file_name = quoted.group(1)
+        value = quoted.group(2)
+
+    value = value.strip()
+    if not value:
+        return file_name, 0
+
+    match = re.match(r'(\d+)\s*(<\s*BYTES?\s*>)?', value, re.I)
+    if not match:
+        raise ValueError(f"Unsupported ^IMAGE pointer: {raw}")
+
+    position = int(match.group(1))
+    if match.group(2):
+        return file_name, position - 1
+    if not record_bytes:
+        raise ValueError("^IMAGE pointer in records but RECORD_BYTES is missing")
+    return file_name, (position - 1) * record_bytes
+
+
+def _resolve_data_file(label_path: Path, file_name: str) -> Path:
+    """Resolve a detached data file relative to its label, ignoring case."""
+    candidate = label_path.parent / file_name
+    if candidate.exists():
+        return candidate
+    lowered = file_name.lower()
+    for entry in label_path.parent.iterdir():
+        if entry.name.lower() == lowered:
+            return entry
+    raise ValueError(f"Detached data file not found: {file_name}")
+
+
+class PDS3ImageLayout:
+    """
+    Byte layout of the IMAGE object of a PDS3 product.
+
+    Attributes:
+        data_path (Path or None): File holding the raster (None for buffers)
+        offset (int): Byte offset of the first image record
+        lines (int): Number of lines
+        line_samples (int): Number of samples per line
+        bands (int): Number of bands
+        dtype (np.dtype): Sample dtype, including byte order
+        band_storage (str): BAND_SEQUENTIAL, LINE_INTERLEAVED or SAMPLE_INTERLEAVED
+        line_prefix_bytes (int): Bytes preceding each line record
+        line_suffix_bytes (int): Bytes following each line record
+        label (dict): Parsed label
+    """
+
+    def __init__(self, data_path: Optional[Path], offset: int,
+                 lines: int, line_samples: int, bands: int,
+                 dtype: np.dtype, band_storage: str = 'BAND_SEQUENTIAL',
+                 line_prefix_bytes: int = 0, line_suffix_bytes: int = 0,
+                 label: Optional[Dict[str, Any]] = None):
+        self.data_path = data_path
+        self.offset = offset
+        self.lines = lines
+        self.line_samples = line_samples
+        self.bands = bands
+        self.dtype = np.dtype(dtype)
+        self.band_storage = band_storage
+        self.line_prefix_bytes = line_prefix_bytes
+        self.line_suffix_bytes = line_suffix_bytes
+        self.label = label or {}
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        """Shape of the array returned by :meth:`memmap` (lines, samples[, bands])."""
+        if self.bands == 1:
+            return (self.lines, self.line_samples)
+        return (self.lines, self.line_samples, self.bands)
+
+    @property
+    def record_bytes(self) -> int:
+        """Bytes in one stored line record, including prefix and suffix."""
+        samples = self.line_samples
+        if self.band_storage == 'SAMPLE_INTERLEAVED':
+            samples *= self.bands
+        return self.line_prefix_bytes + samples * self.dtype.itemsize + self.line_suffix_bytes
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of the IMAGE object in bytes."""
+        records = self.lines
+        if self.band_storage != 'SAMPLE_INTERLEAVED':
+            records *= self.bands
+        return records * self.record_bytes
+
+    def bytes_through_line(self, line_stop: int) -> int:
+        """
+        File offset up to which bytes are needed to read lines [0, line_stop).
+
+        Used by streaming consumers to know when a block of lines (in every
+        band) has been fully downloaded.
+
+        Args:
+            line_stop (int): Exclusive end line
+
+        Returns:
+            int: Absolute end offset in the data file
+        """
+        line_stop = min(line_stop, self.lines)
+        if self.band_storage == 'LINE_INTERLEAVED':
+            return self.offset + line_stop * self.bands * self.record_bytes
+        if self.band_storage == 'BAND_SEQUENTIAL':
+            band_bytes = self.lines * self.record_bytes
+            return self.offset + (self.bands - 1) * band_bytes + line_stop * self.record_bytes
+        return self.offset + line_stop * self.record_bytes
+
+    def _record_layout(self) -> Tuple[np.dtype, Tuple[int, ...]]:
+        """Return the per-record dtype and the record grid shape."""
+        if self.band_storage == 'SAMPLE_INTERLEAVED':
+            data_shape = (self.line_samples, self.bands)
+            grid = (self.lines,)
+        elif self.band_storage == 'LINE_INTERLEAVED':
+            data_shape = (self.line_samples,)
+            grid = (self.lines, self.bands)
+        else:
+            data_shape = (self.line_samples,)
+            grid = (self.bands, self.lines)
+
+        fields = []
+        if self.line_prefix_bytes:
+            fields.append(('prefix', f'V{self.line_prefix_bytes}'))
+        fields.append(('data', self.dtype, data_shape))
+        if self.line_suffix_bytes:
+            fields.append(('suffix', f'V{self.line_suffix_bytes}'))
+        return np.dtype(fields), grid
+
+    def _arrange(self, records: np.ndarray) -> np.ndarray:
+        """Turn the record grid into a (lines, samples[, bands]) view."""
+        data = records['data']
+        if self.band_storage == 'LINE_INTERLEAVED':
+            data = data.transpose(0, 2, 1)
+        elif self.band_storage == 'BAND_SEQUENTIAL':
+            data = data.transpose(1, 2, 0)
+        if self.bands == 1:
+            data = data[:, :, 0]
+        return data
+
+    def memmap(self, mode: str = 'r') -> np.ndarray:
+        """
+        Map the raster read-only without loading it.
+
+        Args:
+            mode (str): numpy memmap mode ('r' or 'c')
+
+        Returns:
+            np.ndarray: View of shape :attr:`shape` backed by the file
+        """
+        if self.data_path is None:
+            raise ValueError("Layout has no backing file")
+        record_dtype, grid = self._record_layout()
+        records = np.memmap(self.data_path, dtype=record_dtype, mode=mode,
+                            offset=self.offset, shape=grid)
+        return self._arrange(records)
+
+    def from_buffer(self, buffer) -> np.ndarray:
+        """
+        View the raster inside an in-memory copy of the product (no copy).
+
+        Args:
+            buffer (bytes-like): Whole product (label and raster)
+
+        Returns:
+            np.ndarray: Read-only view of shape :attr:`shape` over the buffer
+
+        Raises:
+            ValueError: If the buffer is shorter than the label claims
+        """
+        buffer = memoryview(buffer).cast('B')
+        if self.offset + self.nbytes > len(buffer):
+            raise ValueError(f"Buffer truncated: expected {self.offset + self.nbytes} bytes, "
+                             f"found {len(buffer)}")
+        record_dtype, grid = self._record_layout()
+        records = np.ndarray(shape=grid, dtype=record_dtype, buffer=buffer,
+                             offset=self.offset)
+        records.flags.writeable = False
+        return self._arrange(records)
+
+
+def get_image_layout(label: Dict[str, Any],
+                     label_path: Optional[Union[str, Path]] = None) -> PDS3ImageLayout:
+    """
+    Build the raster layout from a parsed label.
+
+    Args:
+        label (dict): Label parsed with :func:`parse_pds3_label`
+        label_path (str or Path, optional): File the label was read from, used
+                                            to resolve detached data files
+
+    Returns:
+        PDS3ImageLayout: Raster layout
+
+    Raises:
+        ValueError: If the IMAGE object cannot be decoded natively
+    """
+    image = label.get('IMAGE')
+    if not isinstance(image, dict):
+        raise ValueError("No IMAGE object in label")
+    pointer = label.get('^IMAGE')
+    if pointer is None:
+        raise ValueError("No ^IMAGE pointer in label")
+
+    if 'ENCODING_TYPE' in image and _unquote(image['ENCODING_TYPE']).upper() not in ('N/A', 'NONE'):
+        raise ValueError(f"Compressed IMAGE not supported: {image['ENCODING_TYPE']}")
+
+    record_bytes = _get_int(label, 'RECORD_BYTES', 0)
+    file_name, offset = _parse_pointer(pointer, record_bytes)
+
+    data_path = Path(label_path) if label_path is not None else None
+    if file_name:
+        if data_path is None:
+            raise ValueError(f"Detached data file {file_name} needs a label path")
+        data_path = _resolve_data_file(data_path, file_name)
+
+    sample_bits = _get_int(image, 'SAMPLE_BITS')
+    if sample_bits not in (8, 16, 32, 64):
+        raise ValueError(f"Unsupported SAMPLE_BITS: {sample_bits}")
+    sample_type = _unquote(image.get('SAMPLE_TYPE', 'UNSIGNED_INTEGER')).upper()
+    if sample_type not in SAMPLE_TYPES:
+        raise ValueError(f"Unsupported SAMPLE_TYPE: {sample_type}")
+    kind, byte_order = SAMPLE_TYPES[sample_type]
+    if kind == 'f' and sample_bits < 32:
+        raise ValueError(f"Invalid float SAMPLE_BITS: {sample_bits}")
+    if sample_bits == 8:
+        byte_order = '|'
+    dtype = np.dtype(f'{byte_order}{kind}{sample_bits // 8}')
+
+    band_storage = _unquote(image.get('BAND_STORAGE_TYPE', 'BAND_SEQUENTIAL')).upper()
+    if band_storage not in BAND_STORAGE_TYPES:
+        raise ValueError(f"Unsupported BAND_STORAGE_TYPE: {band_storage}")
+
+    return PDS3ImageLayout(
+        data_path=data_path,
+        offset=offset,
+        lines=_get_int(image, 'LINES'),
+        line_samples=_get_int(image, 'LINE_SAMPLES'),
+        bands=_get_int(image, 'BANDS', 1),
+        dtype=dtype,
+        band_storage=band_storage,
+        line_prefix_bytes=_get_int(image, 'LINE_PREFIX_BYTES', 0),
+        line_suffix_bytes=_get_int(image, 'LINE_SUFFIX_BYTES', 0),
+        label=label,
+    )
+
+
+def read_image_layout(file_path: Union[str, Path]) -> PDS3ImageLayout:
+    """
+    Read the label of a PDS3 file and return its raster layout.
+
+    Args:
+        file_path (str or Path): Path to the .IMG (attached) or .LBL file
+
+    Returns:
+        PDS3ImageLayout: Raster layout
+    """
+    file_path = Path(file_path)
+    label = parse_pds3_label(read_label_bytes(file_path))
+    return get_image_layout(label, file_path)
+
+
+def read_buffer_layout(data) -> PDS3ImageLayout:
+    """
+    Parse the attached label at the start of an in-memory product.
+
+    Args:
+        data (bytes-like): Product bytes (at least the whole label)
+
+    Returns:
+        PDS3ImageLayout: Raster layout (data_path is None)
+
+    Raises:
+        ValueError: If no END statement is found within MAX_LABEL_BYTES, or
+                    the raster lives in a detached file
+    """
+    head = bytes(memoryview(data).cast('B')[:MAX_LABEL_BYTES])
+    end = find_label_end(head)
+    if end < 0:
+        raise ValueError("No PDS3 END statement found in buffer")
+    return get_image_layout(parse_pds3_label(head[:end]))
+
+
+def open_pds3_image(file_path: Union[str, Path], mode: str = 'r') -> np.ndarray:
+    """
+    Memory-map the IMAGE object of a PDS3 file.
+
+    Args:
+        file_path (str or Path): Path to the .IMG (attached) or .LBL file
+        mode (str): numpy memmap mode ('r' or 'c')
+
+    Returns:
+        np.ndarray: Array of shape (lines, samples) or (lines, samples, bands)
+                    in the file's dtype and byte order
+
+    Raises:
+        ValueError: If the label cannot be decoded natively or the file is
+                    shorter than the label claims
+
+    Example:
+        >>> img = open_pds3_image('ESP_011386_2065_RED.IMG')
+        >>> img.shape, img.dtype
+        ((40000, 20000), dtype('>u2'))
+    """
+    layout = read_image_layout(file_path)
+    file_size = os.path.getsize(layout.data_path)
+    if layout.offset + layout.nbytes > file_size:
+        raise ValueError(f"File truncated: expected {layout.offset + layout.nbytes} bytes, "
+                         f"found {file_size}")
+    logger.info(f"PDS3 layout: {layout.lines}x{layout.line_samples}x{layout.bands} "
+                f"{layout.dtype.str} {layout.band_storage} at offset {layout.offset}")
+    return layout.memmap(mode)
+
+
+def open_pds3_buffer(data) -> np.ndarray:
+    """
+    View the IMAGE object of an attached-label PDS3 product held in memory.
+
+    Args:
+        data (bytes-like): Whole product, e.g. a downloaded response body
+
+    Returns:
+        np.ndarray: Read-only array of shape (lines, samples) or
+                    (lines, samples, bands) sharing memory with ``data``
+
+    Raises:
+        ValueError: If the label cannot be decoded natively or the buffer is
+                    shorter than the label claims
+    """
+    layout = read_buffer_layout(data)
+    logger.info(f"PDS3 layout: {layout.lines}x{layout.line_samples}x{layout.bands} "
+                f"{layout.dtype.str} {layout.band_storage} at offset {layout.offset} (in memory)")
+    return layout.from_buffer(data)
@@ -0,0 +1,573 @@
+"""
+Conversion Planner
+==================
+
+This module decides, before any pixel is read, how a file is converted:
+
+- vips_lazy:    libvips reads the raster straight from the file (no numpy copy)
+- memmap_strip: strip-wise pipeline on a memory-mapped raster (TIFF output)
+- reduce_first: memory-mapped raster decimated near the output size first
+- memmap:       whole-image numpy pipeline on a memory-mapped raster
+- in_memory:    the file is fully loaded by pdr / planetaryimage (PDS4,
+                compressed or otherwise non-native PDS3 products)
+
+and which engine encodes the result (vips, pil, strip for the strip
+writer, or science for TIFFs keeping the source samples, see
+CONVERSION_SETTINGS['output_mode']). The decision uses the parsed label (dimensions, sample type, bands),
+the file size or Content-Length, the RAM available right now
+(PLANNER_SETTINGS['memory_fraction'] of it) and the throughput measured on
+previous conversions of this process, so it can be made from the first
+bytes of a download and checked before the rest is fetched.
+
+Until a strategy has PLANNER_SETTINGS['min_samples'] measurements, the static
+thresholds of the configuration (vips_threshold_pixels,
+strip_threshold_pixels) decide; measurements can be seeded from a
+benchmark.py result file (PLANNER_SETTINGS['benchmark_file']).
+
+Author: NASA Image Converter Team
+License: MIT
+"""
+
+import os
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, Union, Dict, List
+
+from config import ProcessingConfig
+from pds3_reader import (read_label_bytes, find_label_end, parse_pds3_label, get_image_layout,
+                         PDS3ImageLayout)
+from normalization import supports_histogram
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+# Settings that enable a whole-image enhancement
+ENHANCEMENT_KEYS = ('use_clahe', 'enhance_contrast', 'enhance_sharpness')
+
+# 'visual': normalized, enhanced uint8; 'science': samples kept (TIFF only)
+OUTPUT_MODES = ('visual', 'science')
+
+# uint8 copies of the image alive at once in the numpy pipeline
+# (normalized image, enhancement input/output, encoder buffer)
+WORKING_COPIES = {False: 2, True: 4}
+
+MB = 1024 * 1024
+
+
+def size_class(pixels: Optional[int]) -> int:
+    """
+    Size bucket of an image for throughput statistics.
+
+    Fixed costs (process start of libvips, encoder setup) weigh differently on
+    small and large images, so rates are only compared within a bucket.
+
+    Args:
+        pixels (int, optional): Pixels per band
+
+    Returns:
+        int: floor(log4(pixels)) (10 for 1-4 MP, 11 for 4-16 MP...), 0 if unknown
+    """
+    return max(0, int(pixels).bit_length() - 1) // 2 if pixels else 0
+
+
+def available_memory_mb() -> Optional[float]:
+    """
+    RAM available to new allocations.
+
+    Returns:
+        float or None: MemAvailable in MB (psutil, /proc/meminfo or sysconf),
+                       None when it cannot be determined
+    """
+    try:
+        import psutil
+        return psutil.virtual_memory().available / MB
+    except ImportError:
+        pass
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') / MB
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+class ThroughputModel:
+    """
+    Measured conversion throughput per strategy and engine.
+
+    Each measurement is the raster size (MB) over the conversion time; the
+    model keeps an exponentially weighted average per
+    'strategy:engine:size class' key. Thread-safe, per process.
+
+    Example:
+        >>> model = ThroughputModel(smoothing=0.3, min_samples=3)
+        >>> model.observe('memmap:pil:11', 64.0, 0.8)
+        >>> model.rate('memmap:pil:11') is None  # not enough samples yet
+        True
+    """
+
+    def __init__(self, smoothing: float = 0.3, min_samples: int = 3):
+        """
+        Initialize an empty model.
+
+        Args:
+            smoothing (float): Weight of the newest measurement (0-1)
+            min_samples (int): Measurements needed before a rate is trusted
+        """
+        self.smoothing = smoothing
+        self.min_samples = min_samples
+        self.rates = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key: str, megabytes: float, seconds: float):
+        """
+        Add one measurement.
+
+        Args:
+            key (str): 'strategy:engine:size class'
+            megabytes (float): Raster size in MB
+            seconds (float): Conversion time
+        """
+        if seconds <= 0 or megabytes <= 0:
+            return
+        rate = megabytes / seconds
+        with self._lock:
+            average, samples = self.rates.get(key, (rate, 0))
+            if samples:
+                average += self.smoothing * (rate - average)
+            self.rates[key] = (average, samples + 1)
+
+    def rate(self, key: str) -> Optional[float]:
+        """
+        Trusted throughput of a strategy.
+
+        Args:
+            key (str): 'strategy:engine:size class'
+
+        Returns:
+            float or None: MB/s, or None below min_samples measurements
+        """
+        average, samples = self.rates.get(key, (None, 0))
+        return average if samples >= self.min_samples else None
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Current averages (MB/s) and sample counts, for logging or export."""
+        with self._lock:
+            return {key: {'mb_per_second': round(average, 2), 'samples': samples}
+                    for key, (average, samples) in self.rates.items()}
+
+    def load_benchmark(self, path: Union[str, Path]) -> int:
+        """
+        Seed the model with the end-to-end runs of a benchmark.py result file.
+
+        Args:
+            path (str or Path): benchmark_<stamp>.json
+
+        Returns:
+            int: Number of measurements loaded
+        """
+        with open(path, encoding='utf-8') as f:
+            runs = json.load(f).get('runs', [])
+        loaded = 0
+        for run in runs:
+            if run.get('mode') != 'end_to_end' or run.get('status') != 'ok' or not run.get('strategy'):
+                continue
+            key = f"{run['strategy']}:{run['engine']}:{size_class(run['size'] * run['size'])}"
+            self.observe(key, run['raster_mb'], run['total_seconds'])
+            loaded += 1
+        return loaded
+
+
+class ConversionPlan:
+    """
+    Strategy and engine chosen for one conversion, with the reasons.
+
+    Attributes:
+        strategy (str): vips_lazy, memmap_strip, reduce_first, memmap or in_memory
+        engine (str): vips, pil, strip or science
+        reasons (list): Short explanations of the choice
+        raster_mb (float or None): Raster size from the label
+        pixels (int or None): Pixels per band from the label
+        memory_mb (float or None): Estimated peak working memory
+        seconds (float or None): Estimated time from measured throughput
+        rejected (str or None): Why the file cannot be converted within the
+                                memory limits (the conversion should not start)
+    """
+
+    def __init__(self, strategy: str, engine: str, reasons: List[str],
+                 raster_mb: Optional[float] = None, pixels: Optional[int] = None,
+                 memory_mb: Optional[float] = None, seconds: Optional[float] = None,
+                 rejected: Optional[str] = None):
+        self.strategy = strategy
+        self.engine = engine
+        self.reasons = reasons
+        self.raster_mb = raster_mb
+        self.pixels = pixels
+        self.memory_mb = memory_mb
+        self.seconds = seconds
+        self.rejected = rejected
+
+    @property
+    def key(self) -> str:
+        """Throughput key of this plan ('strategy:engine:size class')."""
+        return f"{self.strategy}:{self.engine}:{size_class(self.pixels)}"
+
+    def headers(self) -> Dict[str, str]:
+        """
+        HTTP response headers describing the plan.
+
+        Returns:
+            dict: X-Conversion-Strategy, X-Conversion-Engine, X-Conversion-Plan
+                  and, when known, X-Conversion-Estimate
+        """
+        headers = {
+            'X-Conversion-Strategy': self.strategy,
+            'X-Conversion-Engine': self.engine,
+            'X-Conversion-Plan': '; '.join(self.reasons),
+        }
+        estimate = []
+        if self.memory_mb is not None:
+            estimate.append(f"memory={self.memory_mb:.0f}MB")
+        if self.seconds is not None:
+            estimate.append(f"seconds={self.seconds:.2f}")
+        if estimate:
+            headers['X-Conversion-Estimate'] = '; '.join(estimate)
+        return headers
+
+    def __repr__(self) -> str:
+        return f"ConversionPlan({self.key}, {'; '.join(self.reasons)})"
+
+
+class ConversionPlanner:
+    """
+    Choose the conversion strategy and engine of a file.
+
+    Example:
+        >>> planner = ConversionPlanner(config, vips_available=True)
+        >>> plan = planner.plan_file('mars.img', 'TIFF', enhance=False)
+        >>> plan.strategy
+        'vips_lazy'
+    """
+
+    def __init__(self, config: Optional[ProcessingConfig] = None, vips_available: bool = False):
+        """
+        Initialize the ConversionPlanner.
+
+        Args:
+            config (ProcessingConfig, optional): Configuration object
+            vips_available (bool): Whether pyvips could be loaded
+        """
+        self.config = config or ProcessingConfig()
+        self.settings = self.config.PLANNER_SETTINGS
+        self.conversion_settings = self.config.CONVERSION_SETTINGS
+        self.memory_settings = self.config.MEMORY_SETTINGS
+        self.vips_available = vips_available
+        self.throughput = ThroughputModel(self.settings.get('throughput_smoothing', 0.3),
+                                          self.settings.get('min_samples', 3))
+
+        benchmark_file = self.settings.get('benchmark_file')
+        if benchmark_file:
+            try:
+                loaded = self.throughput.load_benchmark(benchmark_file)
+                logger.info(f"Planner: {loaded} throughput measurements loaded from {benchmark_file}")
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Planner: cannot read benchmark file {benchmark_file}: {e}")
+
+    def memory_budget_mb(self) -> Optional[float]:
+        """
+        Memory one conversion may use.
+
+        Returns:
+            float or None: PLANNER_SETTINGS['memory_fraction'] of the available
+                           RAM, None when the available RAM is unknown
+        """
+        available = available_memory_mb()
+        if available is None:
+            return None
+        return available * self.settings.get('memory_fraction', 0.5)
+
+    def layout_from_head(self, head: bytes) -> Optional[PDS3ImageLayout]:
+        """
+        Raster layout from the first bytes of an attached-label PDS3 file.
+
+        Args:
+            head (bytes): Beginning of the file
+
+        Returns:
+            PDS3ImageLayout or None: Layout (without data file), or None when
+                                     the label is incomplete or not decodable
+        """
+        label_end = find_label_end(head)
+        if label_end < 0:
+            return None
+        try:
+            return get_image_layout(parse_pds3_label(head[:label_end]))
+        except ValueError as e:
+            logger.debug(f"Planner: label not decodable natively ({e})")
+            return None
+
+    def plan_head(self, head: bytes, content_length: Optional[int], format: str,
+                  enhance: bool = True, max_dimension: Optional[int] = None,
+                  output_mode: Optional[str] = None) -> Optional[ConversionPlan]:
+        """
+        Plan a download from its first bytes and announced size.
+
+        Args:
+            head (bytes): First bytes of the body
+            content_length (int, optional): Content-Length of the response
+            format (str): Output format
+            enhance (bool): Whether enhancements were requested
+            max_dimension (int, optional): Maximum output dimension
+            output_mode (str, optional): One of OUTPUT_MODES (default from
+                                         CONVERSION_SETTINGS)
+
+        Returns:
+            ConversionPlan or None: Plan, or None if the label is longer than
+                                    head (plan the downloaded file instead)
+        """
+        if find_label_end(head) < 0 and b'PDS_VERSION_ID' in head[:1024]:
+            return None
+        return self.plan(self.layout_from_head(head), content_length, format, enhance, max_dimension,
+                         output_mode)
+
+    def plan_file(self, input_path: Union[str, Path], format: str, enhance: bool = True,
+                  max_dimension: Optional[int] = None,
+                  output_mode: Optional[str] = None) -> ConversionPlan:
+        """
+        Plan the conversion of a local file.
+
+        Args:
+            input_path (str or Path): Path to the .IMG file
+            format (str): Output format
+            enhance (bool): Whether enhancements were requested
+            max_dimension (int, optional): Maximum output dimension
+            output_mode (str, optional): One of OUTPUT_MODES (default from
+                                         CONVERSION_SETTINGS)
+
+        Returns:
+            ConversionPlan: Plan
+        """
+        layout = None
+        file_size = None
+        try:
+            file_size = os.path.getsize(input_path)
+            layout = get_image_layout(parse_pds3_label(read_label_bytes(input_path)), input_path)
+            if layout.data_path != Path(input_path):
+                file_size = os.path.getsize(layout.data_path)
+        except (ValueError, OSError) as e:
+            logger.debug(f"Planner: no native layout for {input_path} ({e})")
+            layout = None
+        return self.plan(layout, file_size, format, enhance, max_dimension, output_mode)
+
+    def science_output(self, format: str, output_mode: Optional[str] = None) -> bool:
+        """
+        Whether a conversion keeps the source samples.
+
+        Args:
+            format (str): Output format (science outputs are TIFF only)
+            output_mode (str, optional): One of OUTPUT_MODES (default from
+                                         CONVERSION_SETTINGS)
+
+        Returns:
+            bool: True for a science output
+
+        Raises:
+            ValueError: If the mode is unknown
+        """
+        output_mode = output_mode or self.conversion_settings.get('output_mode', 'visual')
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f"Unknown output mode: {output_mode}")
+        if output_mode == 'science' and format.upper() not in ('TIFF', 'TIF', 'COG'):
+            logger.warning(f"Science output needs TIFF, converting {format} as visual")
+            return False
+        return output_mode == 'science'
+
+    def plan(self, layout: Optional[PDS3ImageLayout], file_size: Optional[int], format: str,
+             enhance: bool = True, max_dimension: Optional[int] = None,
+             output_mode: Optional[str] = None) -> ConversionPlan:
+        """
+        Choose strategy and engine.
+
+        Science outputs skip normalization and enhancement: memory-mapped
+        rasters are written strip by strip (memmap_strip:science), other
+        products after a whole load (in_memory:science).
+
+        Args:
+            layout (PDS3ImageLayout, optional): Raster layout; None for
+                                                products only pdr /
+                                                planetaryimage can read
+            file_size (int, optional): Size of the file holding the raster
+            format (str): Output format
+            enhance (bool): Whether enhancements were requested
+            max_dimension (int, optional): Maximum output dimension
+            output_mode (str, optional): One of OUTPUT_MODES (default from
+                                         CONVERSION_SETTINGS)
+
+        Returns:
+            ConversionPlan: Plan
+        """
+        budget = self.memory_budget_mb()
+        science = self.science_output(format, output_mode)
+        if layout is None:
+            return self._plan_library(file_size, budget, science)
+
+        format = format.upper()
+        enhancements = enhance and any(self.conversion_settings.get(key) for key in ENHANCEMENT_KEYS)
+        pixels = layout.lines * layout.line_samples
+        bucket = size_class(pixels)
+        raster_mb = layout.nbytes / MB
+        reasons = [f"{layout.line_samples}x{layout.lines}x{layout.bands} {layout.dtype.name}"]
+
+        # Output of the numpy pipeline, after the optional decimation
+        factor = 1
+        if max_dimension and self.memory_settings.get('reduce_first', True):
+            factor = max(1, max(layout.lines, layout.line_samples) // max_dimension)
+        work_pixels = -(-layout.lines // factor) * -(-layout.line_samples // factor)
+        numpy_mb = work_pixels * layout.bands * WORKING_COPIES[enhancements] / MB
+        if factor > 1:
+            # Decimated source held in its own dtype
+            numpy_mb += work_pixels * layout.bands * layout.dtype.itemsize / MB
+        fits = budget is None or numpy_mb <= budget
+
+        truncated = file_size is not None and file_size < layout.offset + layout.nbytes
+        if truncated:
+            reasons.append(f"file holds {file_size} of {layout.offset + layout.nbytes} bytes")
+
+        if science:
+            reasons.append('science output: source samples, no normalization or enhancement')
+            if not truncated and self.memory_settings.get('use_memory_mapping', False):
+                return self._finish('memmap_strip', 'science', reasons, raster_mb, pixels,
+                                    self.memory_settings.get('strip_memory_mb', 64))
+            return self._finish('in_memory', 'science', reasons, raster_mb, pixels, raster_mb)
+
+        numpy_strategy = 'reduce_first' if factor > 1 else 'memmap'
+        numpy_engine = self._numpy_engine(numpy_strategy, work_pixels, bucket)
+
+        if not truncated and self._vips_lazy_eligible(layout, enhancements):
+            choose, why = self._prefer(
+                f"vips_lazy:vips:{bucket}", f"{numpy_strategy}:{numpy_engine}:{bucket}",
+                pixels > self.conversion_settings.get('vips_threshold_pixels', 10_000_000),
+                'above vips_threshold_pixels')
+            if not fits:
+                choose, why = True, f"numpy working set {numpy_mb:.0f}MB exceeds budget"
+            if choose:
+                reasons.append(why)
+                # Demand-driven: only a few lines of each band are in flight
+                return self._finish('vips_lazy', 'vips', reasons, raster_mb, pixels, None)
+
+        if not truncated and self._strips_eligible(format, enhancements):
+            choose, why = self._prefer(
+                f"memmap_strip:strip:{bucket}", f"{numpy_strategy}:{numpy_engine}:{bucket}",
+                pixels > self.memory_settings.get('strip_threshold_pixels', 25_000_000),
+                'above strip_threshold_pixels')
+            if not fits:
+                choose, why = True, f"numpy working set {numpy_mb:.0f}MB exceeds budget"
+            if choose:
+                reasons.append(why)
+                strip_mb = self.memory_settings.get('strip_memory_mb', 64)
+                if factor > 1:
+                    strip_mb += work_pixels * layout.bands * 4 / MB
+                return self._finish('memmap_strip', 'strip', reasons, raster_mb, pixels, strip_mb)
+
+        if factor > 1:
+            reasons.append(f"decimate by {factor} for max_dimension={max_dimension}")
+        if enhancements:
+            reasons.append('whole-image enhancements')
+        rejected = None
+        if not fits:
+            rejected = (f"numpy working set {numpy_mb:.0f}MB exceeds the memory budget "
+                        f"({budget:.0f}MB)")
+            reasons.append(rejected)
+            if not self.settings.get('reject_over_budget', False):
+                rejected = None
+        return self._finish(numpy_strategy, numpy_engine, reasons, raster_mb, pixels,
+                            numpy_mb, rejected)
+
+    def _plan_library(self, file_size: Optional[int], budget: Optional[float],
+                      science: bool = False) -> ConversionPlan:
+        """Plan for a product read whole by pdr / planetaryimage."""
+        reasons = ['label not decodable natively, loaded whole by pdr/planetaryimage']
+        if science:
+            reasons.append('science output: source samples, no normalization or enhancement')
+        limit_mb = self.memory_settings.get('max_memory_load', 500)
+        if budget is not None:
+            limit_mb = min(limit_mb, budget / WORKING_COPIES[True])
+        rejected = None
+        size_mb = file_size / MB if file_size is not None else None
+        if size_mb is not None and size_mb > limit_mb:
+            rejected = f"{size_mb:.0f}MB exceeds the in-memory limit ({limit_mb:.0f}MB)"
+            reasons.append(rejected)
+        elif size_mb is None:
+            reasons.append('size unknown')
+        memory_mb = size_mb * (1 + WORKING_COPIES[True]) if size_mb is not None else None
+        return self._finish('in_memory', 'science' if science else 'pil', reasons, size_mb, None,
+                            memory_mb, rejected)
+
+    def _vips_lazy_eligible(self, layout: PDS3ImageLayout, enhancements: bool) -> bool:
+        if not self.vips_available or not self.conversion_settings.get('vips_native_pipeline', True):
+            return False
+        if enhancements or not supports_histogram(layout.dtype) or layout.bands not in (1, 3):
+            return False
+        pixel_bytes = layout.dtype.itemsize
+        if layout.band_storage == 'SAMPLE_INTERLEAVED':
+            pixel_bytes *= layout.bands
+        return not (layout.line_prefix_bytes % pixel_bytes or layout.line_suffix_bytes % pixel_bytes)
+
+    def _strips_eligible(self, format: str, enhancements: bool) -> bool:
+        return (self.memory_settings.get('use_strip_processing', False)
+                and self.memory_settings.get('use_memory_mapping', False)
+                and format in ('TIFF', 'TIF', 'COG') and not enhancements)
+
+    def _prefer(self, candidate: str, alternative: str, static_choice: bool, static_reason: str):
+        """Candidate vs. numpy pipeline: measured throughput if known, else the static threshold."""
+        candidate_rate = self.throughput.rate(candidate)
+        alternative_rate = self.throughput.rate(alternative)
+        if candidate_rate is not None and alternative_rate is not None:
+            return (candidate_rate > alternative_rate,
+                    f"measured {candidate_rate:.0f} vs {alternative_rate:.0f} MB/s for {alternative}")
+        return static_choice, static_reason
+
+    def _numpy_engine(self, strategy: str, work_pixels: int, bucket: int) -> str:
+        """Encoder of the numpy pipeline: VIPS or PIL."""
+        if not self.vips_available:
+            return 'pil'
+        vips_rate = self.throughput.rate(f"{strategy}:vips:{bucket}")
+        pil_rate = self.throughput.rate(f"{strategy}:pil:{bucket}")
+        if vips_rate is not None and pil_rate is not None:
+            return 'vips' if vips_rate > pil_rate else 'pil'
+        return 'vips' if work_pixels > self.conversion_settings.get('vips_threshold_pixels',
+                                                                    10_000_000) else 'pil'
+
+    def _finish(self, strategy: str, engine: str, reasons: List[str],
+                raster_mb: Optional[float], pixels: Optional[int], memory_mb: Optional[float],
+                rejected: Optional[str] = None) -> ConversionPlan:
+        plan = ConversionPlan(strategy, engine, reasons, raster_mb, pixels, memory_mb,
+                              rejected=rejected)
+        rate = self.throughput.rate(plan.key)
+        if rate and raster_mb:
+            plan.seconds = raster_mb / rate
+        logger.info(f"Planner: {plan}")
+        return plan
+
+    def record(self, plan: ConversionPlan, seconds: float):
+        """
+        Feed the measured duration of a planned conversion back to the model.
+
+        Args:
+            plan (ConversionPlan): Executed plan
+            seconds (float): Conversion time
+        """
+        if plan.raster_mb:
+            self.throughput.observe(plan.key, plan.raster_mb, seconds)
@@ -9,18 +9,26 @@ Author: NASA Image Converter Team
 License: MIT
 """
 
-import os
 import gc
+import os
+import time
 import logging
 from pathlib import Path
 from typing import Optional, Tuple, Union, List
 from io import BytesIO
 
 import numpy as np
-from PIL import Image, ImageEnhance
-import cv2
+from PIL import Image
 
 from config import ProcessingConfig
+from pds3_reader import (open_pds3_image, open_pds3_buffer, read_image_layout, label_scaling,
+                         PDS3ImageLayout)
+from strip_converter import StripConverter
+from tiff_writer import TiledTiffWriter
+from geotiff import GeoReference
+from normalization import apply_window, scale_values, ValueHistogram, supports_histogram
+from enhancement import EnhancementEngine
+from planner import ConversionPlanner, ConversionPlan
 
 # Configure logging
 logging.basicConfig(
@@ -30,6 +38,24 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# pyvips formats used to read 8 and 16-bit samples as raw unsigned bits
+VIPS_RAW_FORMATS = {1: 'uchar', 2: 'ushort'}
+
+# In-memory products the loaders accept in place of a path
+BUFFER_TYPES = (bytes, bytearray, memoryview, BytesIO)
+
+ImageSource = Union[str, Path, bytes, bytearray, memoryview, BytesIO]
+
+
+def source_buffer(source: ImageSource) -> Optional[memoryview]:
+    """Byte view of an in-memory source, or None for a path."""
+    if isinstance(source, BytesIO):
+        return source.getbuffer()
+    if isinstance(source, BUFFER_TYPES):
+        return memoryview(source).cast('B')
+    return None
+
+
 class ImageConverter:
     """
     Main class for converting scientific image files to standard formats.
@@ -58,6 +84,8 @@ class ImageConverter:
         self.conversion_settings = self.config.CONVERSION_SETTINGS
         self.memory_settings = self.config.MEMORY_SETTINGS
         self.pds_settings = self.config.PDS_SETTINGS
+        self.strip_converter = StripConverter(self.config)
+        self.enhancement_engine = EnhancementEngine(self.config)
         
         # Try to load pyvips for better large image handling
         self.vips_available = False
@@ -74,12 +102,16 @@ class ImageConverter:
                 logger.warning(f"pyvips not available: {e}. Will use PIL for all operations.")
                 self.vips_available = False
         
-    def detect_pds_version(self, file_path: Union[str, Path]) -> str:
+        # Strategy / engine choice, fed with the measured conversion times
+        self.planner = ConversionPlanner(self.config, self.vips_available)
+        
+    def detect_pds_version(self, file_path: ImageSource) -> str:
         """
         Detect PDS version (PDS3 or PDS4) from file header.
         
         Args:
-            file_path (str or Path): Path to the .IMG file
+            file_path (str, Path or bytes-like): Path to the .IMG file, or
+                                                 the product held in memory
             
         Returns:
             str: 'PDS3', 'PDS4', or 'Unknown'
@@ -91,31 +123,44 @@ class ImageConverter:
             'PDS3'
         """
         try:
-            with open(file_path, 'rb') as f:
-                header = f.read(self.pds_settings['detection_chunk_size'])
-                header_text = header.decode('latin-1', errors='ignore')
-                
-                # Check for PDS3 markers
-                if any(marker in header_text for marker in ['PDS_VERSION_ID', 'PDS3']):
-                    return 'PDS3'
-                
-                # Check for PDS4 markers
-                elif any(marker in header_text for marker in ['PDS4', '<?xml', 'pds:']):
-                    return 'PDS4'
-                
-                return 'Unknown'
-                
+            chunk_size = self.pds_settings['detection_chunk_size']
+            buffer = source_buffer(file_path)
+            if buffer is not None:
+                header = bytes(buffer[:chunk_size])
+            else:
+                with open(file_path, 'rb') as f:
+                    header = f.read(chunk_size)
+            header_text = header.decode('latin-1', errors='ignore')
+            
+            # Check for PDS3 markers
+            if any(marker in header_text for marker in ['PDS_VERSION_ID', 'PDS3']):
+                return 'PDS3'
+            
+            # Check for PDS4 markers
+            elif any(marker in header_text for marker in ['PDS4', '<?xml', 'pds:']):
+                return 'PDS4'
+            
+            return 'Unknown'
+            
         except Exception as e:
             logger.error(f"Error detecting PDS version: {e}")
             return 'Unknown'
     
-    def load_pds_image(self, file_path: Union[str, Path], 
+    def load_pds_image(self, file_path: ImageSource, 
                        pds_version: Optional[str] = None) -> Optional[np.ndarray]:
         """
         Load image data from PDS file.
         
+        PDS3 rasters are memory-mapped with the native reader when
+        MEMORY_SETTINGS['use_memory_mapping'] is enabled, so pixels are only
+        paged in as later stages touch them. A product already held in memory
+        (bytes, bytearray, memoryview or BytesIO) is viewed in place without
+        touching the disk; only attached-label PDS3 products can be read that
+        way.
+        
         Args:
-            file_path (str or Path): Path to the .IMG file
+            file_path (str, Path or bytes-like): Path to the .IMG file, or
+                                                 the product held in memory
             pds_version (str, optional): PDS version ('PDS3' or 'PDS4'). 
                                         Auto-detected if None.
             
@@ -128,11 +173,13 @@ class ImageConverter:
             >>> print(img_data.shape)
             (2048, 2048)
         """
-        file_path = Path(file_path)
-        
-        if not file_path.exists():
-            logger.error(f"File not found: {file_path}")
-            return None
+        buffer = source_buffer(file_path)
+        if buffer is None:
+            file_path = Path(file_path)
+            
+            if not file_path.exists():
+                logger.error(f"File not found: {file_path}")
+                return None
         
         # Auto-detect PDS version if not provided
         if pds_version is None:
@@ -142,35 +189,59 @@ class ImageConverter:
         img_data = None
         
         try:
-            if pds_version == 'PDS3':
-                # Try pdr first (recommended for NumPy 2.x compatibility)
+            if pds_version == 'PDS3' and buffer is not None:
+                # View the raster inside the downloaded bytes
                 try:
-                    import pdr
-                    logger.info(f"Loading {file_path} with pdr...")
-                    data = pdr.read(str(file_path))
-                    
-                    # Extract image data
-                    if hasattr(data, 'IMAGE'):
-                        img_data = np.array(data.IMAGE, copy=False)
-                    elif hasattr(data, 'image'):
-                        img_data = np.array(data.image, copy=False)
-                    else:
-                        # Find first suitable array
-                        for key in dir(data):
-                            attr = getattr(data, key)
-                            if isinstance(attr, np.ndarray) and attr.ndim >= 2:
-                                img_data = attr
-                                break
-                    
-                    if img_data is None:
-                        raise ValueError("No image data found in PDS file")
-                        
-                except ImportError:
-                    logger.warning("pdr not available, trying planetaryimage...")
+                    img_data = open_pds3_buffer(buffer)
+                except ValueError as e:
+                    logger.warning(f"Native PDS3 reader failed ({e}), falling back to planetaryimage...")
                     from planetaryimage import PDS3Image
-                    pds_img = PDS3Image.open(str(file_path))
+                    pds_img = PDS3Image(BytesIO(buffer))
                     img_data = np.array(pds_img.image, copy=False)
+            
+            elif pds_version == 'PDS3':
+                if self.memory_settings.get('use_memory_mapping', False):
+                    # Map the raw raster directly; nothing is read until it is used
+                    try:
+                        img_data = open_pds3_image(file_path)
+                        logger.info(f"Memory-mapped {file_path} with native PDS3 reader")
+                    except (ValueError, OSError) as e:
+                        logger.warning(f"Native PDS3 reader failed ({e}), falling back to pdr...")
+                
+                if img_data is None:
+                    # Try pdr first (recommended for NumPy 2.x compatibility)
+                    try:
+                        import pdr
+                        logger.info(f"Loading {file_path} with pdr...")
+                        data = pdr.read(str(file_path))
+                        
+                        # Extract image data
+                        if hasattr(data, 'IMAGE'):
+                            img_data = np.array(data.IMAGE, copy=False)
+                        elif hasattr(data, 'image'):
+                            img_data = np.array(data.image, copy=False)
+                        else:
+                            # Find first suitable array
+                            for key in dir(data):
+                                attr = getattr(data, key)
+                                if isinstance(attr, np.ndarray) and attr.ndim >= 2:
+                                    img_data = attr
+                                    break
+                        
+                        if img_data is None:
+                            raise ValueError("No image data found in PDS file")
+                            
+                    except ImportError:
+                        logger.warning("pdr not available, trying planetaryimage...")
+                        from planetaryimage import PDS3Image
+                        pds_img = PDS3Image.open(str(file_path))
+                        img_data = np.array(pds_img.image, copy=False)
                     
+            elif pds_version == 'PDS4' and buffer is not None:
+                logger.error("PDS4 products need their XML label on disk; "
+                             "in-memory loading is PDS3 only")
+                return None
+            
             elif pds_version == 'PDS4':
                 from planetaryimage import PDS4Image
                 logger.info(f"Loading {file_path} with planetaryimage (PDS4)...")
@@ -188,6 +259,36 @@ class ImageConverter:
             logger.error(f"Error loading PDS image: {e}")
             return None
     
+    def reduce_for_target(self, img_data: np.ndarray,
+                          max_dimension: Optional[int]) -> np.ndarray:
+        """
+        Decimate an image far larger than the requested output size.
+        
+        When max_dimension is at least twice smaller than the source, the
+        source is shrunk by the largest integer factor that keeps it at or
+        above max_dimension, so normalization and enhancement run on an
+        intermediate near the output size. The final LANCZOS resize then
+        brings it to the exact size.
+        
+        Args:
+            img_data (np.ndarray): Loaded image data (usually a memmap)
+            max_dimension (int, optional): Target maximum dimension
+            
+        Returns:
+            np.ndarray: Reduced image, or img_data unchanged
+        """
+        if not max_dimension or not self.memory_settings.get('reduce_first', True):
+            return img_data
+        factor = max(img_data.shape[:2]) // max_dimension
+        if factor < 2:
+            return img_data
+        
+        method = self.memory_settings.get('reduce_first_method', 'box')
+        reduced = self.strip_converter.reduce(img_data, factor, method)
+        logger.info(f"Reduced {img_data.shape} -> {reduced.shape} before processing "
+                   f"({method}, factor={factor})")
+        return reduced
+    
     def normalize_image(self, img_data: np.ndarray) -> np.ndarray:
         """
         Normalize image data to 0-255 range using percentile-based scaling.
@@ -209,17 +310,17 @@ class ImageConverter:
             uint8 0 255
         """
         logger.info(f"Normalizing image: dtype={img_data.dtype}, shape={img_data.shape}")
-        logger.info(f"Value range: min={img_data.min()}, max={img_data.max()}, mean={img_data.mean():.2f}")
         
-        # If already uint8 with good contrast, return as-is
-        if img_data.dtype == np.uint8:
-            if img_data.max() > 200 and img_data.min() < 50:
-                logger.info("Image already well-contrasted, skipping normalization")
+        # Exact full-resolution histogram for 8/16-bit data (one streaming pass)
+        if supports_histogram(img_data.dtype):
+            window = self.histogram_window(ValueHistogram.from_array(img_data))
+            if window is None:
                 return img_data
+            p_low, p_high = window
         
         # Use percentiles to avoid outliers
-        if self.conversion_settings['normalize_percentiles']:
-            # Sample for large images to save memory
+        elif self.conversion_settings['normalize_percentiles']:
+            # Sample large float images to save memory
             if img_data.size > 10_000_000:
                 logger.info("Large image detected, sampling for percentile calculation...")
                 sample = img_data.ravel()[::100]
@@ -235,20 +336,37 @@ class ImageConverter:
             p_low = img_data.min()
             p_high = img_data.max()
         
-        # Normalize
-        if p_high - p_low > 0:
-            # Use float32 to save memory
-            img_normalized = img_data.astype(np.float32)
-            np.clip(img_normalized, p_low, p_high, out=img_normalized)
-            img_normalized -= p_low
-            img_normalized *= (255.0 / (p_high - p_low))
-            result = img_normalized.astype(np.uint8)
-            
-            logger.info(f"Normalized: min={result.min()}, max={result.max()}")
-            return result
-        else:
+        # Normalize (lookup table for 8/16-bit data, chunked float32 otherwise)
+        if not p_high - p_low > 0:
             logger.warning("No variation in image data")
-            return np.zeros_like(img_data, dtype=np.uint8)
+        return apply_window(img_data, (p_low, p_high))
+    
+    def histogram_window(self, hist: ValueHistogram) -> Optional[Tuple[float, float]]:
+        """
+        Normalization window of 8/16-bit data from its exact histogram.
+        
+        Args:
+            hist (ValueHistogram): Histogram of the whole image
+            
+        Returns:
+            tuple or None: (p_low, p_high), or None when uint8 data is already
+                           well-contrasted and should be passed through
+        """
+        # If already uint8 with good contrast, return as-is
+        if hist.dtype == np.uint8 and hist.max() > 200 and hist.min() < 50:
+            logger.info("Image already well-contrasted, skipping normalization")
+            return None
+        
+        # Use percentiles to avoid outliers
+        if self.conversion_settings['normalize_percentiles']:
+            p_low = hist.percentile(self.conversion_settings['percentile_low'])
+            p_high = hist.percentile(self.conversion_settings['percentile_high'])
+            logger.info(f"Percentiles: {self.conversion_settings['percentile_low']}%={p_low}, "
+                       f"{self.conversion_settings['percentile_high']}%={p_high}")
+        else:
+            p_low = hist.min()
+            p_high = hist.max()
+        return p_low, p_high
     
     def enhance_image(self, img_data: np.ndarray) -> np.ndarray:
         """
@@ -259,6 +377,8 @@ class ImageConverter:
         - Contrast adjustment
         - Sharpness adjustment
         
+        All three run multi-threaded in EnhancementEngine.
+        
         Args:
             img_data (np.ndarray): Input image data (uint8)
             
@@ -270,46 +390,8 @@ class ImageConverter:
             >>> img = np.random.randint(0, 255, (512, 512), dtype=np.uint8)
             >>> enhanced = converter.enhance_image(img)
         """
-        # Apply CLAHE if enabled
-        if self.conversion_settings['use_clahe']:
-            try:
-                logger.info("Applying CLAHE enhancement...")
-                clahe = cv2.createCLAHE(
-                    clipLimit=self.conversion_settings['clahe_clip_limit'],
-                    tileGridSize=self.conversion_settings['clahe_tile_grid_size']
-                )
-                
-                if len(img_data.shape) == 2:
-                    img_data = clahe.apply(img_data)
-                else:
-                    # Apply to each channel
-                    for i in range(img_data.shape[2]):
-                        img_data[:, :, i] = clahe.apply(img_data[:, :, i])
-                
-                logger.info("CLAHE applied successfully")
-            except Exception as e:
-                logger.warning(f"CLAHE failed: {e}, skipping")
-        
-        # Convert to PIL for additional enhancements
-        if len(img_data.shape) == 2:
-            img = Image.fromarray(img_data, 'L')
-        else:
-            img = Image.fromarray(img_data, 'RGB')
-        
-        # Enhance contrast
-        if self.conversion_settings['enhance_contrast']:
-            enhancer = ImageEnhance.Contrast(img)
-            img = enhancer.enhance(self.conversion_settings['contrast_factor'])
-            logger.info(f"Contrast enhanced by factor {self.conversion_settings['contrast_factor']}")
-        
-        # Enhance sharpness
-        if self.conversion_settings['enhance_sharpness']:
-            enhancer = ImageEnhance.Sharpness(img)
-            img = enhancer.enhance(self.conversion_settings['sharpness_factor'])
-            logger.info(f"Sharpness enhanced by factor {self.conversion_settings['sharpness_factor']}")
-        
-        # Convert back to numpy array
-        return np.array(img)
+        # CLAHE per band in parallel, contrast as a LUT, tiled sharpening
+        return self.enhancement_engine.enhance(img_data)
     
     def convert_to_pil(self, img_data: np.ndarray) -> Image.Image:
         """
@@ -327,7 +409,8 @@ class ImageConverter:
             return Image.fromarray(img_data, 'RGB')
     
     def convert_with_vips(self, img_data: np.ndarray, output_path: Union[str, Path],
-                          format: str = 'TIFF', max_dimension: Optional[int] = None) -> bool:
+                          format: str = 'TIFF', max_dimension: Optional[int] = None,
+                          georef: Optional[GeoReference] = None) -> bool:
         """
         Convert image using VIPS for better performance on large images.
         
@@ -336,6 +419,7 @@ class ImageConverter:
             output_path (Union[str, Path]): Output file path
             format (str): Output format
             max_dimension (Optional[int]): Maximum dimension for resizing
+            georef (Optional[GeoReference]): Map projection of COG outputs
             
         Returns:
             bool: True if successful
@@ -348,66 +432,196 @@ class ImageConverter:
             output_path = Path(output_path)
             output_path.parent.mkdir(parents=True, exist_ok=True)
             
-            # Create VIPS image from numpy array
+            # Create VIPS image from numpy array (shares the buffer, no tobytes() copy)
+            img_data = np.ascontiguousarray(img_data)
             if len(img_data.shape) == 2:
                 # Grayscale
                 height, width = img_data.shape
                 vips_img = self.pyvips.Image.new_from_memory(
-                    img_data.tobytes(), width, height, 1, 'uchar'
+                    img_data.data, width, height, 1, 'uchar'
                 )
             else:
                 # RGB
                 height, width, bands = img_data.shape
                 vips_img = self.pyvips.Image.new_from_memory(
-                    img_data.tobytes(), width, height, bands, 'uchar'
+                    img_data.data, width, height, bands, 'uchar'
                 )
             
-            # Resize if needed
-            if max_dimension and max(vips_img.width, vips_img.height) > max_dimension:
-                scale = max_dimension / max(vips_img.width, vips_img.height)
-                logger.info(f"VIPS: Resizing from {vips_img.width}x{vips_img.height} (scale={scale:.3f})")
-                vips_img = vips_img.resize(scale, kernel='lanczos3')
+            return self._vips_resize_and_save(vips_img, output_path, format, max_dimension, georef)
             
-            # Save with appropriate settings
-            format_upper = format.upper()
-            if format_upper == 'TIFF':
-                compression = self.conversion_settings.get('tiff_compression', 'tiff_lzw')
-                if compression == 'tiff_deflate':
-                    vips_img.write_to_file(str(output_path), compression='deflate')
-                elif compression in ['lzw', 'tiff_lzw']:
-                    vips_img.write_to_file(str(output_path), compression='lzw')
-                else:
-                    vips_img.write_to_file(str(output_path), compression='none')
-            elif format_upper in ['JPEG', 'JPG']:
-                quality = self.conversion_settings.get('jpeg_quality', 95)
-                vips_img.write_to_file(str(output_path), Q=quality)
-            elif format_upper == 'PNG':
-                compression = self.conversion_settings.get('png_compression', 6)
-                vips_img.write_to_file(str(output_path), compression=compression)
-            elif format_upper == 'WEBP':
-                quality = self.conversion_settings.get('webp_quality', 95)
-                vips_img.write_to_file(str(output_path), Q=quality)
+        except Exception as e:
+            logger.error(f"VIPS conversion error: {e}")
+            return False
+    
+    def _vips_resize_and_save(self, vips_img, output_path: Path, format: str,
+                              max_dimension: Optional[int] = None,
+                              georef: Optional[GeoReference] = None) -> bool:
+        """
+        Resize a VIPS image to fit max_dimension and write it.
+        
+        Nothing is computed before the save: the whole pipeline feeding
+        vips_img runs strip by strip while the file is written.
+        
+        Args:
+            vips_img (pyvips.Image): uint8 image
+            output_path (Path): Output file path
+            format (str): Output format
+            max_dimension (Optional[int]): Maximum dimension for resizing
+            georef (Optional[GeoReference]): Map projection of COG outputs
+            
+        Returns:
+            bool: True if successful
+        """
+        # Resize if needed (libvips shrinks by whole factors before the lanczos3 pass)
+        if max_dimension and max(vips_img.width, vips_img.height) > max_dimension:
+            scale = max_dimension / max(vips_img.width, vips_img.height)
+            logger.info(f"VIPS: Resizing from {vips_img.width}x{vips_img.height} (scale={scale:.3f})")
+            vips_img = vips_img.resize(scale, kernel='lanczos3')
+        
+        # Save with appropriate settings
+        format_upper = format.upper()
+        if format_upper == 'COG':
+            return self.save_cog(vips_img, output_path, georef)
+        elif format_upper in ['TIFF', 'TIF']:
+            compression = self.conversion_settings.get('tiff_compression', 'tiff_lzw')
+            if compression == 'tiff_deflate':
+                vips_img.write_to_file(str(output_path), compression='deflate')
+            elif compression in ['lzw', 'tiff_lzw']:
+                vips_img.write_to_file(str(output_path), compression='lzw')
             else:
-                logger.error(f"VIPS: Unsupported format {format}")
-                return False
+                vips_img.write_to_file(str(output_path), compression='none')
+        elif format_upper in ['JPEG', 'JPG']:
+            quality = self.conversion_settings.get('jpeg_quality', 95)
+            progressive = self.conversion_settings.get('progressive_jpeg', False)
+            vips_img.write_to_file(str(output_path), Q=quality, interlace=progressive)
+        elif format_upper == 'PNG':
+            compression = self.conversion_settings.get('png_compression', 6)
+            vips_img.write_to_file(str(output_path), compression=compression)
+        elif format_upper == 'WEBP':
+            quality = self.conversion_settings.get('webp_quality', 95)
+            vips_img.write_to_file(str(output_path), Q=quality)
+        else:
+            logger.error(f"VIPS: Unsupported format {format}")
+            return False
+        
+        logger.info(f"VIPS: Image saved successfully to {output_path}")
+        return True
+    
+    def open_vips_layout(self, layout: PDS3ImageLayout):
+        """
+        Open a PDS3 raster lazily in pyvips, as histogram bin indices.
+        
+        Samples are read as raw unsigned bits in native byte order; signed
+        samples get their sign bit flipped, so each pixel value is its
+        ValueHistogram bin.
+        
+        Args:
+            layout (PDS3ImageLayout): Raster layout (see ConversionPlanner)
             
-            logger.info(f"VIPS: Image saved successfully to {output_path}")
-            return True
+        Returns:
+            pyvips.Image: uchar or ushort image with 1 or 3 bands
+        """
+        itemsize = layout.dtype.itemsize
+        raw_format = VIPS_RAW_FORMATS[itemsize]
+        path = str(layout.data_path)
+        
+        if layout.band_storage == 'SAMPLE_INTERLEAVED':
+            pixel_bytes = itemsize * layout.bands
+            record_pixels = layout.record_bytes // pixel_bytes
+            raw = self.pyvips.Image.rawload(path, record_pixels, layout.lines, layout.bands,
+                                            offset=layout.offset, format=raw_format)
+            vips_img = raw.crop(layout.line_prefix_bytes // pixel_bytes, 0,
+                                layout.line_samples, layout.lines)
+        else:
+            # One record row per band (BIL) or one band after the other (BSQ)
+            record_pixels = layout.record_bytes // itemsize
+            prefix_pixels = layout.line_prefix_bytes // itemsize
+            if layout.band_storage == 'LINE_INTERLEAVED':
+                raw = self.pyvips.Image.rawload(path, record_pixels * layout.bands, layout.lines, 1,
+                                                offset=layout.offset, format=raw_format)
+                planes = [raw.crop(band * record_pixels + prefix_pixels, 0,
+                                   layout.line_samples, layout.lines)
+                          for band in range(layout.bands)]
+            else:
+                raw = self.pyvips.Image.rawload(path, record_pixels, layout.lines * layout.bands, 1,
+                                                offset=layout.offset, format=raw_format)
+                planes = [raw.crop(prefix_pixels, band * layout.lines,
+                                   layout.line_samples, layout.lines)
+                          for band in range(layout.bands)]
+            vips_img = planes[0] if len(planes) == 1 else planes[0].bandjoin(planes[1:])
+        
+        if itemsize > 1 and not layout.dtype.isnative:
+            vips_img = vips_img.byteswap()
+        if layout.dtype.kind == 'i':
+            vips_img = vips_img.boolean_const('eor', [1 << (8 * itemsize - 1)])
+        return vips_img
+    
+    def convert_with_vips_native(self, layout: PDS3ImageLayout, output_path: Union[str, Path],
+                                 format: str = 'TIFF', max_dimension: Optional[int] = None,
+                                 georef: Optional[GeoReference] = None) -> bool:
+        """
+        Convert a PDS3 raster without loading it into Python memory.
+        
+        The raster is read straight from the file by libvips. One streaming
+        pass builds the exact histogram, then normalization (a lookup table
+        through maplut, identical to normalize_image), resizing and saving run
+        as a single demand-driven pipeline.
+        
+        Args:
+            layout (PDS3ImageLayout): Raster layout (see ConversionPlanner)
+            output_path (Union[str, Path]): Output file path
+            format (str): Output format
+            max_dimension (Optional[int]): Maximum dimension for resizing
+            georef (Optional[GeoReference]): Map projection of COG outputs
+            
+        Returns:
+            bool: True if successful
+        """
+        try:
+            output_path = Path(output_path)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            
+            index_img = self.open_vips_layout(layout)
+            
+            # Exact histogram over all bands (libvips sizes it to the largest value)
+            vips_hist = index_img.hist_find()
+            counts = np.frombuffer(vips_hist.write_to_memory(), dtype=np.uint32)
+            hist = ValueHistogram(layout.dtype)
+            hist.counts[:vips_hist.width] = counts.reshape(vips_hist.width, vips_hist.bands).sum(axis=1)
+            
+            window = self.histogram_window(hist)
+            if window is None:
+                lut = hist.bin_values().astype(np.uint8)
+            else:
+                p_low, p_high = window
+                if p_high - p_low > 0:
+                    lut = scale_values(hist.bin_values(), p_low, p_high)
+                else:
+                    logger.warning("No variation in image data")
+                    lut = np.zeros(len(hist.counts), dtype=np.uint8)
+            
+            lut_img = self.pyvips.Image.new_from_memory(lut.tobytes(), len(lut), 1, 1, 'uchar')
+            vips_img = index_img.maplut(lut_img)
+            vips_img = vips_img.copy(interpretation='b-w' if vips_img.bands == 1 else 'srgb')
+            
+            return self._vips_resize_and_save(vips_img, output_path, format, max_dimension, georef)
             
         except Exception as e:
-            logger.error(f"VIPS conversion error: {e}")
+            logger.error(f"Native VIPS conversion error: {e}")
             return False
     
     def save_image(self, img: Image.Image, output_path: Union[str, Path], 
-                   format: Optional[str] = None) -> bool:
+                   format: Optional[str] = None,
+                   georef: Optional[GeoReference] = None) -> bool:
         """
         Save PIL Image to file with appropriate settings.
         
         Args:
             img (PIL.Image): Image to save
             output_path (str or Path): Output file path
-            format (str, optional): Output format ('PNG', 'JPEG', 'WEBP'). 
+            format (str, optional): Output format ('PNG', 'JPEG', 'WEBP', 'TIFF', 'COG'). 
                                    Auto-detected from extension if None.
+            georef (GeoReference, optional): Map projection of COG outputs
             
         Returns:
             bool: True if successful, False otherwise
@@ -427,6 +641,9 @@ class ImageConverter:
         
         format = format.upper()
         
+        if format == 'COG':
+            return self.save_cog(np.asarray(img), output_path, georef)
+        
         try:
             if format == 'PNG':
                 img.save(
@@ -443,7 +660,8 @@ class ImageConverter:
                     output_path,
                     'JPEG',
                     quality=self.conversion_settings['jpeg_quality'],
-                    optimize=True
+                    optimize=True,
+                    progressive=self.conversion_settings.get('progressive_jpeg', False)
                 )
             elif format == 'WEBP':
                 img.save(
@@ -472,11 +690,69 @@ class ImageConverter:
             logger.error(f"Error saving image: {e}")
             return False
     
+    def save_cog(self, image, output_path: Union[str, Path],
+                 georef: Optional[GeoReference] = None) -> bool:
+        """
+        Write a Cloud-Optimized GeoTIFF: tiled, with 2x overviews down to one tile.
+        
+        Args:
+            image (np.ndarray or pyvips.Image): uint8 image; a pyvips pipeline
+                                                is computed one row of tiles
+                                                at a time while writing
+            output_path (str or Path): Output file path
+            georef (GeoReference, optional): Map projection written as GeoTIFF tags
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            if isinstance(image, np.ndarray):
+                height, width = image.shape[:2]
+                bands = image.shape[2] if image.ndim > 2 else 1
+            else:
+                width, height, bands = image.width, image.height, image.bands
+            tile_size = self.conversion_settings.get('cog_tile_size', 512)
+            
+            with TiledTiffWriter(output_path, width, height, bands, np.uint8,
+                                 tile_size=tile_size,
+                                 compression=self.conversion_settings.get('tiff_compression'),
+                                 workers=os.cpu_count() or 1,
+                                 extra_tags=georef.tags(width, height) if georef else None,
+                                 overviews=True) as writer:
+                for y in range(0, height, tile_size):
+                    rows = min(tile_size, height - y)
+                    if isinstance(image, np.ndarray):
+                        writer.write_rows(image[y:y + rows])
+                    else:
+                        strip = image.crop(0, y, width, rows).write_to_memory()
+                        writer.write_rows(np.frombuffer(strip, dtype=np.uint8)
+                                          .reshape(rows, width, bands))
+            
+            logger.info(f"COG saved successfully: {output_path}"
+                        f"{' (georeferenced)' if georef else ''}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error saving COG: {e}")
+            return False
+    
+    def georeference(self, input_path: Union[str, Path],
+                     format: Optional[str]) -> Optional[GeoReference]:
+        """Map projection of a PDS3 file for COG outputs (None otherwise)."""
+        if (format or '').upper() != 'COG' or not self.conversion_settings.get('cog_georeference', True):
+            return None
+        try:
+            return GeoReference.from_label(read_image_layout(input_path).label)
+        except (ValueError, OSError):
+            return None
+    
     def convert_file(self, input_path: Union[str, Path], 
                      output_path: Union[str, Path],
                      format: Optional[str] = None,
                      enhance: bool = True,
-                     max_dimension: Optional[int] = None) -> bool:
+                     max_dimension: Optional[int] = None,
+                     plan: Optional[ConversionPlan] = None,
+                     output_mode: Optional[str] = None) -> bool:
         """
         Convert a single .IMG file to standard image format.
         
@@ -486,12 +762,27 @@ class ImageConverter:
         3. Enhance (optional)
         4. Save to output format
         
+        How the file is processed comes from a ConversionPlan (see planner.py):
+        large PDS3 rasters without enhancement are converted entirely in
+        pyvips straight from the file (vips_lazy), very large memory-mapped
+        rasters written to TIFF skip steps 2-4 in the strip-wise pipeline
+        (memmap_strip), and sources far larger than max_dimension are first
+        decimated close to that size (reduce_first). Science outputs (TIFF,
+        output_mode 'science') skip steps 2-3 and keep the source samples.
+        The measured duration is fed back to the planner.
+        
         Args:
             input_path (str or Path): Path to input .IMG file
             output_path (str or Path): Path to output image file
             format (str, optional): Output format. Auto-detected if None.
             enhance (bool): Whether to apply visual enhancements. Default True.
             max_dimension (int, optional): Maximum dimension for resizing. None = no resize.
+            plan (ConversionPlan, optional): Plan made up front (e.g. from the
+                                             first bytes of a download).
+                                             Planned from the file if None.
+            output_mode (str, optional): 'visual' or 'science' (default
+                                         CONVERSION_SETTINGS['output_mode']);
+                                         ignored when a plan is given
             
         Returns:
             bool: True if successful, False otherwise
@@ -510,58 +801,19 @@ class ImageConverter:
         logger.info(f"Converting {input_path} -> {output_path}")
         
         try:
-            # Load image
-            img_data = self.load_pds_image(input_path)
-            if img_data is None:
-                logger.error("Failed to load image")
+            output_format = format or Path(output_path).suffix.lstrip('.')
+            if plan is None:
+                plan = self.planner.plan_file(input_path, output_format, enhance, max_dimension,
+                                              output_mode)
+            if plan.rejected:
+                logger.error(f"Conversion refused: {plan.rejected}")
                 return False
             
-            # Normalize
-            img_data = self.normalize_image(img_data)
-            
-            # Enhance
-            if enhance:
-                img_data = self.enhance_image(img_data)
-            
-            # Determine if we should use VIPS for large images
-            total_pixels = img_data.shape[0] * img_data.shape[1]
-            vips_threshold = self.conversion_settings.get('vips_threshold_pixels', 10_000_000)
-            use_vips = self.vips_available and total_pixels > vips_threshold
-            
-            if use_vips:
-                logger.info(f"Using VIPS for large image ({total_pixels:,} pixels)")
-                # Use VIPS for better performance
-                success = self.convert_with_vips(img_data, output_path, format or 'TIFF', max_dimension)
-                
-                # Clean up
-                del img_data
-                gc.collect()
-                
-                return success
-            else:
-                # Use PIL for smaller images
-                logger.info(f"Using PIL for image ({total_pixels:,} pixels)")
-                
-                # Convert to PIL
-                img = self.convert_to_pil(img_data)
-                
-                # Resize if needed
-                if max_dimension and max(img.size) > max_dimension:
-                    logger.info(f"Resizing from {img.size} to fit {max_dimension}px")
-                    img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
-                
-                # Clean up numpy array
-                del img_data
-                gc.collect()
-                
-                # Save
-                success = self.save_image(img, output_path, format)
-                
-                # Clean up
-                del img
-                gc.collect()
-                
-                return success
+            start = time.time()
+            success = self._run_plan(plan, input_path, output_path, format, enhance, max_dimension)
+            if success:
+                self.planner.record(plan, time.time() - start)
+            return success
             
         except Exception as e:
             logger.error(f"Conversion failed: {e}")
@@ -569,16 +821,159 @@ class ImageConverter:
             traceback.print_exc()
             return False
     
-    def convert_to_bytes(self, input_path: Union[str, Path],
+    def _run_plan(self, plan: ConversionPlan, input_path: Union[str, Path],
+                  output_path: Union[str, Path], format: Optional[str],
+                  enhance: bool, max_dimension: Optional[int]) -> bool:
+        """Execute the strategy of a plan (updated in place on fallback)."""
+        cog = (format or '').upper() == 'COG'
+        georef = self.georeference(input_path, format)
+        
+        # Large rasters: lazy pyvips pipeline, never materialized in numpy
+        if plan.strategy == 'vips_lazy':
+            logger.info(f"Using native VIPS pipeline ({plan.reasons[0]})")
+            layout = read_image_layout(input_path)
+            if self.convert_with_vips_native(layout, output_path, format or 'TIFF', max_dimension,
+                                             georef):
+                return True
+            logger.warning("Native VIPS pipeline failed, falling back to numpy")
+            plan.strategy, plan.engine = 'memmap', 'vips'
+            plan.reasons.append('vips_lazy failed')
+        
+        # Load image
+        img_data = self.load_pds_image(input_path)
+        if img_data is None:
+            logger.error("Failed to load image")
+            return False
+        
+        # Source samples to a tiled TIFF, stretch recorded as metadata only
+        if plan.engine == 'science':
+            try:
+                scaling = label_scaling(read_image_layout(input_path).label)
+            except (ValueError, OSError):
+                scaling = (1.0, 0.0)
+            logger.info(f"Using science pipeline for {img_data.shape[0]}x{img_data.shape[1]} "
+                        f"{img_data.dtype} image")
+            success = self.strip_converter.convert_science(
+                img_data, output_path, max_dimension,
+                self.conversion_settings.get('science_sample_type'), scaling, cog, georef)
+            del img_data
+            gc.collect()
+            return success
+        
+        # Stream rasters larger than RAM strip by strip
+        if plan.strategy == 'memmap_strip':
+            logger.info(f"Using strip pipeline for {img_data.shape[0]}x{img_data.shape[1]} image")
+            success = self.strip_converter.convert(img_data, output_path, max_dimension, cog, georef)
+            del img_data
+            gc.collect()
+            return success
+        
+        # Work near the output size when it is far below the source size
+        img_data = self.reduce_for_target(img_data, max_dimension)
+        
+        # Normalize
+        img_data = self.normalize_image(img_data)
+        
+        # Enhance
+        if enhance:
+            img_data = self.enhance_image(img_data)
+        
+        total_pixels = img_data.shape[0] * img_data.shape[1]
+        if plan.engine == 'vips' and self.vips_available:
+            logger.info(f"Using VIPS for image ({total_pixels:,} pixels)")
+            # Use VIPS for better performance
+            success = self.convert_with_vips(img_data, output_path, format or 'TIFF', max_dimension,
+                                             georef)
+            
+            # Clean up
+            del img_data
+            gc.collect()
+            
+            return success
+        
+        # Use PIL for smaller images
+        logger.info(f"Using PIL for image ({total_pixels:,} pixels)")
+        
+        # Convert to PIL
+        img = self.convert_to_pil(img_data)
+        
+        # Resize if needed
+        if max_dimension and max(img.size) > max_dimension:
+            logger.info(f"Resizing from {img.size} to fit {max_dimension}px")
+            img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+        
+        # Clean up numpy array
+        del img_data
+        gc.collect()
+        
+        # Save
+        success = self.save_image(img, output_path, format, georef)
+        
+        # Clean up
+        del img
+        gc.collect()
+        
+        return success
+    
+    def encode_image(self, img: Image.Image, format: str) -> BytesIO:
+        """
+        Encode a PIL Image in memory with the save settings of save_image.
+        
+        Args:
+            img (PIL.Image): Image to encode
+            format (str): Output format ('PNG', 'JPEG', 'WEBP', 'TIFF')
+            
+        Returns:
+            BytesIO: Encoded image, rewound to the start
+            
+        Raises:
+            ValueError: If the format is not supported
+        """
+        format = format.upper()
+        img_io = BytesIO()
+        
+        if format == 'PNG':
+            img.save(img_io, 'PNG', optimize=True, 
+                    compress_level=self.conversion_settings['png_compression'])
+        elif format in ['JPEG', 'JPG']:
+            if img.mode in ('RGBA', 'LA', 'P'):
+                img = img.convert('RGB')
+            img.save(img_io, 'JPEG', 
+                    quality=self.conversion_settings['jpeg_quality'],
+                    optimize=True,
+                    progressive=self.conversion_settings.get('progressive_jpeg', False))
+        elif format == 'WEBP':
+            img.save(img_io, 'WEBP',
+                    quality=self.conversion_settings['webp_quality'],
+                    method=6)
+        elif format == 'TIFF':
+            compression = self.conversion_settings.get('tiff_compression', 'tiff_lzw')
+            if compression == 'tiff_deflate':
+                img.save(img_io, 'TIFF', compression='tiff_deflate')
+            elif compression == 'lzw':
+                img.save(img_io, 'TIFF', compression='tiff_lzw')
+            else:
+                img.save(img_io, 'TIFF')
+        else:
+            raise ValueError(f"Unsupported format: {format}")
+        
+        img_io.seek(0)
+        return img_io
+    
+    def convert_to_bytes(self, input_path: ImageSource,
                          format: str = 'PNG',
                          enhance: bool = True,
                          max_dimension: Optional[int] = None) -> Optional[BytesIO]:
         """
         Convert image to bytes (for web serving).
         
+        The source can be a path or a product already held in memory, so
+        small thumbnails and previews are produced without any disk I/O.
+        
         Args:
-            input_path (str or Path): Path to input .IMG file
-            format (str): Output format ('PNG', 'JPEG', 'WEBP')
+            input_path (str, Path or bytes-like): Path to input .IMG file,
+                                                  or the product bytes
+            format (str): Output format ('PNG', 'JPEG', 'WEBP', 'TIFF')
             enhance (bool): Whether to apply enhancements
             max_dimension (int, optional): Maximum dimension for resizing
             
@@ -598,6 +993,7 @@ class ImageConverter:
             if img_data is None:
                 return None
             
+            img_data = self.reduce_for_target(img_data, max_dimension)
             img_data = self.normalize_image(img_data)
             
             if enhance:
@@ -609,23 +1005,7 @@ class ImageConverter:
                 img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
             
             # Save to bytes
-            img_io = BytesIO()
-            
-            if format.upper() == 'PNG':
-                img.save(img_io, 'PNG', optimize=True, 
-                        compress_level=self.conversion_settings['png_compression'])
-            elif format.upper() in ['JPEG', 'JPG']:
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    img = img.convert('RGB')
-                img.save(img_io, 'JPEG', 
-                        quality=self.conversion_settings['jpeg_quality'],
-                        optimize=True)
-            elif format.upper() == 'WEBP':
-                img.save(img_io, 'WEBP',
-                        quality=self.conversion_settings['webp_quality'],
-                        method=6)
-            
-            img_io.seek(0)
+            img_io = self.encode_image(img, format)
             
             # Cleanup
             del img_data, img
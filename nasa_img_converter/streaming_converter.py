@@ -11,13 +11,15 @@ License: MIT
 
 import os
 import gc
+import time
 import logging
 import tempfile
 from pathlib import Path
-from typing import Optional, Union, Callable
+from typing import Optional, Union, Callable, Iterator
 from io import BytesIO
 import threading
 import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
 import numpy as np
@@ -25,6 +27,10 @@ from PIL import Image
 
 from config import ProcessingConfig
 from simple_converter import ImageConverter
+from http_session import get_session
+from pds3_reader import (PDS3ImageLayout, MAX_LABEL_BYTES, find_label_end,
+                         parse_pds3_label, get_image_layout)
+from strip_converter import StripStatistics, box_reduce, reduce_factor_for, target_size_for
 
 # Configure logging
 logging.basicConfig(
@@ -34,6 +40,21 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def _pwrite(fd: int, data: bytes, offset: int):
+    """Write data at a file offset without moving a shared file position."""
+    if hasattr(os, 'pwrite'):
+        while data:
+            written = os.pwrite(fd, data, offset)
+            data = data[written:]
+            offset += written
+    else:
+        # Windows: each segment thread owns its descriptor, so seek + write is safe
+        os.lseek(fd, offset, os.SEEK_SET)
+        while data:
+            written = os.write(fd, data)
+            data = data[written:]
+
+
 class StreamingConverter:
     """
     Convert images while downloading using a pipeline approach.
@@ -62,6 +83,12 @@ class StreamingConverter:
         self.config = config or ProcessingConfig()
         self.converter = ImageConverter(self.config)
         self.chunk_size = self.config.MEMORY_SETTINGS['chunk_size']
+        self.download_settings = self.config.DOWNLOAD_SETTINGS
+    
+    @property
+    def session(self):
+        """Shared pooled HTTP session (see http_session)."""
+        return get_session(self.config)
     
     def download_with_progress(self, url: str, 
                                output_file: Union[str, Path],
@@ -87,7 +114,7 @@ class StreamingConverter:
             logger.info(f"Starting streaming download from {url}")
             
             # Start download with streaming
-            response = requests.get(url, stream=True, timeout=300)
+            response = self.session.get(url, stream=True, timeout=300)
             response.raise_for_status()
             
             # Get total size
@@ -113,25 +140,139 @@ class StreamingConverter:
             logger.error(f"Download failed: {e}")
             return False
 
+    def download_segmented(self,
+                           url: str,
+                           output_file: Union[str, Path],
+                           total_size: int,
+                           progress_callback: Optional[Callable] = None,
+                           start: int = 0,
+                           num_segments: Optional[int] = None,
+                           segment_size: Optional[int] = None) -> bool:
+        """
+        Download byte ranges over several connections into a preallocated file.
+        
+        The range [start, total_size) is split into segments that are fetched
+        by a pool of num_segments threads. Each thread writes its bytes at their
+        final position (positional writes), and each segment is retried on its
+        own with exponential backoff. Bytes before `start` are left untouched.
+        
+        Args:
+            url: Source URL (the server must honour Range requests)
+            output_file: Destination path
+            total_size: Total file size in bytes
+            progress_callback: Callable(bytes_downloaded, total_bytes)
+            start: First byte to download
+            num_segments: Concurrent connections (DOWNLOAD_SETTINGS default)
+            segment_size: Bytes per ranged request (DOWNLOAD_SETTINGS default)
+        
+        Returns:
+            True if every segment completed, False otherwise
+        """
+        num_segments = num_segments or self.download_settings['parallel_segments']
+        segment_size = segment_size or self.download_settings['segment_size_mb'] * 1024 * 1024
+        max_retries = self.download_settings['max_retries']
+        backoff_factor = self.download_settings['backoff_factor']
+        timeout = self.download_settings['timeout']
+        
+        output_path = Path(output_file)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'r+b' if output_path.exists() else 'wb') as f:
+            f.truncate(total_size)
+        
+        segments = [(a, min(a + segment_size, total_size) - 1)
+                    for a in range(start, total_size, segment_size)]
+        lock = threading.Lock()
+        stop = threading.Event()
+        progress = {'downloaded': start}
+        logger.info(f"Segmented download: {len(segments)} segments over "
+                    f"{num_segments} connections ({total_size / (1024*1024):.2f} MB)")
+        
+        def fetch(segment):
+            first, last = segment
+            position = first
+            attempt = 0
+            fd = os.open(output_path, os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+            try:
+                while True:
+                    try:
+                        headers = {'Range': f'bytes={position}-{last}'}
+                        with self.session.get(url, stream=True, timeout=timeout, headers=headers) as resp:
+                            if resp.status_code != 206:
+                                raise IOError(f"Range not honoured (HTTP {resp.status_code})")
+                            for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                                if stop.is_set():
+                                    return
+                                if not chunk:
+                                    continue
+                                chunk = chunk[:last + 1 - position]
+                                _pwrite(fd, chunk, position)
+                                position += len(chunk)
+                                with lock:
+                                    progress['downloaded'] += len(chunk)
+                                    if progress_callback:
+                                        progress_callback(progress['downloaded'], total_size)
+                        if position > last:
+                            return
+                        raise IOError(f"Incomplete segment {first}-{last}: stopped at {position}")
+                    except (requests.exceptions.ChunkedEncodingError,
+                            requests.exceptions.ConnectionError,
+                            requests.exceptions.ReadTimeout,
+                            IOError) as e:
+                        attempt += 1
+                        if attempt > max_retries or stop.is_set():
+                            raise
+                        sleep_s = backoff_factor ** attempt
+                        logger.warning(f"Segment {first}-{last} error (attempt {attempt}/{max_retries}): "
+                                       f"{e}. Retrying in {sleep_s:.1f}s...")
+                        time.sleep(sleep_s)
+            finally:
+                os.close(fd)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=num_segments) as pool:
+                futures = [pool.submit(fetch, segment) for segment in segments]
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception:
+                        stop.set()
+                        raise
+            logger.info(f"Download complete: {total_size / (1024*1024):.2f} MB")
+            return True
+        except Exception as e:
+            logger.error(f"Segmented download failed: {e}")
+            return False
+
     def download_with_resume(self,
                               url: str,
                               output_file: Union[str, Path],
                               progress_callback: Optional[Callable] = None,
                               max_retries: int = 5,
-                              backoff_factor: float = 2.0) -> bool:
+                              backoff_factor: float = 2.0,
+                              response: Optional[requests.Response] = None,
+                              chunk_iter: Optional[Iterator[bytes]] = None) -> bool:
         """
         Robust downloader with HTTP Range resume, retries and exponential backoff.
 
         - Uses Range requests to resume partial downloads if the server supports it
+        - Splits large files across parallel ranged connections (download_segmented)
+          and falls back to a single stream when ranges are not supported
         - Retries on transient network errors (e.g., ConnectionResetError 10054)
         - Reports progress via callback if provided
 
+        When `response` is given (a streaming GET the caller already opened,
+        e.g. to sniff the PDS version, and whose first bytes are already in
+        output_file), it is consumed to the end instead of issuing a HEAD and
+        a new GET. A ranged reconnect only happens if that connection fails.
+
         Args:
             url: Source URL
             output_file: Destination path
             progress_callback: Callable(bytes_downloaded, total_bytes)
             max_retries: Maximum retry attempts
             backoff_factor: Exponential backoff multiplier (seconds)
+            response: Open streaming response to continue reading (optional)
+            chunk_iter: Iterator already in use on `response` (optional)
 
         Returns:
             True on success, False otherwise
@@ -140,29 +281,55 @@ class StreamingConverter:
             output_path = Path(output_file)
             output_path.parent.mkdir(parents=True, exist_ok=True)
 
-            # Probe server for size and range support
-            try:
-                head = requests.head(url, allow_redirects=True, timeout=30)
-                head.raise_for_status()
-                total_size = int(head.headers.get('content-length', 0))
-                accept_ranges = head.headers.get('accept-ranges', '').lower() == 'bytes'
-            except Exception as e:
-                logger.warning(f"HEAD failed ({e}), falling back to GET for size")
-                total_size = 0
-                accept_ranges = True  # attempt resume anyway
+            if response is not None:
+                # The caller's response already tells us size and range support
+                total_size = int(response.headers.get('content-length', 0))
+                accept_ranges = response.headers.get('accept-ranges', '').lower() == 'bytes'
+            else:
+                # Probe server for size and range support
+                try:
+                    head = self.session.head(url, allow_redirects=True, timeout=30)
+                    head.raise_for_status()
+                    total_size = int(head.headers.get('content-length', 0))
+                    accept_ranges = head.headers.get('accept-ranges', '').lower() == 'bytes'
+                except Exception as e:
+                    logger.warning(f"HEAD failed ({e}), falling back to GET for size")
+                    total_size = 0
+                    accept_ranges = True  # attempt resume anyway
 
             attempt = 0
             downloaded = output_path.stat().st_size if output_path.exists() else 0
 
+            # Large files on range-capable servers: fetch the rest over several connections
+            min_segmented = self.download_settings['min_size_for_segmented_mb'] * 1024 * 1024
+            if accept_ranges and total_size >= min_segmented and downloaded < total_size:
+                if response is not None:
+                    response.close()
+                    response = None
+                if self.download_segmented(url, output_path, total_size,
+                                           progress_callback, start=downloaded):
+                    return True
+                logger.warning("Segmented download failed, falling back to a single stream")
+                with open(output_path, 'r+b') as f:
+                    f.truncate(downloaded)
+
             while attempt <= max_retries:
                 try:
-                    headers = {}
-                    if accept_ranges and downloaded > 0:
-                        headers['Range'] = f'bytes={downloaded}-'
+                    if response is not None:
+                        # Keep reading the caller's connection after the bytes it wrote
+                        resp, response = response, None
+                        chunks = chunk_iter or resp.iter_content(chunk_size=self.chunk_size)
+                        mode = 'ab'
+                    else:
+                        headers = {}
+                        if accept_ranges and downloaded > 0:
+                            headers['Range'] = f'bytes={downloaded}-'
+                        resp = self.session.get(url, stream=True, timeout=300, headers=headers)
+                        chunks = resp.iter_content(chunk_size=self.chunk_size)
 
-                    with requests.get(url, stream=True, timeout=300, headers=headers) as resp:
                         # 200 = full, 206 = partial
                         if resp.status_code not in (200, 206):
+                            resp.close()
                             resp.raise_for_status()
 
                         # If server ignored Range, reset file
@@ -182,14 +349,14 @@ class StreamingConverter:
                             except Exception:
                                 pass
 
-                        with open(output_path, mode) as f:
-                            for chunk in resp.iter_content(chunk_size=self.chunk_size):
-                                if not chunk:
-                                    continue
-                                f.write(chunk)
-                                downloaded += len(chunk)
-                                if progress_callback and total_size > 0:
-                                    progress_callback(downloaded, total_size)
+                    with resp, open(output_path, mode) as f:
+                        for chunk in chunks:
+                            if not chunk:
+                                continue
+                            f.write(chunk)
+                            downloaded += len(chunk)
+                            if progress_callback and total_size > 0:
+                                progress_callback(downloaded, total_size)
 
                     # Verify completion
                     if total_size == 0 or downloaded >= total_size:
@@ -209,7 +376,6 @@ class StreamingConverter:
                         return False
                     sleep_s = backoff_factor ** attempt
                     logger.warning(f"Transient error (attempt {attempt}/{max_retries}): {e}. Retrying in {sleep_s:.1f}s...")
-                    import time
                     time.sleep(sleep_s)
                     # Resume from current file size
                     downloaded = output_path.stat().st_size if output_path.exists() else 0
@@ -223,7 +389,8 @@ class StreamingConverter:
                                    format: str = 'PNG',
                                    enhance: bool = True,
                                    delete_temp: bool = True,
-                                   progress_callback: Optional[Callable] = None) -> bool:
+                                   progress_callback: Optional[Callable] = None,
+                                   max_dimension: Optional[int] = None) -> bool:
         """
         Download and convert in optimized pipeline.
         
@@ -239,6 +406,7 @@ class StreamingConverter:
             enhance (bool): Apply enhancements
             delete_temp (bool): Delete temporary .IMG file after conversion
             progress_callback (callable, optional): Progress callback
+            max_dimension (int, optional): Maximum output dimension
             
         Returns:
             bool: True if successful
@@ -278,7 +446,8 @@ class StreamingConverter:
                 temp_file,
                 output_path,
                 format=format,
-                enhance=enhance
+                enhance=enhance,
+                max_dimension=max_dimension
             )
             
             if success:
@@ -308,32 +477,216 @@ class StreamingConverter:
                                   format: str = 'PNG',
                                   enhance: bool = True,
                                   chunk_process_size: int = 10 * 1024 * 1024,
-                                  progress_callback: Optional[Callable] = None) -> bool:
+                                  progress_callback: Optional[Callable] = None,
+                                  max_dimension: Optional[int] = None) -> bool:
         """
         Advanced: Download and process in parallel using threading.
         
         This method uses a producer-consumer pattern:
-        - Producer thread: Downloads chunks
-        - Consumer thread: Processes chunks as they arrive
+        - Producer thread: Downloads chunks into a preallocated temporary file
+        - Consumer (calling thread): Parses the PDS3 label from the first bytes,
+          then decodes, accumulates statistics and box-reduces each block of
+          image lines as soon as it has arrived
+        
+        Once the last byte is in, only the write pass remains: scaling the
+        already reduced image (or, at full resolution, re-reading the
+        page-cached strips) into the output. Wall-clock time is therefore close
+        to max(download, processing) instead of their sum.
         
-        Note: This is experimental and works best for very large files.
+        Products that cannot be decoded natively (PDS4, compressed PDS3), unknown
+        Content-Length, or requested enhancements fall back to the sequential
+        pipeline.
         
         Args:
             url (str): URL of .IMG file
             output_path (str or Path): Output path
             format (str): Output format
             enhance (bool): Apply enhancements
-            chunk_process_size (int): Size threshold to start processing
+            chunk_process_size (int): Maximum bytes of image data per processing block
             progress_callback (callable, optional): Progress callback
+            max_dimension (int, optional): Maximum output dimension
             
         Returns:
             bool: True if successful
         """
-        # For now, use optimized sequential approach
-        # Parallel processing requires more complex PDS format handling
-        return self.convert_from_url_optimized(
-            url, output_path, format, enhance, True, progress_callback
-        )
+        enhancements = enhance and any(self.config.CONVERSION_SETTINGS.get(key) for key in
+                                       ('use_clahe', 'enhance_contrast', 'enhance_sharpness'))
+        if enhancements:
+            logger.info("Enhancements requested, using sequential pipeline")
+            return self.convert_from_url_optimized(
+                url, output_path, format, enhance, True, progress_callback, max_dimension
+            )
+        
+        temp_file = None
+        response = None
+        state = {'downloaded': 0, 'done': False, 'error': None, 'stop': False}
+        condition = threading.Condition()
+        producer = None
+        
+        try:
+            response = self.session.get(url, stream=True, timeout=300)
+            response.raise_for_status()
+            total_size = int(response.headers.get('content-length', 0))
+            if total_size == 0:
+                response.close()
+                logger.info("Unknown Content-Length, using sequential pipeline")
+                return self.convert_from_url_optimized(
+                    url, output_path, format, enhance, True, progress_callback, max_dimension
+                )
+            
+            temp_fd, temp_file = tempfile.mkstemp(suffix='.img')
+            os.close(temp_fd)
+            # Preallocate so the raster can be memory-mapped before it has arrived
+            with open(temp_file, 'r+b') as f:
+                f.truncate(total_size)
+            
+            def produce():
+                try:
+                    with response, open(temp_file, 'r+b', buffering=0) as f:
+                        for chunk in response.iter_content(chunk_size=self.chunk_size):
+                            if state['stop']:
+                                return
+                            if not chunk:
+                                continue
+                            f.write(chunk)
+                            with condition:
+                                state['downloaded'] += len(chunk)
+                                condition.notify_all()
+                            if progress_callback:
+                                progress_callback(state['downloaded'], total_size)
+                    if state['downloaded'] < total_size:
+                        raise IOError(f"Incomplete download: {state['downloaded']}/{total_size} bytes")
+                except Exception as e:
+                    state['error'] = e
+                finally:
+                    with condition:
+                        state['done'] = True
+                        condition.notify_all()
+            
+            def wait_for(n_bytes: int) -> int:
+                with condition:
+                    while state['downloaded'] < n_bytes and not state['done']:
+                        condition.wait()
+                    if state['error']:
+                        raise state['error']
+                    return state['downloaded']
+            
+            producer = threading.Thread(target=produce, name='pds-download', daemon=True)
+            producer.start()
+            
+            # Parse the label as soon as its END statement has arrived
+            layout = None
+            available = wait_for(min(total_size, self.chunk_size))
+            while True:
+                with open(temp_file, 'rb') as f:
+                    head = f.read(min(available, MAX_LABEL_BYTES))
+                label_end = find_label_end(head)
+                if label_end >= 0:
+                    try:
+                        layout = get_image_layout(parse_pds3_label(head[:label_end]), temp_file)
+                    except ValueError as e:
+                        logger.info(f"Label not decodable natively ({e})")
+                    break
+                if available >= min(total_size, MAX_LABEL_BYTES):
+                    break
+                available = wait_for(available + self.chunk_size)
+            
+            if layout is None or layout.data_path != Path(temp_file) or \
+                    layout.offset + layout.nbytes > total_size:
+                logger.info("Falling back to convert-after-download")
+                wait_for(total_size)
+                return self.converter.convert_file(temp_file, output_path, format=format,
+                                                   enhance=enhance, max_dimension=max_dimension)
+            
+            success = self._consume_stripwise(layout, wait_for, output_path, format,
+                                              chunk_process_size, max_dimension)
+            wait_for(total_size)
+            return success
+            
+        except Exception as e:
+            logger.error(f"Parallel conversion failed: {e}")
+            return False
+        
+        finally:
+            state['stop'] = True
+            if producer is not None:
+                if producer.is_alive():
+                    # Unblock a producer still waiting on the network
+                    response.close()
+                producer.join()
+            gc.collect()
+            if temp_file and os.path.exists(temp_file):
+                try:
+                    os.remove(temp_file)
+                except OSError:
+                    pass
+    
+    def _consume_stripwise(self, layout: PDS3ImageLayout, wait_for: Callable,
+                           output_path: Union[str, Path], format: str,
+                           chunk_process_size: int,
+                           max_dimension: Optional[int]) -> bool:
+        """
+        Consumer side of convert_from_url_parallel.
+        
+        Args:
+            layout (PDS3ImageLayout): Raster layout in the partially downloaded file
+            wait_for (callable): Blocks until the given number of bytes is on disk
+            output_path (str or Path): Output path
+            format (str): Output format
+            chunk_process_size (int): Maximum bytes of image data per block
+            max_dimension (int, optional): Maximum output dimension
+            
+        Returns:
+            bool: True if successful
+        """
+        strips = self.converter.strip_converter
+        img_data = layout.memmap()
+        height, width = img_data.shape[:2]
+        bands = img_data.shape[2] if img_data.ndim > 2 else 1
+        factor = reduce_factor_for(img_data.shape, max_dimension)
+        reduced_height, reduced_width = -(-height // factor), -(-width // factor)
+        out_height, out_width = target_size_for(img_data.shape, max_dimension)
+        
+        rows = strips.rows_per_strip(img_data.shape, img_data.dtype.itemsize, factor)
+        block_rows = max(factor, chunk_process_size // max(1, layout.record_bytes * bands))
+        rows = max(factor, min(rows, block_rows - block_rows % factor))
+        
+        stats = StripStatistics(img_data.shape, img_data.dtype, self.config.CONVERSION_SETTINGS)
+        reduced = None
+        if factor > 1:
+            reduced = np.empty((reduced_height, reduced_width) + img_data.shape[2:], dtype=np.float32)
+        
+        logger.info(f"Streaming decode: {width}x{height}, {rows} rows/block, factor={factor}")
+        for y in range(0, height, rows):
+            wait_for(layout.bytes_through_line(y + rows))
+            strip = np.asarray(img_data[y:y + rows])
+            stats.update(y, strip)
+            if reduced is not None:
+                block = box_reduce(strip, factor)
+                reduced[y // factor:y // factor + block.shape[0]] = block
+        
+        window = stats.window()
+        logger.info("Download complete, running write pass...")
+        
+        if reduced is not None:
+            source = reduced
+            out_rows = max(1, rows // factor)
+        else:
+            source = img_data
+            out_rows = rows
+        
+        # Same exact output size as convert_file (see StripConverter.fit_strips)
+        blocks = strips.resample_strips(
+            (source[y:y + out_rows] for y in range(0, reduced_height, out_rows)),
+            (reduced_height, reduced_width), (out_height, out_width))
+        
+        if format.upper() in ('TIFF', 'TIF'):
+            strips.write_tiff(blocks, output_path, out_width, out_height, bands, window)
+            logger.info(f"Conversion successful: {output_path}")
+            return True
+        
+        img = self.converter.convert_to_pil(strips.scale_strip(np.concatenate(list(blocks)), window))
+        return self.converter.save_image(img, output_path, format)
     
     def estimate_conversion_time(self, file_size_mb: float) -> dict:
         """
@@ -383,7 +736,10 @@ class InMemoryConverter:
     """
     Convert small to medium images entirely in memory (no disk I/O).
     
-    This is the fastest approach for files that fit in RAM.
+    This is the fastest approach for files that fit in RAM: the response body
+    is streamed into a bytearray, the PDS3 raster is viewed in place inside
+    it and the encoded image is returned as bytes, so nothing touches the
+    disk unless the caller writes the result out.
     
     Example:
         >>> converter = InMemoryConverter()
@@ -398,19 +754,103 @@ class InMemoryConverter:
         self.config = config or ProcessingConfig()
         self.converter = ImageConverter(self.config)
         self.max_memory_mb = self.config.MEMORY_SETTINGS['max_memory_load']
+        self.chunk_size = self.config.MEMORY_SETTINGS['chunk_size']
+    
+    @property
+    def session(self):
+        """Shared pooled HTTP session (see http_session)."""
+        return get_session(self.config)
+    
+    def download_to_memory(self, url: str) -> Optional[bytearray]:
+        """
+        Download a file into memory, refusing files above max_memory_load.
+        
+        The announced Content-Length is checked before any byte of the body
+        is read; without it the running size is checked chunk by chunk, so an
+        oversized file is abandoned as soon as it crosses the limit.
+        
+        Args:
+            url (str): URL of .IMG file
+            
+        Returns:
+            bytearray or None: File contents, or None if the file is too large
+        """
+        limit = self.max_memory_mb * 1024 * 1024
+        logger.info(f"Downloading to memory from {url}")
+        
+        with self.session.get(url, stream=True, timeout=300) as response:
+            response.raise_for_status()
+            content_length = int(response.headers.get('content-length', 0))
+            if content_length > limit:
+                logger.warning(f"File too large for in-memory processing "
+                             f"({content_length / (1024 * 1024):.2f} MB > {self.max_memory_mb} MB)")
+                return None
+            
+            data = bytearray()
+            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                data += chunk
+                if len(data) > limit:
+                    logger.warning(f"File too large for in-memory processing "
+                                 f"(> {self.max_memory_mb} MB), download abandoned")
+                    return None
+        
+        logger.info(f"Downloaded {len(data) / (1024 * 1024):.2f} MB to memory")
+        return data
+    
+    def convert_url_to_bytes(self, url: str,
+                             format: str = 'PNG',
+                             enhance: bool = True,
+                             max_dimension: Optional[int] = None) -> Optional[BytesIO]:
+        """
+        Download and convert a file without touching the disk.
+        
+        Args:
+            url (str): URL of .IMG file
+            format (str): Output format ('PNG', 'JPEG', 'WEBP', 'TIFF')
+            enhance (bool): Apply enhancements
+            max_dimension (int, optional): Maximum dimension for resizing
+            
+        Returns:
+            BytesIO or None: Encoded image, or None on error
+            
+        Example:
+            >>> converter = InMemoryConverter()
+            >>> thumbnail = converter.convert_url_to_bytes(
+            ...     'https://example.com/small.img', 'JPEG', max_dimension=512
+            ... )
+        """
+        try:
+            data = self.download_to_memory(url)
+            if data is None:
+                return None
+            
+            try:
+                return self.converter.convert_to_bytes(data, format, enhance, max_dimension)
+            finally:
+                # Clear memory
+                del data
+                gc.collect()
+            
+        except Exception as e:
+            logger.error(f"In-memory conversion failed: {e}")
+            return None
     
     def convert_from_url_in_memory(self, url: str,
                                    output_path: Union[str, Path],
                                    format: str = 'PNG',
-                                   enhance: bool = True) -> bool:
+                                   enhance: bool = True,
+                                   max_dimension: Optional[int] = None) -> bool:
         """
         Download and convert entirely in memory (fastest for small files).
         
+        Only the encoded output is written to disk.
+        
         Args:
             url (str): URL of .IMG file
             output_path (str or Path): Output path
             format (str): Output format
             enhance (bool): Apply enhancements
+            max_dimension (int, optional): Maximum dimension for resizing
             
         Returns:
             bool: True if successful
@@ -422,50 +862,17 @@ class InMemoryConverter:
             ...     'output.png'
             ... )
         """
+        img_io = self.convert_url_to_bytes(url, format, enhance, max_dimension)
+        if img_io is None:
+            return False
+        
         try:
-            logger.info(f"Downloading to memory from {url}")
-            
-            # Download entire file to memory
-            response = requests.get(url, timeout=300)
-            response.raise_for_status()
-            
-            file_size_mb = len(response.content) / (1024 * 1024)
-            logger.info(f"Downloaded {file_size_mb:.2f} MB to memory")
-            
-            # Check if file is too large for memory
-            if file_size_mb > self.max_memory_mb:
-                logger.warning(f"File too large for in-memory processing "
-                             f"({file_size_mb:.2f} MB > {self.max_memory_mb} MB)")
-                return False
-            
-            # Create temporary file from memory
-            temp_fd, temp_file = tempfile.mkstemp(suffix='.img')
-            
-            try:
-                # Write to temp file
-                with os.fdopen(temp_fd, 'wb') as f:
-                    f.write(response.content)
-                
-                # Convert
-                success = self.converter.convert_file(
-                    temp_file,
-                    output_path,
-                    format=format,
-                    enhance=enhance
-                )
-                
-                return success
-                
-            finally:
-                # Always delete temp file
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-                
-                # Clear memory
-                del response
-                gc.collect()
-            
-        except Exception as e:
+            output_path = Path(output_path)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            output_path.write_bytes(img_io.getbuffer())
+            logger.info(f"Image saved successfully: {output_path}")
+            return True
+        except OSError as e:
             logger.error(f"In-memory conversion failed: {e}")
             return False
 
@@ -0,0 +1,650 @@
+"""
+Strip-wise Streaming Converter
+==============================
+
+This module converts images that are larger than the available RAM by working
+on horizontal strips: a cheap statistics pass first fixes the normalization
+window, then a write pass reads each strip from the (memory-mapped) source,
+scales it to uint8, optionally shrinks it to the requested size (integer box
+reduction, then an area resample to the exact size) and appends it to a tiled
+TIFF.
+
+Peak memory is bounded by MEMORY_SETTINGS['strip_memory_mb'] instead of by the
+size of the image.
+
+The same two passes produce science outputs: the samples themselves (or a
+linear uint16 / float32 version of them) are written instead of uint8, and
+the stretch found by the statistics pass is only recorded as metadata.
+
+Author: NASA Image Converter Team
+License: MIT
+"""
+
+import os
+import logging
+from pathlib import Path
+from typing import Optional, Union, Tuple, Iterator
+
+import numpy as np
+
+from config import ProcessingConfig
+from tiff_writer import TiledTiffWriter, GDAL_METADATA, ASCII, gdal_metadata
+from geotiff import GeoReference
+from normalization import apply_window, ValueHistogram, supports_histogram
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+# Upper bound on pixels gathered for percentile estimation in the stats pass
+PERCENTILE_SAMPLE_PIXELS = 1_000_000
+
+# Sample types of science outputs (None keeps the source dtype)
+SCIENCE_SAMPLE_TYPES = (None, 'uint16', 'float32')
+
+
+def target_size_for(shape: Tuple[int, ...], max_dimension: Optional[int]) -> Tuple[int, int]:
+    """
+    Exact output size for max_dimension, as PIL thumbnail() and VIPS resize() give it.
+
+    Args:
+        shape (tuple): Image shape (height, width[, bands])
+        max_dimension (int, optional): Target maximum dimension
+
+    Returns:
+        tuple: (height, width)
+    """
+    height, width = shape[:2]
+    if not max_dimension or max(height, width) <= max_dimension:
+        return height, width
+    scale = max_dimension / max(height, width)
+    return max(1, round(height * scale)), max(1, round(width * scale))
+
+
+def reduce_factor_for(shape: Tuple[int, ...], max_dimension: Optional[int]) -> int:
+    """
+    Largest integer shrink factor that keeps an image at or above max_dimension.
+
+    The box-reduced image is then resampled to target_size_for() (see
+    AreaResampler), like reduce_for_target() followed by the final resize.
+
+    Args:
+        shape (tuple): Image shape (height, width[, bands])
+        max_dimension (int, optional): Target maximum dimension
+
+    Returns:
+        int: Shrink factor (1 = no reduction)
+    """
+    if not max_dimension:
+        return 1
+    return max(1, max(shape[:2]) // max_dimension)
+
+
+def area_weights(n_in: int, n_out: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Taps of an area (box) resample from n_in to n_out <= n_in samples.
+
+    Output sample i averages the source interval [i * s, (i + 1) * s) with
+    s = n_in / n_out, each source sample weighted by its overlap.
+
+    Args:
+        n_in (int): Source samples
+        n_out (int): Output samples
+
+    Returns:
+        tuple: (index, weight) arrays of shape (n_out, taps); unused taps
+               repeat the last source sample with a zero weight
+    """
+    scale = n_in / n_out
+    start = np.arange(n_out) * scale
+    end = start + scale
+    first = np.floor(start).astype(np.int64)
+    last = np.minimum(np.ceil(end - 1e-9).astype(np.int64), n_in) - 1
+    index = first[:, None] + np.arange(int(np.ceil(scale)) + 1)
+    weight = np.clip(np.minimum(index + 1, end[:, None]) - np.maximum(index, start[:, None]), 0, None)
+    weight[index > last[:, None]] = 0
+    index = np.minimum(index, last[:, None])
+    return index, (weight / weight.sum(axis=1, keepdims=True)).astype(np.float32)
+
+
+class AreaResampler:
+    """
+    Resample an image arriving as row blocks to an exact size (area average).
+
+    Only the few source rows under the next output row are kept, so an
+    image can be brought to its final size inside a strip-wise pipeline.
+    Meant for the small remaining scale after an integer box reduction.
+
+    Example:
+        >>> resampler = AreaResampler((1200, 1200), (1000, 1000))
+        >>> for block in blocks:
+        ...     writer.write_rows(resampler.feed(block))
+    """
+
+    def __init__(self, in_size: Tuple[int, int], out_size: Tuple[int, int]):
+        """
+        Args:
+            in_size (tuple): Source (height, width)
+            out_size (tuple): Output (height, width), each at most the source's
+        """
+        self.row_index, self.row_weight = area_weights(in_size[0], out_size[0])
+        self.col_index, self.col_weight = area_weights(in_size[1], out_size[1])
+        self._row_last = self.row_index.max(axis=1)
+        self._pending = None
+        self._pending_start = 0
+        self._next_row = 0
+
+    def _resample_columns(self, block: np.ndarray) -> np.ndarray:
+        shape = (-1,) + (1,) * (block.ndim - 2)
+        out = None
+        for tap in range(self.col_index.shape[1]):
+            part = block[:, self.col_index[:, tap]] * self.col_weight[:, tap].reshape(shape)
+            out = part if out is None else out + part
+        return out
+
+    def feed(self, block: np.ndarray) -> np.ndarray:
+        """
+        Add the next source rows.
+
+        Args:
+            block (np.ndarray): Source rows (n, width[, bands])
+
+        Returns:
+            np.ndarray: Output rows (float32) completed by these rows, possibly none
+        """
+        block = self._resample_columns(block.astype(np.float32, copy=False))
+        if self._pending is not None:
+            block = np.concatenate([self._pending, block])
+        available = self._pending_start + block.shape[0]
+        stop = int(np.searchsorted(self._row_last, available, side='left'))
+
+        rows = np.arange(self._next_row, stop)
+        out = np.zeros((len(rows),) + block.shape[1:], dtype=np.float32)
+        shape = (-1,) + (1,) * (block.ndim - 1)
+        for tap in range(self.row_index.shape[1]):
+            out += (block[self.row_index[rows, tap] - self._pending_start]
+                    * self.row_weight[rows, tap].reshape(shape))
+
+        self._next_row = stop
+        keep_from = (self.row_index[stop, 0] if stop < len(self.row_index)
+                     else self._pending_start + block.shape[0])
+        self._pending = block[keep_from - self._pending_start:]
+        self._pending_start = keep_from
+        return out
+
+
+def box_reduce(block: np.ndarray, factor: int) -> np.ndarray:
+    """
+    Average factor x factor pixel boxes of a block.
+
+    Partial boxes on the right and bottom edges are padded by edge
+    replication, so the output has ceil(h / factor) x ceil(w / factor) pixels.
+
+    Args:
+        block (np.ndarray): Array of shape (h, w) or (h, w, bands)
+        factor (int): Box size
+
+    Returns:
+        np.ndarray: Reduced block (float32)
+    """
+    if factor == 1:
+        return block.astype(np.float32)
+
+    h, w = block.shape[:2]
+    pad_h = -h % factor
+    pad_w = -w % factor
+    if pad_h or pad_w:
+        pad = [(0, pad_h), (0, pad_w)] + [(0, 0)] * (block.ndim - 2)
+        block = np.pad(block, pad, mode='edge')
+
+    oh, ow = block.shape[0] // factor, block.shape[1] // factor
+    boxes = block.reshape((oh, factor, ow, factor) + block.shape[2:])
+    return boxes.mean(axis=(1, 3), dtype=np.float32)
+
+
+class StripStatistics:
+    """
+    Accumulate normalization statistics strip by strip.
+
+    8 and 16-bit integer data goes into an exact ValueHistogram. Other data
+    tracks min/max over every pixel and estimates percentiles on whole rows
+    taken at a fixed step over the image, so the sample does not depend on
+    the order or size of the strips fed in.
+
+    Example:
+        >>> stats = StripStatistics(img.shape, img.dtype, settings)
+        >>> for y in range(0, img.shape[0], 512):
+        ...     stats.update(y, img[y:y + 512])
+        >>> p_low, p_high = stats.window()
+    """
+
+    def __init__(self, shape: Tuple[int, ...], dtype: np.dtype, conversion_settings: dict):
+        """
+        Initialize the accumulator.
+
+        Args:
+            shape (tuple): Full image shape
+            dtype (np.dtype): Source dtype
+            conversion_settings (dict): CONVERSION_SETTINGS of the active config
+        """
+        self.dtype = np.dtype(dtype)
+        self.settings = conversion_settings
+        total = int(np.prod(shape))
+        self.row_step = max(1, -(-total // PERCENTILE_SAMPLE_PIXELS))
+        self.v_min = None
+        self.v_max = None
+        self.samples = []
+        self.histogram = ValueHistogram(self.dtype) if supports_histogram(self.dtype) else None
+
+    def update(self, first_row: int, strip: np.ndarray):
+        """
+        Add a strip starting at image row first_row.
+
+        Args:
+            first_row (int): Index of the strip's first row in the image
+            strip (np.ndarray): Strip data
+        """
+        if self.histogram is not None:
+            self.histogram.update(strip)
+            return
+        s_min, s_max = strip.min(), strip.max()
+        self.v_min = s_min if self.v_min is None else min(self.v_min, s_min)
+        self.v_max = s_max if self.v_max is None else max(self.v_max, s_max)
+        if self.settings['normalize_percentiles']:
+            self.samples.append(np.array(strip[(-first_row) % self.row_step::self.row_step]))
+
+    def window(self) -> Optional[Tuple[float, float]]:
+        """
+        Return the normalization window for everything seen so far.
+
+        Returns:
+            tuple or None: (p_low, p_high), or None when the data should be
+                           passed through unchanged (well-contrasted uint8)
+        """
+        if self.histogram is not None:
+            self.v_min, self.v_max = self.histogram.min(), self.histogram.max()
+        logger.info(f"Strip stats: min={self.v_min}, max={self.v_max}")
+
+        if self.dtype == np.uint8 and self.v_max > 200 and self.v_min < 50:
+            logger.info("Image already well-contrasted, skipping normalization")
+            return None
+
+        if not self.settings['normalize_percentiles']:
+            return float(self.v_min), float(self.v_max)
+
+        if self.histogram is not None:
+            p_low = self.histogram.percentile(self.settings['percentile_low'])
+            p_high = self.histogram.percentile(self.settings['percentile_high'])
+            logger.info(f"Percentiles (exact): {self.settings['percentile_low']}%={p_low}, "
+                        f"{self.settings['percentile_high']}%={p_high}")
+            return p_low, p_high
+
+        sample = np.concatenate(self.samples)
+        p_low = np.percentile(sample, self.settings['percentile_low'])
+        p_high = np.percentile(sample, self.settings['percentile_high'])
+        logger.info(f"Percentiles (every {self.row_step} rows): "
+                    f"{self.settings['percentile_low']}%={p_low}, "
+                    f"{self.settings['percentile_high']}%={p_high}")
+        return p_low, p_high
+
+
+class StripConverter:
+    """
+    Two-pass strip-wise converter for images larger than RAM.
+
+    Example:
+        >>> from pds3_reader import open_pds3_image
+        >>> converter = StripConverter()
+        >>> img = open_pds3_image('ESP_011386_2065_RED.IMG')
+        >>> converter.convert(img, 'output.tif', max_dimension=8192)
+        True
+    """
+
+    def __init__(self, config: Optional[ProcessingConfig] = None):
+        """
+        Initialize the StripConverter.
+
+        Args:
+            config (ProcessingConfig, optional): Configuration object
+        """
+        self.config = config or ProcessingConfig()
+        self.conversion_settings = self.config.CONVERSION_SETTINGS
+        self.memory_settings = self.config.MEMORY_SETTINGS
+        self.strip_memory_bytes = self.memory_settings.get('strip_memory_mb', 64) * 1024 * 1024
+        self.tile_size = self.memory_settings.get('strip_tile_size', 256)
+        self.cog_tile_size = self.conversion_settings.get('cog_tile_size', 512)
+
+    def rows_per_strip(self, shape: Tuple[int, ...], itemsize: int, factor: int = 1) -> int:
+        """
+        Number of source rows processed per strip within the memory budget.
+
+        The budget covers the raw strip plus its float32 working copy.
+
+        Args:
+            shape (tuple): Source shape (height, width[, bands])
+            itemsize (int): Bytes per source sample
+            factor (int): Box reduction factor (strips are aligned to it)
+
+        Returns:
+            int: Rows per strip
+        """
+        bands = shape[2] if len(shape) > 2 else 1
+        row_bytes = shape[1] * bands * (itemsize + 4)
+        rows = max(1, self.strip_memory_bytes // max(1, row_bytes))
+        align = self.tile_size * factor
+        if rows >= align:
+            rows -= rows % align
+        else:
+            rows = max(factor, rows - rows % factor)
+        return min(rows, shape[0])
+
+    def iter_strips(self, img_data: np.ndarray, rows: int) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Yield (first_row, strip) pairs read from the source.
+
+        Args:
+            img_data (np.ndarray): Source array (usually a memmap)
+            rows (int): Rows per strip
+
+        Yields:
+            tuple: Row index and the strip loaded into memory
+        """
+        for y in range(0, img_data.shape[0], rows):
+            yield y, np.asarray(img_data[y:y + rows])
+
+    def compute_window(self, img_data: np.ndarray) -> Optional[Tuple[float, float]]:
+        """
+        Statistics pass: determine the (low, high) normalization window.
+
+        Args:
+            img_data (np.ndarray): Source array
+
+        Returns:
+            tuple or None: (p_low, p_high), or None when the data should be
+                           passed through unchanged (well-contrasted uint8)
+        """
+        stats = StripStatistics(img_data.shape, img_data.dtype, self.conversion_settings)
+        rows = self.rows_per_strip(img_data.shape, img_data.dtype.itemsize)
+        for y, strip in self.iter_strips(img_data, rows):
+            stats.update(y, strip)
+        return stats.window()
+
+    def scale_strip(self, strip: np.ndarray,
+                    window: Optional[Tuple[float, float]]) -> np.ndarray:
+        """
+        Scale one strip to uint8 with a fixed window.
+
+        Args:
+            strip (np.ndarray): Strip data
+            window (tuple or None): (p_low, p_high); None passes uint8 through
+
+        Returns:
+            np.ndarray: uint8 strip
+        """
+        return apply_window(strip, window)
+
+    def resample_strips(self, blocks: Iterator[np.ndarray], in_size: Tuple[int, int],
+                        out_size: Tuple[int, int]) -> Iterator[np.ndarray]:
+        """
+        Area-resample the row blocks of an in_size image to out_size.
+
+        Args:
+            blocks (iterator): Row blocks in order
+            in_size (tuple): (height, width) of the blocks' image
+            out_size (tuple): Output (height, width)
+
+        Yields:
+            np.ndarray: Output row blocks (the blocks unchanged if the sizes match)
+        """
+        if tuple(in_size) == tuple(out_size):
+            yield from blocks
+            return
+        resampler = AreaResampler(in_size, out_size)
+        for block in blocks:
+            block = resampler.feed(block)
+            if len(block):
+                yield block
+
+    def fit_strips(self, strips: Iterator[np.ndarray], shape: Tuple[int, ...],
+                   max_dimension: Optional[int]) -> Iterator[np.ndarray]:
+        """
+        Bring source strips to the output size of max_dimension.
+
+        Strips (aligned to the factor, see rows_per_strip) are box-reduced by
+        reduce_factor_for(), then the reduced image is resampled to exactly
+        target_size_for(), the size the PIL and VIPS paths produce.
+
+        Args:
+            strips (iterator): Source strips in row order
+            shape (tuple): Source shape (height, width[, bands])
+            max_dimension (int, optional): Maximum output dimension
+
+        Returns:
+            iterator: Output row blocks (source strips unchanged when no
+                      reduction is needed, float32 otherwise)
+        """
+        factor = reduce_factor_for(shape, max_dimension)
+        if factor > 1:
+            strips = (box_reduce(strip, factor) for strip in strips)
+        reduced_size = (-(-shape[0] // factor), -(-shape[1] // factor))
+        return self.resample_strips(strips, reduced_size, target_size_for(shape, max_dimension))
+
+    def write_tiff(self, strips: Iterator[np.ndarray], output_path: Union[str, Path],
+                   width: int, height: int, bands: int,
+                   window: Optional[Tuple[float, float]],
+                   cog: bool = False, georef: Optional[GeoReference] = None):
+        """
+        Write pass: scale strips (already at the output size) into a tiled TIFF.
+
+        Args:
+            strips (iterator): Output row blocks in order (see fit_strips)
+            output_path (str or Path): Output TIFF path
+            width (int): Output width
+            height (int): Output height
+            bands (int): Number of bands
+            window (tuple or None): Normalization window from the stats pass
+            cog (bool): Write a Cloud-Optimized GeoTIFF (with overviews)
+            georef (GeoReference, optional): Map projection written as GeoTIFF tags
+        """
+        with TiledTiffWriter(output_path, width, height, bands, np.uint8,
+                             tile_size=self.cog_tile_size if cog else self.tile_size,
+                             compression=self.conversion_settings.get('tiff_compression'),
+                             workers=os.cpu_count() or 1,
+                             extra_tags=georef.tags(width, height) if georef else None,
+                             overviews=cog) as writer:
+            for strip in strips:
+                writer.write_rows(self.scale_strip(strip, window))
+
+    def reduce(self, img_data: np.ndarray, factor: int, method: str = 'box') -> np.ndarray:
+        """
+        Shrink an array by an integer factor, reading the source strip by strip.
+
+        Args:
+            img_data (np.ndarray): Source array (usually a memmap)
+            factor (int): Shrink factor
+            method (str): 'box' averages factor x factor boxes (values are
+                          rounded back to the source dtype); 'stride' keeps
+                          every factor-th pixel and only reads those rows
+
+        Returns:
+            np.ndarray: Reduced array of shape ceil(h / factor) x ceil(w / factor)
+                        in the source dtype (native byte order for 'box')
+        """
+        if factor <= 1:
+            return img_data
+        if method == 'stride':
+            return np.ascontiguousarray(img_data[::factor, ::factor])
+        if method != 'box':
+            raise ValueError(f"Unknown reduction method: {method}")
+
+        dtype = img_data.dtype.newbyteorder('=')
+        height, width = img_data.shape[:2]
+        out = np.empty((-(-height // factor), -(-width // factor)) + img_data.shape[2:], dtype=dtype)
+        rows = self.rows_per_strip(img_data.shape, img_data.dtype.itemsize, factor)
+        for y, strip in self.iter_strips(img_data, rows):
+            reduced = box_reduce(strip, factor)
+            if dtype.kind in 'ui':
+                np.rint(reduced, out=reduced)
+            out[y // factor:y // factor + len(reduced)] = reduced
+        return out
+
+    def science_strip(self, strip: np.ndarray, dtype: np.dtype, factor: int = 1,
+                      rescale: Optional[Tuple[float, float]] = None) -> np.ndarray:
+        """
+        Prepare one strip of a science output.
+
+        Args:
+            strip (np.ndarray): Source strip
+            dtype (np.dtype): Output sample dtype
+            factor (int): Box reduction factor
+            rescale (tuple, optional): (minimum, step): output = (value - minimum) / step
+
+        Returns:
+            np.ndarray: Strip in the output dtype
+        """
+        if factor > 1:
+            strip = box_reduce(strip, factor)
+        if rescale is not None:
+            minimum, step = rescale
+            # float32 is exact for samples up to 16 bits
+            work = np.float32 if strip.dtype.itemsize <= 2 or strip.dtype == np.float32 else np.float64
+            strip = (strip.astype(work) - minimum) / step
+            info = np.iinfo(dtype)
+            np.clip(strip, info.min, info.max, out=strip)
+        if dtype.kind in 'ui' and strip.dtype.kind == 'f':
+            strip = np.rint(strip)
+        return strip.astype(dtype, copy=False)
+
+    def convert_science(self, img_data: np.ndarray, output_path: Union[str, Path],
+                        max_dimension: Optional[int] = None,
+                        sample_type: Optional[str] = None,
+                        scaling: Tuple[float, float] = (1.0, 0.0), cog: bool = False,
+                        georef: Optional[GeoReference] = None) -> bool:
+        """
+        Write the samples themselves to a tiled TIFF, strip by strip.
+
+        Nothing is normalized or enhanced. The output keeps the source dtype
+        (sample_type None), is rescaled linearly from the data range to the
+        full uint16 range ('uint16') or cast to 'float32'. GDAL metadata
+        records the display stretch of the visual mode (in stored values),
+        the source range and dtype, and the band scale/offset giving the
+        physical values (label scaling composed with the rescale).
+
+        Args:
+            img_data (np.ndarray): Source array (lines, samples[, bands])
+            output_path (str or Path): Output TIFF path
+            max_dimension (int, optional): Maximum output dimension (area-averaged,
+                                           same size as the visual mode)
+            sample_type (str, optional): One of SCIENCE_SAMPLE_TYPES
+            scaling (tuple): (SCALING_FACTOR, OFFSET) of the label
+            cog (bool): Write a Cloud-Optimized GeoTIFF (with overviews)
+            georef (GeoReference, optional): Map projection written as GeoTIFF tags
+
+        Returns:
+            bool: True if successful
+        """
+        try:
+            if sample_type not in SCIENCE_SAMPLE_TYPES:
+                raise ValueError(f"Unknown science sample type: {sample_type}")
+            height, width = img_data.shape[:2]
+            bands = img_data.shape[2] if img_data.ndim > 2 else 1
+            factor = reduce_factor_for(img_data.shape, max_dimension)
+            out_height, out_width = target_size_for(img_data.shape, max_dimension)
+            rows = self.rows_per_strip(img_data.shape, img_data.dtype.itemsize, factor)
+
+            stats = StripStatistics(img_data.shape, img_data.dtype, self.conversion_settings)
+            for y, strip in self.iter_strips(img_data, rows):
+                stats.update(y, strip)
+            window = stats.window()
+            v_min, v_max = float(stats.v_min), float(stats.v_max)
+            stretch = window if window is not None else (v_min, v_max)
+
+            scale, offset = scaling
+            rescale = None
+            if sample_type == 'uint16':
+                dtype = np.dtype(np.uint16)
+                step = (v_max - v_min) / 65535 if v_max > v_min else 1.0
+                rescale = (v_min, step)
+                stretch = tuple((value - v_min) / step for value in stretch)
+                # stored * step + v_min gives back the source sample
+                scale, offset = scale * step, offset + scale * v_min
+            elif sample_type == 'float32':
+                dtype = np.dtype(np.float32)
+            else:
+                dtype = img_data.dtype.newbyteorder('=')
+
+            logger.info(f"Science conversion: {width}x{height} {img_data.dtype} -> "
+                        f"{out_width}x{out_height} {dtype} (factor={factor}, {rows} rows/strip)")
+
+            identity = (scale, offset) == (1.0, 0.0)
+            metadata = gdal_metadata({
+                'OUTPUT_MODE': 'science',
+                'SOURCE_SAMPLE_TYPE': img_data.dtype.str,
+                'SOURCE_MIN': v_min,
+                'SOURCE_MAX': v_max,
+                'STRETCH_MIN': float(stretch[0]),
+                'STRETCH_MAX': float(stretch[1]),
+                'REDUCTION_FACTOR': max(height, width) / max(out_height, out_width),
+            }, bands, scale=None if identity else scale, offset=None if identity else offset)
+
+            extra_tags = [(GDAL_METADATA, ASCII, metadata)]
+            if georef is not None:
+                extra_tags += georef.tags(out_width, out_height)
+            with TiledTiffWriter(output_path, out_width, out_height, bands, dtype,
+                                 tile_size=self.cog_tile_size if cog else self.tile_size,
+                                 compression=self.conversion_settings.get('tiff_compression'),
+                                 workers=os.cpu_count() or 1,
+                                 extra_tags=extra_tags, overviews=cog) as writer:
+                strips = (strip for _, strip in self.iter_strips(img_data, rows))
+                for block in self.fit_strips(strips, img_data.shape, max_dimension):
+                    writer.write_rows(self.science_strip(block, dtype, rescale=rescale))
+
+            logger.info(f"Science output saved to {output_path}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Science conversion failed: {e}")
+            return False
+
+    def convert(self, img_data: np.ndarray, output_path: Union[str, Path],
+                max_dimension: Optional[int] = None, cog: bool = False,
+                georef: Optional[GeoReference] = None) -> bool:
+        """
+        Convert an array to a tiled TIFF strip by strip.
+
+        Args:
+            img_data (np.ndarray): Source array (lines, samples[, bands])
+            output_path (str or Path): Output TIFF path
+            max_dimension (int, optional): Maximum output dimension
+            cog (bool): Write a Cloud-Optimized GeoTIFF (with overviews)
+            georef (GeoReference, optional): Map projection written as GeoTIFF tags
+
+        Returns:
+            bool: True if successful
+        """
+        try:
+            height, width = img_data.shape[:2]
+            bands = img_data.shape[2] if img_data.ndim > 2 else 1
+            factor = reduce_factor_for(img_data.shape, max_dimension)
+            out_height, out_width = target_size_for(img_data.shape, max_dimension)
+            rows = self.rows_per_strip(img_data.shape, img_data.dtype.itemsize, factor)
+
+            logger.info(f"Strip conversion: {width}x{height} -> {out_width}x{out_height} "
+                        f"(factor={factor}, {rows} rows/strip)")
+
+            window = self.compute_window(img_data)
+            strips = self.fit_strips((strip for _, strip in self.iter_strips(img_data, rows)),
+                                     img_data.shape, max_dimension)
+            self.write_tiff(strips, output_path, out_width, out_height, bands, window,
+                            cog, georef)
+
+            logger.info(f"Strip conversion saved to {output_path}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Strip conversion failed: {e}")
+            return False
@@ -0,0 +1,420 @@
+"""
+Incremental Tiled TIFF Writer
+=============================
+
+This module writes tiled TIFF files row band by row band, so that callers can
+produce outputs much larger than the memory they are allowed to use. Only one
+row of tiles is buffered at a time; the IFD is written when the file is closed.
+Optionally the writer adds reduced-resolution overviews and lays the file out
+as a Cloud-Optimized GeoTIFF (COG).
+
+Supported sample types are uint8/uint16/int16/uint32/int32/float32/float64
+with any number of bands. Compression is Adobe Deflate (zlib, with horizontal
+differencing for integer data) or none.
+
+Author: NASA Image Converter Team
+License: MIT
+"""
+
+import struct
+import zlib
+import logging
+from xml.sax.saxutils import escape, quoteattr
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Union, List, Tuple, Dict, Any
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+# TIFF field types
+ASCII = 2
+SHORT = 3
+LONG = 4
+DOUBLE = 12
+
+_TYPE_FORMATS = {1: 'B', ASCII: 's', SHORT: 'H', LONG: 'I', DOUBLE: 'd'}
+_TYPE_SIZES = {1: 1, ASCII: 1, SHORT: 2, LONG: 4, DOUBLE: 8}
+
+# Compression tag values
+COMPRESSION_NONE = 1
+COMPRESSION_DEFLATE = 8
+
+# SampleFormat tag values
+_SAMPLE_FORMATS = {'u': 1, 'i': 2, 'f': 3}
+
+MAX_CLASSIC_TIFF_BYTES = 2 ** 32 - 1
+
+# Private tag holding GDAL dataset/band metadata as XML
+GDAL_METADATA = 42112
+
+
+def resolve_compression(name: Optional[str]) -> int:
+    """
+    Map a CONVERSION_SETTINGS['tiff_compression'] value to a TIFF tag value.
+
+    LZW and JPEG are not implemented by this writer; they fall back to
+    Deflate, which is lossless and supported by every TIFF reader.
+
+    Args:
+        name (str or None): Compression name from the configuration
+
+    Returns:
+        int: TIFF Compression tag value
+    """
+    if name in (None, 'none', 'raw'):
+        return COMPRESSION_NONE
+    if name not in ('tiff_deflate', 'deflate', 'zip'):
+        logger.info(f"Compression '{name}' not available in tiled writer, using deflate")
+    return COMPRESSION_DEFLATE
+
+
+def gdal_metadata(items: Dict[str, Any], bands: int = 1,
+                  scale: Optional[float] = None, offset: Optional[float] = None) -> str:
+    """
+    Build the XML of a GDAL_METADATA tag.
+
+    GDAL exposes the items as dataset metadata and the scale/offset as band
+    scale/offset (value = stored * scale + offset).
+
+    Args:
+        items (dict): Dataset metadata items
+        bands (int): Number of bands the scale/offset apply to
+        scale (float, optional): Band scale
+        offset (float, optional): Band offset
+
+    Returns:
+        str: <GDALMetadata> document
+    """
+    lines = [f'<Item name={quoteattr(str(name))}>{escape(str(value))}</Item>'
+             for name, value in items.items()]
+    for band in range(bands):
+        if scale is not None:
+            lines.append(f'<Item name="SCALE" sample="{band}" role="scale">{scale!r}</Item>')
+        if offset is not None:
+            lines.append(f'<Item name="OFFSET" sample="{band}" role="offset">{offset!r}</Item>')
+    return '<GDALMetadata>\n' + '\n'.join(f'  {line}' for line in lines) + '\n</GDALMetadata>'
+
+
+def encode_ifd(entries: List[Tuple[int, int, object]], offset: int,
+               next_ifd: int = 0) -> bytes:
+    """
+    Serialise one little-endian IFD, with out-of-line values appended after it.
+
+    Args:
+        entries (list): (tag, field type, value or sequence of values) tuples
+        offset (int): File offset at which the IFD will be written
+        next_ifd (int): Offset of the next IFD (0 = last)
+
+    Returns:
+        bytes: IFD followed by its out-of-line data
+    """
+    entries = sorted(entries, key=lambda e: e[0])
+    ifd_size = 2 + 12 * len(entries) + 4
+    extra = bytearray()
+    body = bytearray(struct.pack('<H', len(entries)))
+
+    for tag, field_type, value in entries:
+        if field_type == ASCII:
+            payload = (value.encode('ascii', errors='replace') if isinstance(value, str)
+                       else bytes(value)) + b'\0'
+            count = len(payload)
+        else:
+            values = list(value) if isinstance(value, (list, tuple, np.ndarray)) else [value]
+            count = len(values)
+            payload = struct.pack(f'<{count}{_TYPE_FORMATS[field_type]}', *values)
+
+        if len(payload) <= 4:
+            body += struct.pack('<HHI', tag, field_type, count) + payload.ljust(4, b'\0')
+        else:
+            if len(extra) % 2:
+                extra += b'\0'
+            body += struct.pack('<HHII', tag, field_type, count, offset + ifd_size + len(extra))
+            extra += payload
+
+    body += struct.pack('<I', next_ifd)
+    return bytes(body + extra)
+
+
+def horizontal_predict(tile: np.ndarray) -> np.ndarray:
+    """Apply TIFF predictor 2 (horizontal differencing) to an integer tile."""
+    diff = tile.copy()
+    diff[:, 1:] -= tile[:, :-1]
+    return diff
+
+
+def halve(rows: np.ndarray) -> np.ndarray:
+    """
+    Reduce a (n, width, bands) block by 2 in both directions (2x2 mean).
+
+    Odd edges are replicated; integer results are rounded to nearest.
+    """
+    pad_rows, pad_cols = rows.shape[0] % 2, rows.shape[1] % 2
+    if pad_rows or pad_cols:
+        rows = np.pad(rows, ((0, pad_rows), (0, pad_cols), (0, 0)), mode='edge')
+    work = rows.astype(np.float64 if rows.dtype.itemsize > 2 else np.float32)
+    reduced = (work[0::2, 0::2] + work[1::2, 0::2] + work[0::2, 1::2] + work[1::2, 1::2]) / 4
+    if rows.dtype.kind in 'ui':
+        np.rint(reduced, out=reduced)
+    return reduced.astype(rows.dtype)
+
+
+class _TileLevel:
+    """Row buffer and tile index of one resolution level."""
+
+    def __init__(self, width: int, height: int, bands: int, dtype: np.dtype, tile_size: int):
+        self.width = width
+        self.height = height
+        self.tiles_across = -(-width // tile_size)
+        self.tiles_down = -(-height // tile_size)
+        self.tile_offsets: List[int] = []
+        self.tile_byte_counts: List[int] = []
+        self.buffer = np.zeros((tile_size, self.tiles_across * tile_size, bands), dtype=dtype)
+        self.buffered_rows = 0
+        self.rows_written = 0
+
+
+class TiledTiffWriter:
+    """
+    Write a tiled TIFF incrementally, one band of rows at a time.
+
+    Rows can be passed in any block size; they are buffered until a full row
+    of tiles is available, then compressed (in parallel) and appended.
+
+    With overviews, every flushed row of tiles is also reduced 2x into the
+    next level, down to a level that fits in one tile, and the file is laid
+    out as a Cloud-Optimized GeoTIFF: all IFDs first, then the tiles from the
+    smallest overview to full resolution. Tiles are spilled to a side file
+    while writing and assembled in that order when the writer is closed.
+
+    Example:
+        >>> with TiledTiffWriter('out.tif', 4096, 4096) as writer:
+        ...     for y in range(0, 4096, 512):
+        ...         writer.write_rows(strip[y:y + 512])
+    """
+
+    def __init__(self, output_path: Union[str, Path], width: int, height: int,
+                 bands: int = 1, dtype: Union[str, np.dtype] = np.uint8,
+                 tile_size: int = 256, compression: Optional[str] = 'tiff_deflate',
+                 description: Optional[str] = None, workers: int = 4,
+                 extra_tags: Optional[List[Tuple[int, int, object]]] = None,
+                 overviews: bool = False):
+        """
+        Initialize the writer and open the output file.
+
+        Args:
+            output_path (str or Path): Output TIFF path
+            width (int): Image width in pixels
+            height (int): Image height in pixels
+            bands (int): Samples per pixel
+            dtype (np.dtype): Sample dtype
+            tile_size (int): Tile edge in pixels (multiple of 16)
+            compression (str, optional): Compression name (see resolve_compression)
+            description (str, optional): ImageDescription tag text
+            workers (int): Threads used to compress a row of tiles
+            extra_tags (list, optional): Additional (tag, type, value) IFD entries
+                of the full resolution image
+            overviews (bool): Add 2x reduced overview levels (COG layout)
+        """
+        if tile_size % 16:
+            raise ValueError("tile_size must be a multiple of 16")
+
+        self.output_path = Path(output_path)
+        self.width = width
+        self.height = height
+        self.bands = bands
+        self.dtype = np.dtype(dtype).newbyteorder('<')
+        self.tile_size = tile_size
+        self.compression = resolve_compression(compression)
+        self.description = description
+        self.extra_tags = extra_tags or []
+        self.overviews = overviews
+        self.predictor = (2 if self.compression == COMPRESSION_DEFLATE
+                          and self.dtype.kind in 'ui' else 1)
+
+        self.levels = [_TileLevel(width, height, bands, self.dtype, tile_size)]
+        while overviews and max(self.levels[-1].width, self.levels[-1].height) > tile_size:
+            last = self.levels[-1]
+            self.levels.append(_TileLevel(-(-last.width // 2), -(-last.height // 2),
+                                          bands, self.dtype, tile_size))
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers))
+
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        if overviews:
+            # Tiles of all levels interleave as they are produced; close() reorders them
+            self._spill_path = self.output_path.with_name(self.output_path.name + '.tiles')
+            self._file = open(self._spill_path, 'w+b')
+        else:
+            self._spill_path = None
+            self._file = open(self.output_path, 'wb')
+            # Header; the IFD offset is patched in close()
+            self._file.write(b'II*\0' + struct.pack('<I', 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def write_rows(self, rows: np.ndarray):
+        """
+        Append image rows.
+
+        Args:
+            rows (np.ndarray): Array of shape (n, width) or (n, width, bands)
+        """
+        if rows.ndim == 2:
+            rows = rows[:, :, np.newaxis]
+        if rows.shape[1] != self.width or rows.shape[2] != self.bands:
+            raise ValueError(f"Row block shape {rows.shape} does not match "
+                             f"{self.width}x{self.bands}")
+        self._write_level(0, rows)
+
+    def _write_level(self, index: int, rows: np.ndarray):
+        level = self.levels[index]
+        start = 0
+        while start < rows.shape[0]:
+            take = min(self.tile_size - level.buffered_rows, rows.shape[0] - start)
+            level.buffer[level.buffered_rows:level.buffered_rows + take, :level.width] = \
+                rows[start:start + take]
+            level.buffered_rows += take
+            start += take
+            if level.buffered_rows == self.tile_size:
+                self._flush_tile_row(index)
+
+    def _encode_tile(self, tile: np.ndarray) -> bytes:
+        if self.predictor == 2:
+            tile = horizontal_predict(tile)
+        data = np.ascontiguousarray(tile).tobytes()
+        if self.compression == COMPRESSION_DEFLATE:
+            return zlib.compress(data, 6)
+        return data
+
+    def _flush_tile_row(self, index: int):
+        level = self.levels[index]
+        if level.buffered_rows < self.tile_size:
+            level.buffer[level.buffered_rows:] = 0
+        ts = self.tile_size
+        tiles = [level.buffer[:, i * ts:(i + 1) * ts] for i in range(level.tiles_across)]
+
+        for encoded in self._pool.map(self._encode_tile, tiles):
+            offset = self._file.tell()
+            if offset + len(encoded) > MAX_CLASSIC_TIFF_BYTES:
+                raise ValueError("Output exceeds 4 GB classic TIFF limit")
+            self._file.write(encoded)
+            level.tile_offsets.append(offset)
+            level.tile_byte_counts.append(len(encoded))
+
+        if index + 1 < len(self.levels):
+            self._write_level(index + 1,
+                              halve(level.buffer[:level.buffered_rows, :level.width]))
+        level.rows_written += level.buffered_rows
+        level.buffered_rows = 0
+
+    def ifd_entries(self, index: int = 0) -> List[Tuple[int, int, object]]:
+        """Return the IFD entries describing one written level (0 = full resolution)."""
+        level = self.levels[index]
+        photometric = 2 if self.bands in (3, 4) else 1
+        entries = [
+            (254, LONG, 1 if index else 0),
+            (256, LONG, level.width),
+            (257, LONG, level.height),
+            (258, SHORT, [self.dtype.itemsize * 8] * self.bands),
+            (259, SHORT, self.compression),
+            (262, SHORT, photometric),
+            (277, SHORT, self.bands),
+            (284, SHORT, 1),
+            (317, SHORT, self.predictor),
+            (322, SHORT, self.tile_size),
+            (323, SHORT, self.tile_size),
+            (324, LONG, level.tile_offsets),
+            (325, LONG, level.tile_byte_counts),
+            (339, SHORT, [_SAMPLE_FORMATS[self.dtype.kind]] * self.bands),
+        ]
+        extra_samples = self.bands - (3 if photometric == 2 else 1)
+        if extra_samples:
+            entries.append((338, SHORT, [0] * extra_samples))
+        if index:
+            return entries
+        if self.description:
+            entries.append((270, ASCII, self.description))
+        return entries + list(self.extra_tags)
+
+    def close(self):
+        """Flush the last rows of tiles, write the IFDs and close the file."""
+        if self._file.closed:
+            return
+        try:
+            # Each flush may push rows into the next level, so go top down
+            for index, level in enumerate(self.levels):
+                if level.buffered_rows:
+                    self._flush_tile_row(index)
+                if level.rows_written != level.height:
+                    raise ValueError(f"Wrote {level.rows_written} rows, expected {level.height}")
+
+            if self._spill_path is not None:
+                self._write_cog()
+                return
+            ifd_offset = self._file.tell()
+            ifd_offset += ifd_offset % 2
+            self._file.seek(ifd_offset)
+            self._file.write(encode_ifd(self.ifd_entries(), ifd_offset))
+            self._file.seek(4)
+            self._file.write(struct.pack('<I', ifd_offset))
+        finally:
+            self._file.close()
+            self._pool.shutdown(wait=True)
+            if self._spill_path is not None:
+                self._spill_path.unlink(missing_ok=True)
+
+    def _write_cog(self):
+        # IFD sizes only depend on the number of tiles, not on their offsets
+        ifd_offsets = []
+        position = 8
+        for index in range(len(self.levels)):
+            ifd_offsets.append(position)
+            size = len(encode_ifd(self.ifd_entries(index), position))
+            position += size + size % 2
+
+        # Tile data follows the IFDs, smallest overview first
+        spill_offsets = [level.tile_offsets for level in self.levels]
+        for level in reversed(self.levels):
+            level.tile_offsets = []
+            for count in level.tile_byte_counts:
+                level.tile_offsets.append(position)
+                position += count
+        if position > MAX_CLASSIC_TIFF_BYTES:
+            raise ValueError("Output exceeds 4 GB classic TIFF limit")
+
+        with open(self.output_path, 'wb') as out:
+            out.write(b'II*\0' + struct.pack('<I', ifd_offsets[0]))
+            for index in range(len(self.levels)):
+                next_ifd = ifd_offsets[index + 1] if index + 1 < len(self.levels) else 0
+                out.seek(ifd_offsets[index])
+                out.write(encode_ifd(self.ifd_entries(index), ifd_offsets[index], next_ifd))
+            for index in reversed(range(len(self.levels))):
+                level = self.levels[index]
+                out.seek(level.tile_offsets[0])
+                for offset, count in zip(spill_offsets[index], level.tile_byte_counts):
+                    self._file.seek(offset)
+                    out.write(self._file.read(count))
+
+    def abort(self):
+        """Close and delete a partially written file."""
+        if not self._file.closed:
+            self._file.close()
+        self._pool.shutdown(wait=False)
+        self.output_path.unlink(missing_ok=True)
+        if self._spill_path is not None:
+            self._spill_path.unlink(missing_ok=True)
@@ -0,0 +1,473 @@
+"""
+On-demand Tile Server
+=====================
+
+This module renders Deep Zoom tiles on request instead of pre-generating
+whole pyramids. The downloaded source raster is kept (memory-mapped when it
+is a native PDS3 file) together with its normalization window, computed once
+when the source is added. A tile request then reads only the source region
+under that tile, shrinks it to the tile's level, applies the stored window
+and encodes the result, so the time to the first visible pixels no longer
+depends on the image size.
+
+Encoded tiles are kept in a bounded in-memory LRU, with a disk tier below it:
+
+    tile_sources/<source id>.img          source raster
+    tile_sources/<source id>.json         dimensions and normalization window
+    tile_sources/tiles/<source id>/<level>/<column>_<row>.<format>
+
+Tile geometry (tile_size, tile_overlap, tile_format, tile_quality) comes from
+DEEPZOOM_SETTINGS, so the descriptor is the same as a pre-generated pyramid's.
+
+Author: NASA Image Converter Team
+License: MIT
+"""
+
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union, Tuple, Dict, Any
+
+import numpy as np
+from PIL import Image
+
+from config import ProcessingConfig
+from simple_converter import ImageConverter
+from strip_converter import box_reduce
+from conversion_cache import variant_prefix
+from normalization import apply_window
+from deepzoom import (DZI_TEMPLATE, TILE_FORMATS, dzi_max_level, dzi_level_size,
+                      dzi_tile_box)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class TileCache:
+    """
+    Thread-safe LRU of encoded tiles bounded by total size.
+
+    Example:
+        >>> cache = TileCache(256 * 1024 * 1024)
+        >>> cache.put(('source', 12, 3, 4), tile_bytes)
+        >>> cache.get(('source', 12, 3, 4)) is tile_bytes
+        True
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Initialize the TileCache.
+
+        Args:
+            max_bytes (int): Size budget in bytes (0 disables the cache)
+        """
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._tiles: 'OrderedDict[Tuple, bytes]' = OrderedDict()
+        self._total_bytes = 0
+
+    def get(self, key: Tuple) -> Optional[bytes]:
+        with self._lock:
+            data = self._tiles.get(key)
+            if data is not None:
+                self._tiles.move_to_end(key)
+            return data
+
+    def put(self, key: Tuple, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._tiles.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= len(previous)
+            self._tiles[key] = data
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._tiles.popitem(last=False)
+                self._total_bytes -= len(evicted)
+
+    def discard_source(self, source_id: str):
+        """Forget every tile of one source."""
+        with self._lock:
+            for key in [key for key in self._tiles if key[0] == source_id]:
+                self._total_bytes -= len(self._tiles.pop(key))
+
+
+class TileSource:
+    """
+    Source raster opened for tile rendering.
+
+    Attributes:
+        source_id (str): Source identifier
+        data (np.ndarray): Raster (lines, samples[, bands]), usually a memmap
+        width (int): Full-resolution width
+        height (int): Full-resolution height
+        window (tuple or None): Normalization window; None passes uint8 through
+    """
+
+    def __init__(self, source_id: str, data: np.ndarray,
+                 window: Optional[Tuple[float, float]]):
+        if data.ndim > 2 and data.shape[2] != 3:
+            data = data[:, :, 0]
+        self.source_id = source_id
+        self.data = data
+        self.height, self.width = data.shape[:2]
+        self.window = window
+
+    @property
+    def max_level(self) -> int:
+        return dzi_max_level(self.width, self.height)
+
+
+class TileServer:
+    """
+    Keep source rasters and render their Deep Zoom tiles on demand.
+
+    Example:
+        >>> server = TileServer('tile_sources')
+        >>> server.add_source('temp_uploads/tmp123.img', source_id)
+        >>> jpeg = server.tile(source_id, level=12, column=3, row=4)
+    """
+
+    def __init__(self, sources_dir: Union[str, Path], config: Optional[ProcessingConfig] = None):
+        """
+        Initialize the TileServer.
+
+        Args:
+            sources_dir (str or Path): Folder for source rasters and disk tiles
+            config (ProcessingConfig, optional): Configuration object
+        """
+        self.sources_dir = Path(sources_dir)
+        self.tiles_dir = self.sources_dir / 'tiles'
+        self.config = config or ProcessingConfig()
+        self.settings = self.config.TILE_SERVER_SETTINGS
+        deepzoom_settings = self.config.DEEPZOOM_SETTINGS
+        self.tile_size = deepzoom_settings.get('tile_size', 256)
+        self.overlap = deepzoom_settings.get('tile_overlap', 1)
+        self.tile_format = deepzoom_settings.get('tile_format', 'jpg').lower().replace('jpeg', 'jpg')
+        self.tile_quality = deepzoom_settings.get('tile_quality', 85)
+        if self.tile_format not in TILE_FORMATS:
+            raise ValueError(f"Unsupported tile format: {self.tile_format}")
+        self.disk_cache = self.settings.get('disk_cache', True)
+        self.box_max_factor = self.settings.get('box_max_factor', 8)
+        self.max_open_sources = self.settings.get('max_open_sources', 16)
+        self.ttl = self.config.WEB_SETTINGS.get('cache_timeout', 0)
+        self.memory_cache = TileCache(self.settings.get('memory_cache_mb', 256) * 1024 * 1024)
+        self.converter = ImageConverter(self.config)
+        self.sources_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._sources: 'OrderedDict[str, TileSource]' = OrderedDict()
+
+    @property
+    def tile_mimetype(self) -> str:
+        return TILE_FORMATS[self.tile_format]
+
+    def _paths(self, source_id: str) -> Tuple[Path, Path]:
+        """Return (raster path, metadata path) of a source, validating the id."""
+        groups = source_id.split('-')
+        if not all(groups) or not all(c in '0123456789abcdef' for c in ''.join(groups)):
+            raise ValueError(f"Invalid source id: {source_id}")
+        return (self.sources_dir / f"{source_id}.img",
+                self.sources_dir / f"{source_id}.json")
+
+    def metadata(self, source_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Dimensions and normalization window of an unexpired source.
+
+        Args:
+            source_id (str): Source identifier
+
+        Returns:
+            dict or None: Metadata, or None if the source is unknown or expired
+        """
+        raster_path, meta_path = self._paths(source_id)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self.ttl and time.time() - meta['created'] > self.ttl:
+            self.remove_source(source_id)
+            return None
+        if not raster_path.exists():
+            return None
+        return meta
+
+    def latest_source(self, source_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Newest unexpired upstream version of the source an id describes.
+
+        Source ids are cache keys, so every version of one URL shares
+        variant_prefix(source_id); used when upstream cannot say which
+        version is current.
+
+        Args:
+            source_id (str): Source identifier (the upstream version part is ignored)
+
+        Returns:
+            tuple or None: (source id, metadata) of the newest version
+        """
+        self._paths(source_id)
+        candidates = []
+        for meta_path in self.sources_dir.glob(f"{variant_prefix(source_id)}*.json"):
+            try:
+                candidates.append((meta_path.stat().st_mtime, meta_path.stem))
+            except OSError:
+                continue
+        for _, candidate in sorted(candidates, reverse=True):
+            meta = self.metadata(candidate)
+            if meta is not None:
+                return candidate, meta
+        return None
+
+    def add_source(self, raster_path: Union[str, Path], source_id: str) -> Dict[str, Any]:
+        """
+        Take ownership of a downloaded raster and compute its normalization.
+
+        The file is moved into the sources folder; the normalization window is
+        computed once, in strips, and stored next to it.
+
+        Args:
+            raster_path (str or Path): Downloaded PDS file (moved, not copied)
+            source_id (str): Source identifier
+
+        Returns:
+            dict: Source metadata (width, height, window, max_level)
+        """
+        self.purge_expired()
+        target, meta_path = self._paths(source_id)
+        os.replace(raster_path, target)
+
+        data = self.converter.load_pds_image(target)
+        if data is None:
+            target.unlink()
+            raise ValueError("Unreadable image data")
+        window = self.converter.strip_converter.compute_window(data)
+        source = TileSource(source_id, data, window)
+
+        meta = {
+            'width': source.width,
+            'height': source.height,
+            'max_level': source.max_level,
+            'window': None if window is None else [float(window[0]), float(window[1])],
+            'created': time.time(),
+        }
+        temp_path = meta_path.with_name(f".{source_id}.{threading.get_ident()}.tmp")
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temp_path, meta_path)
+
+        self.memory_cache.discard_source(source_id)
+        shutil.rmtree(self.tiles_dir / source_id, ignore_errors=True)
+        with self._lock:
+            self._sources[source_id] = source
+            self._trim_open_sources()
+        logger.info(f"Tile source {source_id}: {source.width}x{source.height}, window={window}")
+        return meta
+
+    def _trim_open_sources(self):
+        while len(self._sources) > self.max_open_sources:
+            self._sources.popitem(last=False)
+
+    def open_source(self, source_id: str) -> Optional[TileSource]:
+        """
+        Open (or reuse) a source raster.
+
+        Args:
+            source_id (str): Source identifier
+
+        Returns:
+            TileSource or None: Opened source, or None if unknown or expired
+        """
+        with self._lock:
+            source = self._sources.get(source_id)
+            if source is not None:
+                self._sources.move_to_end(source_id)
+                return source
+
+        meta = self.metadata(source_id)
+        if meta is None:
+            return None
+        data = self.converter.load_pds_image(self._paths(source_id)[0])
+        if data is None:
+            return None
+        window = meta['window']
+        if window is not None:
+            # np.float64 like the window computed from the data
+            window = (np.float64(window[0]), np.float64(window[1]))
+        source = TileSource(source_id, data, window)
+        with self._lock:
+            self._sources[source_id] = source
+            self._trim_open_sources()
+        return source
+
+    def descriptor(self, source_id: str) -> Optional[str]:
+        """
+        DZI descriptor of a source.
+
+        Args:
+            source_id (str): Source identifier
+
+        Returns:
+            str or None: XML descriptor, or None if the source is unknown
+        """
+        meta = self.metadata(source_id)
+        if meta is None:
+            return None
+        return DZI_TEMPLATE.format(format=self.tile_format, overlap=self.overlap,
+                                   tile_size=self.tile_size,
+                                   width=meta['width'], height=meta['height'])
+
+    def tile(self, source_id: str, level: int, column: int, row: int) -> Optional[bytes]:
+        """
+        Encoded tile, from the memory LRU, the disk tier or freshly rendered.
+
+        Args:
+            source_id (str): Source identifier
+            level (int): Pyramid level
+            column (int): Tile column
+            row (int): Tile row
+
+        Returns:
+            bytes or None: Encoded tile, or None if the source is unknown
+
+        Raises:
+            ValueError: If the tile lies outside the pyramid
+        """
+        key = (source_id, level, column, row)
+        data = self.memory_cache.get(key)
+        if data is not None:
+            return data
+
+        tile_path = self.tiles_dir / source_id / str(level) / f"{column}_{row}.{self.tile_format}"
+        if self.disk_cache:
+            try:
+                data = tile_path.read_bytes()
+            except OSError:
+                data = None
+        if data is None:
+            source = self.open_source(source_id)
+            if source is None:
+                return None
+            data = self.encode(self.render(source, level, column, row))
+            if self.disk_cache:
+                self._write_tile(tile_path, data)
+        self.memory_cache.put(key, data)
+        return data
+
+    def render(self, source: TileSource, level: int, column: int, row: int) -> np.ndarray:
+        """
+        Render one tile as uint8 pixels.
+
+        Only the source region under the tile is read. Levels up to
+        TILE_SERVER_SETTINGS['box_max_factor'] below full resolution are
+        box-averaged, coarser levels take every n-th pixel.
+
+        Args:
+            source (TileSource): Opened source
+            level (int): Pyramid level
+            column (int): Tile column
+            row (int): Tile row
+
+        Returns:
+            np.ndarray: uint8 tile (h, w) or (h, w, 3)
+
+        Raises:
+            ValueError: If the tile lies outside the pyramid
+        """
+        if not 0 <= level <= source.max_level:
+            raise ValueError(f"Level {level} outside 0..{source.max_level}")
+        level_width, level_height = dzi_level_size(source.width, source.height, level)
+        if not (0 <= column * self.tile_size < level_width and 0 <= row * self.tile_size < level_height):
+            raise ValueError(f"Tile {column}_{row} outside level {level}")
+
+        left, top, right, bottom = dzi_tile_box(column, row, level_width, level_height,
+                                                self.tile_size, self.overlap)
+        scale = 1 << (source.max_level - level)
+        rows = slice(top * scale, min(bottom * scale, source.height))
+        columns = slice(left * scale, min(right * scale, source.width))
+        if scale == 1:
+            region = source.data[rows, columns]
+        elif scale <= self.box_max_factor:
+            region = box_reduce(np.asarray(source.data[rows, columns]), scale)
+        else:
+            region = source.data[rows.start:rows.stop:scale, columns.start:columns.stop:scale]
+        return apply_window(np.ascontiguousarray(region), source.window)
+
+    def encode(self, tile: np.ndarray) -> bytes:
+        """
+        Encode a rendered tile in DEEPZOOM_SETTINGS['tile_format'].
+
+        Args:
+            tile (np.ndarray): uint8 tile
+
+        Returns:
+            bytes: JPEG or PNG data
+        """
+        buffer = BytesIO()
+        img = Image.fromarray(tile, 'L' if tile.ndim == 2 else 'RGB')
+        if self.tile_format == 'jpg':
+            img.save(buffer, 'JPEG', quality=self.tile_quality)
+        else:
+            img.save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def _write_tile(self, tile_path: Path, data: bytes):
+        temp_path = tile_path.with_name(f".{tile_path.name}.{threading.get_ident()}.tmp")
+        try:
+            tile_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, tile_path)
+        except OSError as e:
+            logger.warning(f"Could not store tile {tile_path}: {e}")
+
+    def remove_source(self, source_id: str):
+        """
+        Delete a source, its metadata and its tiles.
+
+        Args:
+            source_id (str): Source identifier
+        """
+        with self._lock:
+            self._sources.pop(source_id, None)
+        self.memory_cache.discard_source(source_id)
+        for path in self._paths(source_id):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        shutil.rmtree(self.tiles_dir / source_id, ignore_errors=True)
+
+    def purge_expired(self) -> int:
+        """
+        Delete sources older than WEB_SETTINGS['cache_timeout'].
+
+        Returns:
+            int: Number of sources removed
+        """
+        if not self.ttl:
+            return 0
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for meta_path in self.sources_dir.glob('*.json'):
+            try:
+                if meta_path.stat().st_mtime < cutoff:
+                    self.remove_source(meta_path.stem)
+                    removed += 1
+            except (OSError, ValueError):
+                pass
+        if removed:
+            logger.info(f"Tile server: {removed} expired sources removed")
+        return removed